@@ -0,0 +1,66 @@
+"""
+Completion throughput with many concurrent asyncio writers, group-committed
+by AsyncSQLiteHabitRepository, against one-at-a-time synchronous writes.
+
+    python -m benchmarks.bench_async --writers 1000 --per-writer 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from habit_tracker.async_sqlite_repository import AsyncSQLiteHabitRepository
+from habit_tracker.models import HabitEntity
+from habit_tracker.services import AsyncHabitService, HabitService
+from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+
+async def run_async(path: str, habits: int, writers: int, per_writer: int, synchronous: str) -> float:
+    async with AsyncSQLiteHabitRepository(db_path=path, synchronous=synchronous) as repo:
+        svc = AsyncHabitService(repo)
+        ids = [(await svc.create_habit(f"h{i}", "daily", "bench")).id for i in range(habits)]
+
+        async def writer(n: int) -> None:
+            for k in range(per_writer):
+                await svc.record_completion(ids[(n + k) % len(ids)])
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(writer(n) for n in range(writers)))
+        return time.perf_counter() - t0
+
+
+def run_sync(path: str, habits: int, total: int, synchronous: str) -> float:
+    repo = SQLiteHabitRepository(db_path=path, synchronous=synchronous)
+    svc = HabitService(repo)
+    ids = [repo.add(HabitEntity(name=f"h{i}", periodicity="daily", category="bench")).id
+           for i in range(habits)]
+    t0 = time.perf_counter()
+    for n in range(total):
+        svc.record_completion(ids[n % len(ids)])
+    elapsed = time.perf_counter() - t0
+    repo.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=1000)
+    parser.add_argument("--per-writer", type=int, default=5)
+    parser.add_argument("--habits", type=int, default=100)
+    parser.add_argument("--synchronous", default="FULL", help="SQLite synchronous level")
+    args = parser.parse_args()
+    total = args.writers * args.per_writer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync = run_sync(os.path.join(tmp, "sync.db"), args.habits, total, args.synchronous)
+        grouped = asyncio.run(run_async(os.path.join(tmp, "async.db"), args.habits,
+                                        args.writers, args.per_writer, args.synchronous))
+
+    print(f"{total} completions, synchronous={args.synchronous}")
+    print(f"sync, one commit each:         {total / sync:10.0f} completions/s")
+    print(f"async, {args.writers} writers, group commit: {total / grouped:10.0f} completions/s")
+
+
+if __name__ == "__main__":
+    main()
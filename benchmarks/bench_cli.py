@@ -0,0 +1,77 @@
+"""
+CLI startup and per-command latency, end to end in fresh processes: the full
+CLI module, the `python -m habit_tracker.cli` entry point, and the same entry
+point forwarding to a running daemon.
+
+    python -m benchmarks.bench_cli --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "complete": ["complete", "1"],
+    "list": ["list"],
+    "analyze": ["analyze", "--longest"],
+}
+
+
+def time_process(args, cwd: str, env: dict, runs: int) -> float:
+    """Median wall time of `python args...` in milliseconds."""
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT, HABIT_TRACKER_SOCKET=os.path.join(tmp, "bench.sock"))
+        # seed the database with the default habits
+        subprocess.run([sys.executable, "-m", "habit_tracker.cli.commands", "reset"],
+                       cwd=tmp, env=env, check=True)
+
+        interpreter = time_process(["-c", "pass"], tmp, env, args.runs)
+        imports = time_process(["-c", "import habit_tracker.cli.commands"], tmp, env, args.runs)
+        print(f"interpreter startup:        {interpreter:8.1f} ms")
+        print(f"import cli.commands:        {imports - interpreter:8.1f} ms")
+
+        results = {name: {} for name in COMMANDS}
+        for name, argv in COMMANDS.items():
+            results[name]["module"] = time_process(
+                ["-m", "habit_tracker.cli.commands"] + argv, tmp, env, args.runs)
+            results[name]["entry"] = time_process(
+                ["-m", "habit_tracker.cli"] + argv, tmp, env, args.runs)
+
+        daemon = subprocess.Popen([sys.executable, "-m", "habit_tracker.cli.commands", "daemon"],
+                                  cwd=tmp, env=env, stdout=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(env["HABIT_TRACKER_SOCKET"]):
+                time.sleep(0.01)
+            for name, argv in COMMANDS.items():
+                results[name]["daemon"] = time_process(
+                    ["-m", "habit_tracker.cli"] + argv, tmp, env, args.runs)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    print(f"{'command':10} {'cli.commands':>14} {'cli entry':>14} {'via daemon':>14}")
+    for name, row in results.items():
+        print(f"{name:10} {row['module']:11.1f} ms {row['entry']:11.1f} ms {row['daemon']:11.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
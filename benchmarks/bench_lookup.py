@@ -0,0 +1,83 @@
+"""
+Per-habit completion lookup, before and after the schema migration.
+
+Builds a database with the original (unversioned, unindexed, ISO text) schema,
+times random per-habit completion lookups against it, then lets
+SQLiteHabitRepository upgrade it in place and times the same lookups again.
+
+    python -m benchmarks.bench_lookup --habits 2000 --completions 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from habit_tracker.sqlite_repository import MIGRATIONS, SQLiteHabitRepository
+from habit_tracker.timestamps import from_epoch
+
+
+def build_legacy_db(path: str, habits: int, completions: int) -> None:
+    conn = sqlite3.connect(path)
+    for statement in MIGRATIONS[0]:
+        conn.execute(statement)
+    start = datetime(2024, 1, 1, 8)
+    conn.executemany(
+        "INSERT INTO habits (name, periodicity, category, created) VALUES (?, ?, ?, ?)",
+        ((f"habit {i}", "daily", "bench", start.isoformat()) for i in range(habits))
+    )
+    conn.executemany(
+        "INSERT INTO completions (id, timestamp) VALUES (?, ?)",
+        ((hid, (start + timedelta(days=d)).isoformat())
+         for d in range(completions) for hid in range(1, habits + 1))
+    )
+    conn.commit()
+    conn.close()
+
+
+def time_lookups(path: str, query: str, decode, ids) -> float:
+    conn = sqlite3.connect(path)
+    t0 = time.perf_counter()
+    for hid in ids:
+        [decode(ts) for (ts,) in conn.execute(query, (hid,))]
+    elapsed = time.perf_counter() - t0
+    conn.close()
+    return elapsed / len(ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=2000)
+    parser.add_argument("--completions", type=int, default=200, help="completions per habit")
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_legacy_db(path, args.habits, args.completions)
+        ids = [random.randint(1, args.habits) for _ in range(args.lookups)]
+
+        before = time_lookups(
+            path, "SELECT timestamp FROM completions WHERE id = ?", datetime.fromisoformat, ids
+        )
+        t0 = time.perf_counter()
+        repo = SQLiteHabitRepository(db_path=path)
+        # migrations run on the first connection, not in the constructor
+        repo.connection()
+        repo.close()
+        migration = time.perf_counter() - t0
+        after = time_lookups(
+            path, "SELECT timestamp FROM completions WHERE habit_id = ?", from_epoch, ids
+        )
+
+    rows = args.habits * args.completions
+    print(f"{rows} completions across {args.habits} habits")
+    print(f"lookup before migration: {before * 1e3:9.3f} ms")
+    print(f"migration:               {migration * 1e3:9.3f} ms")
+    print(f"lookup after migration:  {after * 1e3:9.3f} ms  ({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
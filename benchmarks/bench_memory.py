@@ -0,0 +1,44 @@
+"""
+Memory held by one habit's completions as a plain list of CompletionRecord
+versus the packed CompletionList.
+
+    python -m benchmarks.bench_memory --completions 1000000
+"""
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+
+from habit_tracker.models import CompletionList, CompletionRecord
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--completions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    start = datetime(2020, 1, 1, 9)
+    n = args.completions
+    seconds = [int((start - datetime(1970, 1, 1)).total_seconds()) + 3600 * i for i in range(n)]
+
+    as_list = measure(lambda: [CompletionRecord(timestamp=start + timedelta(hours=i)) for i in range(n)])
+    as_packed = measure(lambda: CompletionList.from_epoch_seconds(seconds))
+
+    print(f"{n} completions")
+    print(f"List[CompletionRecord]: {as_list / 2**20:9.1f} MiB  ({as_list / n:6.1f} B each)")
+    print(f"CompletionList:         {as_packed / 2**20:9.1f} MiB  ({as_packed / n:6.1f} B each)")
+    print(f"ratio:                  {as_list / as_packed:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
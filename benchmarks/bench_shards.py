@@ -0,0 +1,67 @@
+"""
+Completion throughput with concurrent writer threads on one database against
+the same load spread over a ShardedHabitRepository.
+
+    python -m benchmarks.bench_shards --shards 4 --writers 8 --per-writer 200
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from habit_tracker.models import HabitEntity
+from habit_tracker.sharded_repository import ShardedHabitRepository
+from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+
+def run(repo, habits: int, writers: int, per_writer: int) -> float:
+    ids = [repo.add(HabitEntity(name=f"h{i}", periodicity="daily", category=f"t{i}")).id
+           for i in range(habits)]
+
+    def writer(n: int) -> None:
+        for k in range(per_writer):
+            while True:
+                try:
+                    repo.append_completion(ids[(n + k * writers) % len(ids)])
+                    break
+                except sqlite3.OperationalError:
+                    # single-file contention surfaces as "database is locked"
+                    time.sleep(0.001)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--per-writer", type=int, default=200)
+    parser.add_argument("--habits", type=int, default=64)
+    parser.add_argument("--synchronous", default="FULL", help="SQLite synchronous level")
+    args = parser.parse_args()
+    total = args.writers * args.per_writer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = SQLiteHabitRepository(os.path.join(tmp, "single.db"), synchronous=args.synchronous)
+        one = run(single, args.habits, args.writers, args.per_writer)
+        single.close()
+        sharded = ShardedHabitRepository.in_directory(os.path.join(tmp, "sharded"), args.shards,
+                                                      synchronous=args.synchronous)
+        many = run(sharded, args.habits, args.writers, args.per_writer)
+        sharded.close()
+
+    print(f"{total} completions from {args.writers} threads, synchronous={args.synchronous}")
+    print(f"one database:      {total / one:10.0f} completions/s")
+    print(f"{args.shards} shards:          {total / many:10.0f} completions/s")
+
+
+if __name__ == "__main__":
+    main()
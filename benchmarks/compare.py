@@ -0,0 +1,44 @@
+"""
+Compare two `benchmarks.run` result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json results.json --threshold 1.2
+
+Exits with status 1 if any benchmark's median got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"baseline {baseline['meta']['commit'][:12]}  current {current['meta']['commit'][:12]}")
+    regressions = 0
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        old, new = baseline["results"].get(name), current["results"].get(name)
+        if old is None or new is None:
+            print(f"{name:45} {'only in ' + ('current' if old is None else 'baseline'):>30}")
+            continue
+        ratio = new["median"] / old["median"] if old["median"] else float("inf")
+        flag = ""
+        if ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:45} {old['median'] * 1e3:10.3f} ms {new['median'] * 1e3:10.3f} ms "
+              f"{ratio:6.2f}x{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
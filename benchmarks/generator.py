@@ -0,0 +1,45 @@
+"""Synthetic habits and completion histories for benchmarks."""
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from habit_tracker.models import CompletionList, HabitEntity
+from habit_tracker.repository import HabitRepository
+from habit_tracker.timestamps import to_epoch
+
+CATEGORIES = ("health", "wellness", "personal dev", "productivity", "errands")
+
+
+def generate_habits(habits: int, completions: int, daily_ratio: float = 0.7,
+                    gap_probability: float = 0.1, seed: int = 0,
+                    now: Optional[datetime] = None) -> Iterator[HabitEntity]:
+    """
+    Yield `habits` habits, each with `completions` completions ending at `now`.
+    A `daily_ratio` share of them are daily, the rest weekly. Each period is
+    skipped with `gap_probability`, which breaks streaks the way real data does.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    for i in range(habits):
+        periodicity = "daily" if rng.random() < daily_ratio else "weekly"
+        step = timedelta(days=1) if periodicity == "daily" else timedelta(weeks=1)
+        seconds, period = [], 0
+        while len(seconds) < completions:
+            if rng.random() >= gap_probability:
+                ts = now - period * step - timedelta(seconds=rng.randint(0, 6 * 3600))
+                seconds.append(to_epoch(ts))
+            period += 1
+        seconds.reverse()
+        yield HabitEntity(
+            name=f"habit {i}",
+            periodicity=periodicity,
+            category=rng.choice(CATEGORIES),
+            created=now - period * step,
+            completions=CompletionList.from_epoch_seconds(seconds),
+        )
+
+
+def populate(repo: HabitRepository, habits: int, completions: int, **kwargs) -> None:
+    """Fill `repo` with generated habits."""
+    for habit in generate_habits(habits, completions, **kwargs):
+        repo.add(habit)
@@ -0,0 +1,178 @@
+"""
+Time the repository, every analytics engine and the CLI on synthetic data,
+and write the results as JSON so runs can be compared across commits.
+
+    python -m benchmarks.run --habits 1000 --completions 100 -o results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from habit_tracker.models import HabitEntity
+from habit_tracker.parallel import ParallelAnalyticsService
+from habit_tracker.services import AnalyticsService, StatsAnalyticsService, WindowedAnalyticsService
+from habit_tracker.sql_analytics import SQLAnalyticsService
+from habit_tracker.sqlite_repository import SQLiteHabitRepository
+from habit_tracker.vectorized import VectorAnalyticsService
+
+from .generator import generate_habits, populate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Run `fn` `repeat` times and summarize wall-clock seconds."""
+    runs: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.mean(runs),
+        "repeat": repeat,
+    }
+
+
+def bench_repository(path: str, args, results: Dict[str, dict]) -> None:
+    repo = SQLiteHabitRepository(db_path=path)
+    fresh = list(generate_habits(args.repeat, args.completions, seed=args.seed + 1))
+    results["repo.add"] = timed(lambda: repo.add(fresh.pop()), args.repeat)
+    results["repo.get_all"] = timed(repo.get_all, args.repeat)
+    results["repo.get_all.no_completions"] = timed(
+        lambda: repo.get_all(include_completions=False), args.repeat
+    )
+    results["repo.get_by_id"] = timed(lambda: repo.get_by_id(args.habits // 2), args.repeat)
+
+    habit = repo.get_by_id(args.habits // 2)
+    def update():
+        habit.add_completion()
+        repo.update(habit)
+    results["repo.update"] = timed(update, args.repeat)
+    results["repo.append_completion"] = timed(
+        lambda: repo.append_completion(args.habits // 2), args.repeat
+    )
+    doomed = [repo.add(HabitEntity(name="doomed", periodicity="daily", category="c")).id
+              for _ in range(args.repeat)]
+    results["repo.delete"] = timed(lambda: repo.delete(doomed.pop()), args.repeat)
+    repo.close()
+
+
+def bench_analytics(path: str, args, results: Dict[str, dict]) -> None:
+    repo = SQLiteHabitRepository(db_path=path)
+    loaded = repo.get_all()
+    bare = repo.get_all(include_completions=False)
+    engines = {
+        "memory": (AnalyticsService, loaded),
+        "stats": (lambda: StatsAnalyticsService(repo), bare),
+        "vector": (lambda: VectorAnalyticsService(repo), bare),
+        "sql": (lambda: SQLAnalyticsService(repo), bare),
+        "parallel": (ParallelAnalyticsService, loaded),
+        "windowed": (lambda: WindowedAnalyticsService(repo), bare),
+    }
+    for engine, (make, habits) in engines.items():
+        def all_habits(method):
+            def run():
+                analytics = make()
+                analytics.prefetch(habits)
+                for h in habits:
+                    getattr(analytics, method)(h)
+            return run
+        for method in ("longest_streak", "current_streak", "completion_rate"):
+            results[f"analytics.{engine}.{method}"] = timed(all_habits(method), args.repeat)
+        for period in ("weekly", "monthly"):
+            results[f"analytics.{engine}.report.{period}"] = timed(
+                lambda: make().report(habits, period), args.repeat
+            )
+    repo.close()
+
+
+def bench_cli(workdir: str, args, results: Dict[str, dict]) -> None:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    commands = {
+        "cli.list": ["list"],
+        "cli.analyze": ["analyze", "--longest", "--current", "--rate", "--weekly-report"],
+        "cli.complete": ["complete", "1"],
+    }
+    for name, argv in commands.items():
+        cmd = [sys.executable, "-m", "habit_tracker.cli.commands", *argv]
+        results[name] = timed(
+            lambda: subprocess.run(cmd, cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL),
+            args.repeat
+        )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=1000)
+    parser.add_argument("--completions", type=int, default=100, help="completions per habit")
+    parser.add_argument("--daily-ratio", type=float, default=0.7)
+    parser.add_argument("--gap", type=float, default=0.1, help="probability of skipping a period")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="repo,analytics,cli",
+                        help="comma-separated groups: repo, analytics, cli")
+    parser.add_argument("--output", "-o", help="write JSON results here (default: stdout)")
+    args = parser.parse_args()
+    groups = set(args.only.split(","))
+
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "data", "habits.db")
+        repo = SQLiteHabitRepository(db_path=path)
+        t0 = time.perf_counter()
+        populate(repo, args.habits, args.completions, daily_ratio=args.daily_ratio,
+                 gap_probability=args.gap, seed=args.seed,
+                 now=datetime.utcnow() - timedelta(hours=1))
+        setup = time.perf_counter() - t0
+        repo.close()
+
+        if "analytics" in groups:
+            bench_analytics(path, args, results)
+        if "cli" in groups:
+            bench_cli(workdir, args, results)
+        # repository writes last, so they do not change the data the others read
+        if "repo" in groups:
+            bench_repository(path, args, results)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+            "setup_seconds": setup,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
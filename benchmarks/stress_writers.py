@@ -0,0 +1,105 @@
+"""
+Many processes writing completions to one database at once, some through
+append_completion and some through a get_by_id / update read-modify-write.
+Checks afterwards that every acknowledged completion is stored exactly once
+and that the maintained counts agree; exits non-zero if not.
+
+    python -m benchmarks.stress_writers --processes 8 --per-process 200 --update-share 0.2
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from habit_tracker.models import CompletionRecord, HabitEntity
+from habit_tracker.repository import ConcurrentUpdateError
+from habit_tracker.sqlite_repository import SQLiteHabitRepository
+from habit_tracker.timestamps import to_epoch
+
+START = datetime(2025, 1, 1)
+
+
+def worker(db_path: str, n: int, per_process: int, habit_ids: List[int],
+           update_share: float, seed: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Write `per_process` completions; returns them as (habit_id, epoch) and the update conflicts seen."""
+    rng = random.Random(seed + n)
+    repo = SQLiteHabitRepository(db_path)
+    written, conflicts = [], 0
+    for k in range(per_process):
+        habit_id = rng.choice(habit_ids)
+        # distinct per write, so every stored row can be traced to one acknowledged write
+        ts = START + timedelta(seconds=n * per_process + k)
+        if rng.random() < update_share:
+            while True:
+                habit = repo.get_by_id(habit_id)
+                habit.completions.append(CompletionRecord(timestamp=ts))
+                try:
+                    repo.update(habit)
+                    break
+                except ConcurrentUpdateError:
+                    conflicts += 1
+        else:
+            repo.append_completion(habit_id, ts)
+        written.append((habit_id, to_epoch(ts)))
+    repo.close()
+    return written, conflicts
+
+
+def run(db_path: str, processes: int = 8, per_process: int = 200, habits: int = 4,
+        update_share: float = 0.2, seed: int = 0) -> dict:
+    """Run the workers against a fresh database at `db_path` and compare what was stored."""
+    repo = SQLiteHabitRepository(db_path)
+    habit_ids = [repo.add(HabitEntity(name=f"h{i}", periodicity="daily", category="stress")).id
+                 for i in range(habits)]
+    t0 = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(worker, [(db_path, n, per_process, habit_ids, update_share, seed)
+                                        for n in range(processes)])
+    elapsed = time.perf_counter() - t0
+
+    expected = sorted(row for written, _ in results for row in written)
+    stored = sorted(repo.connection().execute("SELECT habit_id, timestamp FROM completions"))
+    counted = sum(stats.completion_count for stats in repo.get_stats(habit_ids).values())
+    rolled_up = repo.connection().execute("SELECT COALESCE(SUM(count), 0) FROM weekly_rollup").fetchone()[0]
+    repo.close()
+    return {
+        "writes": len(expected),
+        "lost": len(set(expected) - set(stored)),
+        "duplicated": len(stored) - len(set(stored)),
+        "stats_ok": counted == len(expected),
+        "rollups_ok": rolled_up == len(expected),
+        "conflicts": sum(conflicts for _, conflicts in results),
+        "seconds": elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--per-process", type=int, default=200)
+    parser.add_argument("--habits", type=int, default=4)
+    parser.add_argument("--update-share", type=float, default=0.2,
+                        help="fraction of writes done as get_by_id + update")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run(os.path.join(tmp, "stress.db"), args.processes, args.per_process, args.habits,
+                     args.update_share, args.seed)
+
+    print(f"{result['writes']} completions from {args.processes} processes "
+          f"in {result['seconds']:.2f}s ({result['writes'] / result['seconds']:.0f}/s)")
+    print(f"update conflicts retried: {result['conflicts']}")
+    print(f"lost: {result['lost']}, duplicated: {result['duplicated']}, "
+          f"stats consistent: {result['stats_ok']}, rollups consistent: {result['rollups_ok']}")
+    ok = not result["lost"] and not result["duplicated"] and result["stats_ok"] and result["rollups_ok"]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .models import HabitEntity, HabitStats
+from .repository import AsyncHabitRepository
+from .sqlite_repository import SQLiteHabitRepository
+
+_STOP = object()
+
+class AsyncSQLiteHabitRepository(AsyncHabitRepository):
+    """
+    asyncio front end for SQLiteHabitRepository. Reads run on a pool of
+    `read_workers` threads, each with its own connection. All writes go through
+    one writer thread, which drains its queue and commits every run of queued
+    `append_completion` calls as one transaction (up to `max_batch` each), so
+    concurrent writers share a commit instead of paying one apiece.
+    """
+    def __init__(self, db_path: str = "data/habits.db", read_workers: int = 4,
+                 max_batch: int = 1000, **options):
+        self.sync = SQLiteHabitRepository(db_path, **options)
+        self.max_batch = max_batch
+        self._reads = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="habit-read")
+        self._writes: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="habit-writer", daemon=True)
+        self._writer.start()
+
+    async def __aenter__(self) -> "AsyncSQLiteHabitRepository":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _read(self, fn: Callable, *args, **kwargs):
+        return asyncio.get_running_loop().run_in_executor(self._reads, partial(fn, *args, **kwargs))
+
+    def _write(self, fn: Optional[Callable], *args) -> "asyncio.Future":
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._writes.put((fn, args, loop, future))
+        return future
+
+    @staticmethod
+    def _resolve(loop, future, result=None, error: Optional[BaseException] = None) -> None:
+        def settle():
+            if future.cancelled():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        loop.call_soon_threadsafe(settle)
+
+    def _write_loop(self) -> None:
+        while True:
+            pending = [self._writes.get()]
+            # drain whatever queued up while the last transaction committed
+            while len(pending) < self.max_batch:
+                try:
+                    pending.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            appends: List[tuple] = []
+            for item in pending:
+                if item is _STOP:
+                    self._flush_appends(appends)
+                    self.sync.close()
+                    return
+                fn, args, loop, future = item
+                if fn is None:
+                    appends.append(item)
+                    continue
+                self._flush_appends(appends)
+                appends = []
+                try:
+                    self._resolve(loop, future, fn(*args))
+                except Exception as e:
+                    self._resolve(loop, future, error=e)
+            self._flush_appends(appends)
+
+    def _flush_appends(self, appends: List[tuple]) -> None:
+        """Group-commit queued append_completion calls."""
+        if not appends:
+            return
+        try:
+            found = self.sync.record_batch([args for _, args, _, _ in appends])
+        except Exception as e:
+            for _, _, loop, future in appends:
+                self._resolve(loop, future, error=e)
+            return
+        for (_, _, loop, future), ok in zip(appends, found):
+            self._resolve(loop, future, ok)
+
+    async def add(self, habit: HabitEntity) -> HabitEntity:
+        return await self._write(self.sync.add, habit)
+
+    async def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                      ids: Optional[Iterable[int]] = None,
+                      include_completions: bool = True) -> List[HabitEntity]:
+        return await self._read(self.sync.get_all, periodicity=periodicity, category=category,
+                                ids=ids, include_completions=include_completions)
+
+    async def get_by_id(self, id: int) -> Optional[HabitEntity]:
+        return await self._read(self.sync.get_by_id, id)
+
+    async def update(self, habit: HabitEntity) -> None:
+        await self._write(self.sync.update, habit)
+
+    async def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        # fn=None marks a groupable append; args is the (habit_id, timestamp) event
+        return await self._write(None, habit_id, timestamp or datetime.utcnow())
+
+    async def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                              batch_size: int = 10_000) -> int:
+        return await self._write(self.sync.add_completions, list(events), batch_size)
+
+    async def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        return await self._read(self.sync.get_stats, ids=ids)
+
+    async def delete(self, id: int) -> None:
+        await self._write(self.sync.delete, id)
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._reads.shutdown)
+        # the writer commits what is queued, then closes every connection
+        self._writes.put(_STOP)
+        await loop.run_in_executor(None, self._writer.join)
@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .models import HabitEntity, HabitStats
+from .repository import HabitRepository
+from .timestamps import from_epoch_micros, to_epoch_micros
+
+logger = logging.getLogger(__name__)
+
+class BufferedHabitRepository(HabitRepository):
+    """
+    Write-behind buffer in front of another HabitRepository.
+
+    `append_completion` only queues the completion in memory; queued completions
+    are written with one `add_completions` call (one transaction) once
+    `max_size` are waiting, once the oldest is `max_age` seconds old, on
+    `flush()`, and on `close()`. Every other operation flushes first, so reads
+    always see buffered completions and writes keep their order.
+
+    Durability:
+    - journal_path=None: completions still in the buffer are lost if the process
+      dies, i.e. at most `max_size` completions or `max_age` seconds of them.
+    - journal_path set: each completion is appended to that file before it is
+      acknowledged (and fsynced if `journal_fsync`); the journal is truncated
+      after each flush and replayed on startup. Delivery is at-least-once: a
+      crash between a flush committing and the journal being truncated replays
+      that batch again.
+
+    A flush that fails leaves its completions queued (and journaled) for the
+    next attempt. `flush()` raises the error; flushes triggered by size or age
+    log it and retry on the next trigger.
+    """
+    def __init__(self, repo: HabitRepository, max_size: int = 1000, max_age: float = 1.0,
+                 journal_path: Optional[str] = None, journal_fsync: bool = True):
+        if max_size < 1 or max_age <= 0:
+            raise ValueError("`max_size` and `max_age` must be positive")
+        self.repo = repo
+        self.max_size = max_size
+        self.max_age = max_age
+        self.journal_path = journal_path
+        self.journal_fsync = journal_fsync
+        self._buffer: List[Tuple[int, datetime]] = []
+        self._oldest: Optional[float] = None
+        self._known_ids: Set[int] = set()
+        self._lock = threading.RLock()
+        self._journal = None
+        if journal_path:
+            self._replay_journal()
+            self._journal = open(journal_path, "a", encoding="ascii")
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._age_loop, name="habit-flush", daemon=True)
+        self._timer.start()
+
+    def __enter__(self) -> "BufferedHabitRepository":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _replay_journal(self) -> None:
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding="ascii") as f:
+            events = []
+            for line in f:
+                hid, _, micros = line.strip().partition(",")
+                if micros:  # a torn last line was never acknowledged
+                    events.append((int(hid), from_epoch_micros(int(micros))))
+        if events:
+            self.repo.add_completions(events)
+        open(self.journal_path, "w").close()
+
+    def _age_loop(self) -> None:
+        while not self._closed.wait(self.max_age / 4):
+            with self._lock:
+                if self._oldest is not None and time.monotonic() - self._oldest >= self.max_age:
+                    self._try_flush_locked()
+
+    def _try_flush_locked(self) -> None:
+        try:
+            self._flush_locked()
+        except Exception:
+            # the batch stays queued; an exception here must not stop the timer thread
+            logger.exception("flushing %d buffered completions failed", len(self._buffer))
+
+    def _flush_locked(self) -> int:
+        if not self._buffer:
+            return 0
+        events, oldest = self._buffer, self._oldest
+        self._buffer, self._oldest = [], None
+        try:
+            recorded = self.repo.add_completions(events)
+        except BaseException:
+            self._buffer, self._oldest = events + self._buffer, oldest
+            raise
+        # only now are the journaled completions stored
+        if self._journal is not None:
+            self._journal.seek(0)
+            self._journal.truncate()
+        return recorded
+
+    def flush(self) -> int:
+        """Write all buffered completions now; returns how many were recorded."""
+        with self._lock:
+            return self._flush_locked()
+
+    @property
+    def pending(self) -> int:
+        """Completions waiting in the buffer."""
+        return len(self._buffer)
+
+    def close(self) -> None:
+        """Flush, stop the age timer and close the journal."""
+        self._closed.set()
+        self._timer.join()
+        with self._lock:
+            self._flush_locked()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _exists(self, habit_id: int) -> bool:
+        if habit_id not in self._known_ids:
+            if not self.repo.get_all(ids=[habit_id], include_completions=False):
+                return False
+            self._known_ids.add(habit_id)
+        return True
+
+    def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        with self._lock:
+            if not self._exists(habit_id):
+                return False
+            ts = timestamp or datetime.utcnow()
+            if self._journal is not None:
+                self._journal.write(f"{habit_id},{to_epoch_micros(ts)}\n")
+                self._journal.flush()
+                if self.journal_fsync:
+                    os.fsync(self._journal.fileno())
+            self._buffer.append((habit_id, ts))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._buffer) >= self.max_size:
+                # the completion is already acknowledged, so a failed flush is not its failure
+                self._try_flush_locked()
+        return True
+
+    # everything else flushes first and delegates
+
+    def add(self, habit: HabitEntity) -> HabitEntity:
+        with self._lock:
+            self._flush_locked()
+            return self.repo.add(habit)
+
+    def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                ids: Optional[Iterable[int]] = None,
+                include_completions: bool = True) -> List[HabitEntity]:
+        self.flush()
+        return self.repo.get_all(periodicity=periodicity, category=category, ids=ids,
+                                 include_completions=include_completions)
+
+    def get_by_id(self, id: int) -> Optional[HabitEntity]:
+        self.flush()
+        return self.repo.get_by_id(id)
+
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    batch_size: int = 500, include_completions: bool = True) -> Iterator[HabitEntity]:
+        self.flush()
+        return self.repo.iter_habits(periodicity=periodicity, category=category, sort=sort,
+                                     after_id=after_id, limit=limit, batch_size=batch_size,
+                                     include_completions=include_completions)
+
+    def find_by_name(self, name: str, include_completions: bool = True) -> List[HabitEntity]:
+        self.flush()
+        return self.repo.find_by_name(name, include_completions=include_completions)
+
+    def find_by_category(self, category: str, include_completions: bool = True) -> List[HabitEntity]:
+        self.flush()
+        return self.repo.find_by_category(category, include_completions=include_completions)
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None,
+                       include_completions: bool = True) -> List[HabitEntity]:
+        self.flush()
+        return self.repo.find_by_prefix(prefix, limit=limit, include_completions=include_completions)
+
+    def search(self, text: str, limit: Optional[int] = None,
+               include_completions: bool = True) -> List[HabitEntity]:
+        self.flush()
+        return self.repo.search(text, limit=limit, include_completions=include_completions)
+
+    def iter_completions(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         batch_size: int = 10_000) -> Iterator[Tuple[int, datetime]]:
+        self.flush()
+        return self.repo.iter_completions(ids=ids, category=category, since=since, until=until,
+                                          batch_size=batch_size)
+
+    def iter_epochs(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    batch_size: int = 10_000) -> Iterator[Tuple[int, int]]:
+        self.flush()
+        return self.repo.iter_epochs(ids=ids, category=category, since=since, until=until,
+                                     batch_size=batch_size)
+
+    def update(self, habit: HabitEntity) -> None:
+        with self._lock:
+            self._flush_locked()
+            self.repo.update(habit)
+
+    def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                        batch_size: int = 10_000) -> int:
+        with self._lock:
+            self._flush_locked()
+            return self.repo.add_completions(events, batch_size=batch_size)
+
+    def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        self.flush()
+        return self.repo.get_stats(ids=ids)
+
+    def completed_in_period(self, period: str, key: int,
+                            ids: Optional[Iterable[int]] = None) -> Set[int]:
+        self.flush()
+        return self.repo.completed_in_period(period, key, ids=ids)
+
+    def period_counts(self, ids: Iterable[int], period: str) -> Dict[int, Dict[int, int]]:
+        self.flush()
+        return self.repo.period_counts(ids, period)
+
+    def delete(self, id: int) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._known_ids.discard(id)
+            self.repo.delete(id)
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+from .models import HabitEntity, HabitStats
+from .repository import HabitRepository
+
+def _clone(habit: HabitEntity) -> HabitEntity:
+    # callers mutate entities (add_completion before update), so never hand out cached ones
+    return replace(habit, completions=habit.completions[:])
+
+class CachingHabitRepository(HabitRepository):
+    """
+    Read-through cache in front of another HabitRepository.
+
+    `get_by_id` and `get_all` results are kept in one LRU of at most
+    `max_entries` entries, each expiring `ttl` seconds after it was loaded
+    (never, if `ttl` is None). Writes through this repository invalidate what
+    they affect: the habit's own entry and every cached `get_all` result.
+    Writes made behind its back are only picked up once entries expire.
+    `hits`, `misses` and `evictions` count cache traffic.
+    """
+    def __init__(self, repo: HabitRepository, max_entries: int = 1024, ttl: Optional[float] = None):
+        if max_entries < 1:
+            raise ValueError("`max_entries` must be positive")
+        self.repo = repo
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache_info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "max_entries": self.max_entries}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                loaded, value = entry
+                if self.ttl is None or time.monotonic() - loaded < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return False, None
+
+    def _store(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _invalidate(self, habit_id: Optional[int] = None) -> None:
+        with self._lock:
+            if habit_id is not None:
+                self._entries.pop(("id", habit_id), None)
+            for key in [k for k in self._entries if k[0] == "all"]:
+                del self._entries[key]
+
+    def get_by_id(self, id: int) -> Optional[HabitEntity]:
+        found, habit = self._lookup(("id", id))
+        if not found:
+            habit = self.repo.get_by_id(id)
+            self._store(("id", id), habit)
+        return None if habit is None else _clone(habit)
+
+    def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                ids: Optional[Iterable[int]] = None,
+                include_completions: bool = True) -> List[HabitEntity]:
+        key = ("all", periodicity, category,
+               None if ids is None else tuple(sorted(set(ids))), include_completions)
+        found, habits = self._lookup(key)
+        if not found:
+            habits = self.repo.get_all(periodicity=periodicity, category=category, ids=key[3],
+                                       include_completions=include_completions)
+            self._store(key, habits)
+        return [_clone(h) for h in habits]
+
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    batch_size: int = 500, include_completions: bool = True) -> Iterator[HabitEntity]:
+        # pages stream straight from the wrapped repository and are not cached
+        return self.repo.iter_habits(periodicity=periodicity, category=category, sort=sort,
+                                     after_id=after_id, limit=limit, batch_size=batch_size,
+                                     include_completions=include_completions)
+
+    def find_by_name(self, name: str, include_completions: bool = True) -> List[HabitEntity]:
+        # lookups are served by the wrapped repository's indexes and are not cached
+        return self.repo.find_by_name(name, include_completions=include_completions)
+
+    def find_by_category(self, category: str, include_completions: bool = True) -> List[HabitEntity]:
+        return self.repo.find_by_category(category, include_completions=include_completions)
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None,
+                       include_completions: bool = True) -> List[HabitEntity]:
+        return self.repo.find_by_prefix(prefix, limit=limit, include_completions=include_completions)
+
+    def search(self, text: str, limit: Optional[int] = None,
+               include_completions: bool = True) -> List[HabitEntity]:
+        return self.repo.search(text, limit=limit, include_completions=include_completions)
+
+    def iter_completions(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         batch_size: int = 10_000) -> Iterator[Tuple[int, datetime]]:
+        return self.repo.iter_completions(ids=ids, category=category, since=since, until=until,
+                                          batch_size=batch_size)
+
+    def iter_epochs(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    batch_size: int = 10_000) -> Iterator[Tuple[int, int]]:
+        return self.repo.iter_epochs(ids=ids, category=category, since=since, until=until,
+                                     batch_size=batch_size)
+
+    def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        return self.repo.get_stats(ids=ids)
+
+    def completed_in_period(self, period: str, key: int,
+                            ids: Optional[Iterable[int]] = None) -> Set[int]:
+        return self.repo.completed_in_period(period, key, ids=ids)
+
+    def period_counts(self, ids: Iterable[int], period: str) -> Dict[int, Dict[int, int]]:
+        return self.repo.period_counts(ids, period)
+
+    def add(self, habit: HabitEntity) -> HabitEntity:
+        habit = self.repo.add(habit)
+        self._invalidate(habit.id)
+        return habit
+
+    def update(self, habit: HabitEntity) -> None:
+        # a failed update (e.g. a ConcurrentUpdateError) means the cached copy
+        # may be stale, so the retry must read the stored habit afresh
+        try:
+            self.repo.update(habit)
+        finally:
+            self._invalidate(habit.id)
+
+    def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        try:
+            return self.repo.append_completion(habit_id, timestamp)
+        finally:
+            self._invalidate(habit_id)
+
+    def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                        batch_size: int = 10_000) -> int:
+        touched = set()
+
+        def tracked():
+            for event in events:
+                touched.add(event[0])
+                yield event
+
+        try:
+            return self.repo.add_completions(tracked(), batch_size=batch_size)
+        finally:
+            for habit_id in touched:
+                self._invalidate(habit_id)
+
+    def delete(self, id: int) -> None:
+        try:
+            self.repo.delete(id)
+        finally:
+            self._invalidate(id)
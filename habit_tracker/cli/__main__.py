@@ -0,0 +1,20 @@
+"""
+`python -m habit_tracker.cli ...`: hands the command to a running daemon
+when one is listening, and only imports the full CLI otherwise.
+"""
+import sys
+
+from habit_tracker.cli.daemon import forward
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    code = forward(argv)
+    if code is None:
+        from habit_tracker.cli.commands import cli
+        cli.main(args=argv, prog_name="habit_tracker.cli")
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,104 @@
+import importlib
+import os
 import click
-from tabulate import tabulate
-from habit_tracker.sqlite_repository import SQLiteHabitRepository
-from habit_tracker.services import HabitService, AnalyticsService
+
+# Heavy modules (sqlite3, the analytics engines) are imported inside
+# the commands that use them, so e.g. `complete` starts without loading them.
+
+# engine name -> (module, class), imported only when selected
+ANALYTICS_ENGINES = {
+    "memory": ("habit_tracker.services", "AnalyticsService"),
+    "stats": ("habit_tracker.services", "StatsAnalyticsService"),
+    "vector": ("habit_tracker.vectorized", "VectorAnalyticsService"),
+    "sql": ("habit_tracker.sql_analytics", "SQLAnalyticsService"),
+    "windowed": ("habit_tracker.services", "WindowedAnalyticsService"),
+    "parallel": ("habit_tracker.parallel", "ParallelAnalyticsService"),
+}
+
+def _repository():
+    """
+    The repository commands work on: the one passed in as the context object
+    (the daemon keeps one open), else a new SQLiteHabitRepository shared by
+    the rest of this invocation.
+    """
+    root = click.get_current_context().find_root()
+    if root.obj is None:
+        from habit_tracker import instrumentation
+        from habit_tracker.sqlite_repository import SQLiteHabitRepository
+        root.obj = SQLiteHabitRepository()
+        if instrumentation.METRICS.enabled:
+            root.obj = instrumentation.InstrumentedHabitRepository(root.obj)
+    return root.obj
+
+def _analytics(engine, repo, workers=None, chunk_size=1000):
+    from habit_tracker import instrumentation
+    module, name = ANALYTICS_ENGINES[engine]
+    cls = getattr(importlib.import_module(module), name)
+    if engine == "memory":
+        analytics = cls()
+    elif engine == "parallel":
+        analytics = cls(workers=workers, chunk_size=chunk_size)
+    else:
+        analytics = cls(repo)
+    if getattr(analytics, "backend", None) == "array":
+        click.echo("NumPy is not installed; --engine vector runs on its slower array backend.", err=True)
+    if instrumentation.METRICS.enabled:
+        analytics = instrumentation.InstrumentedAnalytics(analytics)
+    return analytics
+
+def _profile_path():
+    return os.environ.get("HABIT_TRACKER_PROFILE", os.path.join("data", "profile.json"))
+
+def _saved_metrics():
+    """Metrics saved by earlier --profile runs plus, in a profiling daemon, the live ones."""
+    import json
+    from habit_tracker import instrumentation
+    metrics = instrumentation.Metrics()
+    if os.path.exists(_profile_path()):
+        with open(_profile_path()) as f:
+            metrics.merge(json.load(f))
+    if instrumentation.METRICS.enabled:
+        metrics.merge(instrumentation.METRICS.snapshot())
+    return metrics
+
+def _finish_profile():
+    """Print this invocation's metrics and add them to the saved profile."""
+    import json
+    from habit_tracker import instrumentation
+    snapshot = instrumentation.METRICS.snapshot()
+    click.echo(instrumentation.format_table(snapshot), err=True)
+    saved = instrumentation.Metrics()
+    if os.path.exists(_profile_path()):
+        with open(_profile_path()) as f:
+            saved.merge(json.load(f))
+    saved.merge(snapshot)
+    if os.path.dirname(_profile_path()):
+        os.makedirs(os.path.dirname(_profile_path()), exist_ok=True)
+    with open(_profile_path(), "w") as f:
+        json.dump(saved.snapshot(), f, indent=2)
+    instrumentation.METRICS.reset()
+    instrumentation.disable()
+
+def _timestamp_option(ctx, param, value):
+    if value is None:
+        return None
+    from habit_tracker.timestamps import parse_timestamp
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise click.BadParameter(f"{value!r} is not an ISO-8601 timestamp or epoch seconds")
 
 @click.group()
-def cli():
+@click.option("--profile", is_flag=True,
+              help="Time repository calls, analytics and SQL statements; print the metrics "
+                   "and add them to the profile shown by `stats`.")
+@click.pass_context
+def cli(ctx, profile):
     """Habit‐Tracker CLI."""
-    pass
+    if profile:
+        from habit_tracker import instrumentation
+        instrumentation.enable()
+        ctx.call_on_close(_finish_profile)
 
 @cli.command()
 @click.option("--name", "-n", required=True, help="Name of the habit.")
@@ -14,69 +106,168 @@ def cli():
 @click.option("--category", "-c", default="general", help="Category of the habit.")
 def create(name, periodicity, category):
     """Create a new habit."""
-    repo = SQLiteHabitRepository()
+    from habit_tracker.services import HabitService
+    repo = _repository()
     svc = HabitService(repo)
     habit = svc.create_habit(name, periodicity, category)
     click.echo(f"Created habit: {habit.name} (ID: {habit.id})")
 
+def _check_selector(habit_id, name):
+    if (habit_id is None) == (name is None):
+        raise click.UsageError("Give either HABIT_ID or --name.")
+
 @cli.command()
-@click.argument("habit_id", type=int)
-def complete(habit_id):
+@click.argument("habit_id", type=int, required=False)
+@click.option("--name", "-n", help="Complete the habit with this name instead of giving its ID.")
+def complete(habit_id, name):
     """Mark an existing habit as completed."""
-    repo = SQLiteHabitRepository()
+    from habit_tracker.services import HabitService
+    _check_selector(habit_id, name)
+    repo = _repository()
     svc = HabitService(repo)
+    if name is not None:
+        matches = svc.find_habits(name=name, include_completions=False)
+        if not matches:
+            return click.echo(f"No habit named {name!r}")
+        if len(matches) > 1:
+            ids = ", ".join(str(h.id) for h in matches)
+            return click.echo(f"Error: {len(matches)} habits are named {name!r} (IDs {ids}); give the ID instead")
+        habit_id = matches[0].id
     try:
         svc.record_completion(habit_id)
         click.echo(f"Recorded completion for habit ID {habit_id}")
     except ValueError as e:
         click.echo(f"Error: {e}")
 
+LIST_HEADERS = ["ID", "Name", "Periodicity", "Category", "Created", "Completions"]
+# columns holding numbers, right-aligned like tabulate aligns them
+LIST_NUMERIC = (0, 5)
+# rows fetched and echoed at a time; columns widen when a later page needs it
+LIST_PAGE = 200
+
+def _list_widths(table, widths=None):
+    """
+    Column widths of tabulate's "plain" format: the widest value, and at
+    least the header plus two. Given earlier `widths`, they only grow.
+    """
+    widths = widths or [len(h) + 2 for h in LIST_HEADERS]
+    columns = list(zip(*table)) or [()] * len(widths)
+    return [max([w, *(len(str(v)) for v in column)]) for w, column in zip(widths, columns)]
+
+def _format_rows(rows, widths, numeric=LIST_NUMERIC):
+    """Rows in the layout of tabulate's "plain" format: numbers right-aligned, text left-aligned."""
+    return "\n".join(
+        "  ".join(str(v).rjust(w) if n in numeric else str(v).ljust(w)
+                  for n, (v, w) in enumerate(zip(row, widths))).rstrip()
+        for row in rows
+    )
+
 @cli.command(name="list")
 @click.option(
     "--periodicity", "-p",
     type=click.Choice(["daily", "weekly"]),
     help="Only show habits with this periodicity."
 )
-def _list(periodicity):
+@click.option("--sort", type=click.Choice(["id", "name", "created"]), default="id", show_default=True,
+              help="Order habits by id, name or creation time.")
+@click.option("--after-id", type=int,
+              help="Start after this habit in --sort order, e.g. the last ID of the previous page.")
+@click.option("--limit", type=click.IntRange(min=0), help="Show at most this many habits.")
+@click.option("--category", "-c", help="Only show habits in this category.")
+@click.option("--name", "-n", help="Only show habits with exactly this name.")
+@click.option("--prefix", help="Only show habits whose name starts with this (case-sensitive).")
+@click.option("--search", "text", help="Only show habits whose name matches all of these words.")
+def _list(periodicity, sort, after_id, limit, category, name, prefix, text):
     """
-    List all habits, optionally filtering by periodicity.
+    List all habits, optionally filtering by periodicity, category or name.
     """
-    repo = SQLiteHabitRepository()
+    from itertools import chain, islice
+    from habit_tracker.services import HabitService
+    repo = _repository()
     svc = HabitService(repo)
-    habits = svc.list_habits()
-    
-    if not habits:
+
+    def pages():
+        if (name, prefix, text) == (None, None, None):
+            habits = svc.iter_habits(periodicity=periodicity, category=category, sort=sort,
+                                     after_id=after_id, limit=limit, include_completions=False)
+        else:
+            # name lookups return few habits, so they are fetched at once and paged here
+            habits = iter(svc.find_habits(name=name, prefix=prefix, text=text, category=category,
+                                          periodicity=periodicity, sort=sort, after_id=after_id,
+                                          limit=limit, include_completions=False))
+        return iter(lambda: list(islice(habits, LIST_PAGE)), [])
+
+    try:
+        rows = pages()
+    except ValueError:
+        return click.echo(f"No habit with ID {after_id}")
+    first = next(rows, [])
+
+    # an empty filtered result only means an empty database if nothing else exists either
+    filtered = any(v is not None for v in (periodicity, category, name, prefix, text))
+    if not first and after_id is None and limit != 0 and (
+            not filtered or next(svc.iter_habits(limit=1, include_completions=False), None) is None):
         click.echo("No habits found; initializing database with defaults.")
+        repo.close()
         ctx = click.get_current_context()
         ctx.invoke(reset)
-        habits = svc.list_habits()
+        rows = pages()
+        first = next(rows, [])
 
-    if periodicity:
-        habits = [h for h in habits if h.periodicity == periodicity]
-
-    table = [
-        [h.id, h.name, h.periodicity, h.category, h.created.date().isoformat(), len(h.completions)]
-        for h in habits
-    ]
-    headers = ["ID", "Name", "Periodicity", "Category", "Created", "Completions"]
-    click.echo(tabulate(table, headers=headers, tablefmt="plain"))
+    widths = None
+    for page in chain([first], rows):
+        # completion counts come from the maintained stats, so no completions are loaded
+        stats = repo.get_stats([h.id for h in page])
+        table = [
+            [h.id, h.name, h.periodicity, h.category, h.created.date().isoformat(),
+             stats[h.id].completion_count if h.id in stats else 0]
+            for h in page
+        ]
+        widths = _list_widths(table, widths)
+        if page is first:
+            # with no rows, tabulate left-aligns every header
+            click.echo(_format_rows([LIST_HEADERS], widths, LIST_NUMERIC if table else ()))
+        if table:
+            click.echo(_format_rows(table, widths))
 
 @cli.command()
 @click.option("--id", "habit_id", type=int, help="Analyze a single habit by ID.")
+@click.option("--name", "-n", help="Only analyze habits with exactly this name.")
+@click.option("--category", "-c", help="Only analyze habits in this category.")
+@click.option("--prefix", help="Only analyze habits whose name starts with this.")
 @click.option("--longest", is_flag=True, help="Show longest streak.")
 @click.option("--current", is_flag=True, help="Show current streak.")
 @click.option("--rate", "completion_rate", is_flag=True, help="Show completion rate.")
 @click.option("--weekly-report", is_flag=True, help="Show this week's report.")
 @click.option("--monthly-report", is_flag=True, help="Show this month's report.")
-def analyze(habit_id, longest, current, completion_rate, weekly_report, monthly_report):
+@click.option("--engine", type=click.Choice(ANALYTICS_ENGINES), default="memory", show_default=True,
+              help="memory: compute from loaded completions; stats: read maintained stats; "
+                   "vector: compute over day-number arrays (with NumPy if installed); sql: compute inside SQLite; "
+                   "parallel: memory engine across a process pool; "
+                   "windowed: only load the completions each metric looks at.")
+@click.option("--workers", type=click.IntRange(min=1),
+              help="Worker processes for --engine parallel (default: one per CPU).")
+@click.option("--chunk-size", type=click.IntRange(min=1), default=1000, show_default=True,
+              help="Habits per worker task for --engine parallel.")
+def analyze(habit_id, name, category, prefix, longest, current, completion_rate, weekly_report,
+            monthly_report, engine, workers, chunk_size):
     """Run analytics."""
-    repo = SQLiteHabitRepository()
+    from habit_tracker.services import HabitService
+    if habit_id and (name, category, prefix) != (None, None, None):
+        raise click.UsageError("--id cannot be combined with --name, --category or --prefix.")
+    repo = _repository()
     svc = HabitService(repo)
-    analytics = AnalyticsService()
-    habits = svc.list_habits()
+    analytics = _analytics(engine, repo, workers, chunk_size)
+    # with --id only that habit is loaded, with the other selectors only the matches
+    if (name, category, prefix) != (None, None, None):
+        habits = svc.find_habits(name=name, prefix=prefix, category=category,
+                                 include_completions=analytics.needs_completions)
+    else:
+        habits = svc.list_habits(ids=[habit_id] if habit_id else None,
+                                 include_completions=analytics.needs_completions)
 
     if habit_id:
-        h = repo.get_by_id(habit_id)
+        h = habits[0] if habits else None
         if not h:
             return click.echo(f"No habit with ID {habit_id}")
         if longest:
@@ -88,8 +279,9 @@ def analyze(habit_id, longest, current, completion_rate, weekly_report, monthly_
         if weekly_report or monthly_report:
             click.echo("Weekly/monthly report applies to all habits only.")
     else:
+        analytics.prefetch(habits)
         if longest:
-            click.echo(f"Max streak (all habits): {max(analytics.longest_streak(h) for h in habits)}")
+            click.echo(f"Max streak (all habits): {max((analytics.longest_streak(h) for h in habits), default=0)}")
         if current:
             click.echo("Current streaks:")
             for h in habits:
@@ -108,48 +300,182 @@ def analyze(habit_id, longest, current, completion_rate, weekly_report, monthly_
             for name, done in rpt.items():
                 click.echo(f"- {name}: {'✅' if done else '❌'}")
 
+@cli.command(name="import")
+@click.argument("source", type=click.File("r"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]),
+              help="Input format (default: from the file extension, else csv).")
+@click.option("--batch-size", type=click.IntRange(min=1), default=10_000, show_default=True,
+              help="Completions written per transaction.")
+def _import(source, fmt, batch_size):
+    """
+    Import completions as (habit_id, timestamp) events from a CSV or
+    JSON Lines file, or stdin when SOURCE is omitted or '-'.
+    Batches committed before an invalid line are kept.
+    """
+    from habit_tracker.formats import read_events
+    from habit_tracker.services import HabitService
+    if fmt is None:
+        fmt = "jsonl" if source.name.endswith((".jsonl", ".ndjson")) else "csv"
+    repo = _repository()
+    svc = HabitService(repo)
+    try:
+        recorded, skipped = svc.record_completions_bulk(read_events(source, fmt), batch_size)
+    except ValueError as e:
+        return click.echo(f"Error: {e}")
+    click.echo(f"Imported {recorded} completions")
+    if skipped:
+        click.echo(f"Skipped {skipped} completions for unknown habits")
+
+@cli.command()
+@click.option("--output", "-o", type=click.File("wb"), default="-",
+              help="Destination file (default: stdout).")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl", "binary"]), default="csv",
+              show_default=True)
+@click.option("--id", "habit_ids", type=int, multiple=True, help="Only export this habit (repeatable).")
+@click.option("--category", "-c", help="Only export habits in this category.")
+@click.option("--since", callback=_timestamp_option, help="Only completions at or after this time.")
+@click.option("--until", callback=_timestamp_option, help="Only completions before this time.")
+def export(output, fmt, habit_ids, category, since, until):
+    """Stream habits and their completions as CSV, JSON Lines or binary."""
+    from habit_tracker.formats import write_export
+    repo = _repository()
+    ids = habit_ids or None
+    habits = repo.get_all(category=category, ids=ids, include_completions=False)
+    completions = repo.iter_completions(ids=ids, category=category, since=since, until=until)
+    write_export(output, fmt, habits, completions)
+
 @cli.command()
 @click.argument("habit_id", type=int)
 def delete(habit_id):
     """Delete a habit by ID."""
-    repo = SQLiteHabitRepository()
+    repo = _repository()
     repo.delete(habit_id)
     click.echo(f"Deleted habit ID {habit_id}")
 
 @cli.command()
 def reset():
     """Wipe and reinitialize the database."""
-    repo = SQLiteHabitRepository()
+    repo = _repository()
+    repo.close()
     import os
-    if os.path.exists(repo.db_path):
-        os.remove(repo.db_path)
+    for path in (repo.db_path + suffix for suffix in ("", "-wal", "-shm")):
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.exists(repo.archive_path):
+        os.remove(repo.archive_path)
     repo._initialize_db()
 
     repo.add_defaults()
 
 @cli.command(name='details')
-@click.argument("habit_id", type=int)
-def details(habit_id):
+@click.argument("habit_id", type=int, required=False)
+@click.option("--name", "-n", help="Show every habit with this name instead of giving an ID.")
+def details(habit_id, name):
     """
     Show detailed info for a habit: creation time and all completion timestamps.
     """
-    repo = SQLiteHabitRepository()
-    habit = repo.get_by_id(habit_id)
-    if not habit:
-        return click.echo(f"No habit with ID {habit_id}")
+    from habit_tracker.services import HabitService
+    _check_selector(habit_id, name)
+    repo = _repository()
+    if name is not None:
+        habits = HabitService(repo).find_habits(name=name)
+        if not habits:
+            return click.echo(f"No habit named {name!r}")
+    else:
+        habit = repo.get_by_id(habit_id)
+        if not habit:
+            return click.echo(f"No habit with ID {habit_id}")
+        habits = [habit]
+
+    for n, habit in enumerate(habits):
+        if n:
+            click.echo("")
+        _echo_details(habit)
 
+def _echo_details(habit):
     click.echo(f"ID:         {habit.id}")
     click.echo(f"Name:       {habit.name}")
     click.echo(f"Periodicity:{habit.periodicity}")
     click.echo(f"Category:   {habit.category}")
     click.echo(f"Created:    {habit.created.isoformat()}")
 
+    if habit.archive is not None:
+        click.echo(f"Archived:   {habit.archive.completion_count} completions, "
+                   f"last {habit.archive.last_completion.isoformat()}")
     if habit.completions:
         click.echo("Completions:")
         for comp in habit.completions:
             click.echo(f"  • {comp.timestamp.isoformat()}")
-    else:
+    elif habit.archive is None:
         click.echo("No completions yet.")
 
+@cli.command()
+@click.option("--keep-days", type=click.IntRange(min=31), default=365, show_default=True,
+              help="Keep completions from this many days in the main database; "
+                   "at least a month, so reports always see the current period.")
+def compact(keep_days):
+    """
+    Move older completions to the archive database, keeping their streak
+    state for analytics, then release the freed space.
+    """
+    from datetime import datetime, time, timedelta
+    repo = _repository()
+    horizon = datetime.combine(datetime.utcnow().date() - timedelta(days=keep_days), time.min)
+    moved = repo.compact(horizon)
+    click.echo(f"Archived {moved} completions before {horizon.date().isoformat()} to {repo.archive_path}")
+    click.echo(f"Reclaimed {repo.vacuum() / 1024:.0f} KiB")
+
+@cli.command()
+@click.option("--json", "as_json", is_flag=True, help="Print the metrics as JSON.")
+@click.option("--output", "-o", type=click.File("w"), help="Write the metrics as JSON to this file.")
+@click.option("--reset", "clear", is_flag=True, help="Discard the collected metrics.")
+def stats(as_json, output, clear):
+    """
+    Show the latency histograms, SQL statement counts and rows hydrated
+    collected by `--profile` runs (and by a daemon started with --profile).
+    """
+    import json
+    from habit_tracker import instrumentation
+    if clear:
+        if os.path.exists(_profile_path()):
+            os.remove(_profile_path())
+        instrumentation.METRICS.reset()
+        return click.echo("Metrics cleared.")
+    snapshot = _saved_metrics().snapshot()
+    if output is not None:
+        json.dump(snapshot, output, indent=2)
+    elif as_json:
+        click.echo(json.dumps(snapshot, indent=2))
+    elif not snapshot["operations"] and not snapshot["statements"]:
+        click.echo("No metrics yet; run commands with --profile first.")
+    else:
+        click.echo(instrumentation.format_table(snapshot))
+
+@cli.command()
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False),
+              help="Unix socket to listen on (default: $HABIT_TRACKER_SOCKET or data/habits.sock).")
+def daemon(socket_path):
+    """
+    Keep the database open and serve commands sent by `python -m habit_tracker.cli`
+    until interrupted.
+    """
+    import signal
+    from habit_tracker.cli.daemon import FORWARDED_COMMANDS, serve
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    repo = _repository()
+    click.echo(f"Serving {', '.join(FORWARDED_COMMANDS)}; press Ctrl-C to stop.")
+    try:
+        serve(repo, socket_path)
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        repo.close()
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Persistent daemon mode.
+
+`serve` keeps one repository (and its warm SQLite connection, page cache and
+imported modules) open and runs CLI invocations forwarded over a Unix socket.
+`forward` is the client side; it only needs the standard library, so a
+forwarded command never imports click or sqlite3.
+
+A request is one JSON object {"argv": [...]} and the reply is
+{"code": exit_code, "stdout": ..., "stderr": ...}; each side closes its
+end when done writing. A request that cannot be read gets code 2 and the
+reason on stderr.
+"""
+import json
+import os
+import socket
+
+DEFAULT_SOCKET = os.path.join("data", "habits.sock")
+
+# commands that neither read stdin nor write binary output; `reset` has to run
+# in the daemon, which would otherwise keep writing to the deleted database
+FORWARDED_COMMANDS = ("create", "complete", "list", "analyze", "details", "delete", "stats", "reset")
+
+
+def socket_path() -> str:
+    return os.environ.get("HABIT_TRACKER_SOCKET", DEFAULT_SOCKET)
+
+
+def _read_all(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def forward(argv, path=None):
+    """
+    Run `argv` on a running daemon and replay its output.
+    Returns the exit code, or None when the command has to run locally:
+    no daemon is listening, or the command is not one the daemon runs.
+    """
+    import sys
+    if not argv or argv[0] not in FORWARDED_COMMANDS or not hasattr(socket, "AF_UNIX"):
+        return None
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(path)
+        except OSError:
+            # stale socket file left by a daemon that did not shut down cleanly
+            return None
+        client.sendall(json.dumps({"argv": list(argv)}).encode())
+        client.shutdown(socket.SHUT_WR)
+        reply = json.loads(_read_all(client))
+    finally:
+        client.close()
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    return reply["code"]
+
+
+def _parse(raw: bytes):
+    """The argv of a request, or None if it is not a well-formed request."""
+    try:
+        request = json.loads(raw)
+    except ValueError:
+        return None
+    argv = request.get("argv") if isinstance(request, dict) else None
+    if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+        return None
+    return argv
+
+
+def _run(argv, repo) -> dict:
+    import contextlib
+    import io
+    import traceback
+    from habit_tracker.cli.commands import cli
+
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            cli.main(args=argv, prog_name="habit_tracker.cli", obj=repo)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    return {"code": code, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+
+def serve(repo, path=None, stop=None, ready=None) -> None:
+    """
+    Answer forwarded invocations one at a time until interrupted, or until
+    the `stop` event is set. `ready` is set once the socket is listening.
+    """
+    path = path or socket_path()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+        else:
+            raise ValueError(f"a daemon is already listening on {path}")
+        finally:
+            probe.close()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        server.listen(16)
+        # only wakes up an idle daemon to look at `stop`
+        server.settimeout(0.5)
+        if ready is not None:
+            ready.set()
+        while stop is None or not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(None)
+                try:
+                    argv = _parse(_read_all(conn))
+                    if argv is None:
+                        reply = {"code": 2, "stdout": "", "stderr": "Error: malformed daemon request\n"}
+                    else:
+                        reply = _run(argv, repo)
+                    conn.sendall(json.dumps(reply).encode())
+                except OSError:
+                    # the client went away; the next one is unaffected
+                    continue
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+import struct
+from datetime import datetime
+from typing import IO, Dict, Iterable, Iterator, Tuple, Union
+from .models import HabitEntity
+from .timestamps import from_epoch, parse_timestamp, to_epoch
+
+EVENT_FORMATS = ("csv", "jsonl")
+EXPORT_FORMATS = ("csv", "jsonl", "binary")
+
+# binary export: magic header, then tagged little-endian records
+BINARY_MAGIC = b"HTRK\x01"
+_HABIT = struct.Struct("<qq")        # id, created (epoch seconds)
+_STR_LEN = struct.Struct("<H")       # utf-8 length prefix
+_COMPLETION = struct.Struct("<qq")   # habit_id, timestamp (epoch seconds)
+
+def _event(habit_id, timestamp, line: int) -> Tuple[int, datetime]:
+    try:
+        if isinstance(habit_id, (bool, float)):
+            raise ValueError
+        return int(habit_id), parse_timestamp(timestamp)
+    except (TypeError, ValueError):
+        raise ValueError(f"line {line}: invalid event ({habit_id!r}, {timestamp!r})") from None
+
+def read_csv_events(stream: IO[str]) -> Iterator[Tuple[int, datetime]]:
+    """
+    Yield (habit_id, timestamp) pairs from CSV. A header row naming `habit_id`
+    and `timestamp` selects those columns; otherwise they are the first two.
+    """
+    id_col, ts_col = 0, 1
+    for line, row in enumerate(csv.reader(stream), start=1):
+        if not row:
+            continue
+        if line == 1 and "habit_id" in row and "timestamp" in row:
+            id_col, ts_col = row.index("habit_id"), row.index("timestamp")
+            continue
+        if len(row) <= max(id_col, ts_col):
+            raise ValueError(f"line {line}: expected habit_id and timestamp columns")
+        yield _event(row[id_col], row[ts_col], line)
+
+def read_jsonl_events(stream: IO[str]) -> Iterator[Tuple[int, datetime]]:
+    """Yield (habit_id, timestamp) pairs from JSON Lines objects."""
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line}: {e}") from None
+        if not isinstance(obj, dict):
+            raise ValueError(f"line {line}: expected a JSON object")
+        if obj.get("type") == "habit":
+            # habit records from `export --format jsonl`
+            continue
+        yield _event(obj.get("habit_id"), obj.get("timestamp"), line)
+
+def read_events(stream: IO[str], fmt: str) -> Iterator[Tuple[int, datetime]]:
+    """Stream completion events from `stream` in the given format."""
+    if fmt == "csv":
+        return read_csv_events(stream)
+    if fmt == "jsonl":
+        return read_jsonl_events(stream)
+    raise ValueError(f"`fmt` must be one of {', '.join(EVENT_FORMATS)}")
+
+
+def write_export(out: IO[bytes], fmt: str, habits: Iterable[HabitEntity],
+                 completions: Iterable[Tuple[int, datetime]]) -> int:
+    """
+    Write habits and a stream of (habit_id, timestamp) completions to `out`.
+    Completions are written as they arrive, so memory use does not depend on
+    how many there are. Completions of habits not in `habits` (e.g. one
+    created after they were read) are skipped. Returns the number of
+    completions written.
+
+    - csv: one row per completion, carrying its habit's columns
+    - jsonl: one `habit` record per habit, followed by `completion` records
+    - binary: BINARY_MAGIC, then `H` habit and `C` completion records
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"`fmt` must be one of {', '.join(EXPORT_FORMATS)}")
+    written = 0
+    by_id: Dict[int, HabitEntity] = {h.id: h for h in habits}
+    completions = ((hid, ts) for hid, ts in completions if hid in by_id)
+    if fmt == "binary":
+        out.write(BINARY_MAGIC)
+        for h in by_id.values():
+            out.write(b"H" + _HABIT.pack(h.id, to_epoch(h.created)))
+            for text in (h.name, h.periodicity, h.category):
+                raw = text.encode("utf-8")
+                out.write(_STR_LEN.pack(len(raw)) + raw)
+        for hid, ts in completions:
+            out.write(b"C" + _COMPLETION.pack(hid, to_epoch(ts)))
+            written += 1
+        out.flush()
+        return written
+
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=False)
+    try:
+        if fmt == "csv":
+            writer = csv.writer(text, lineterminator="\n")
+            writer.writerow(["habit_id", "name", "periodicity", "category", "created", "timestamp"])
+            for hid, ts in completions:
+                h = by_id[hid]
+                writer.writerow([hid, h.name, h.periodicity, h.category,
+                                 h.created.isoformat(), ts.isoformat()])
+                written += 1
+        else:
+            for h in by_id.values():
+                text.write(json.dumps({
+                    "type": "habit", "habit_id": h.id, "name": h.name,
+                    "periodicity": h.periodicity, "category": h.category,
+                    "created": h.created.isoformat(),
+                }) + "\n")
+            for hid, ts in completions:
+                text.write(json.dumps({
+                    "type": "completion", "habit_id": hid, "timestamp": ts.isoformat()
+                }) + "\n")
+                written += 1
+        text.flush()
+    finally:
+        # leave `out` open for the caller
+        text.detach()
+    return written
+
+def read_binary_export(stream: IO[bytes]) -> Iterator[Union[HabitEntity, Tuple[int, datetime]]]:
+    """Yield the habits and (habit_id, timestamp) completions of a binary export."""
+    if stream.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("not a habit tracker binary export")
+    while True:
+        tag = stream.read(1)
+        if not tag:
+            return
+        if tag == b"C":
+            hid, ts = _COMPLETION.unpack(stream.read(_COMPLETION.size))
+            yield hid, from_epoch(ts)
+        elif tag == b"H":
+            hid, created = _HABIT.unpack(stream.read(_HABIT.size))
+            name, periodicity, category = (
+                stream.read(_STR_LEN.unpack(stream.read(_STR_LEN.size))[0]).decode("utf-8")
+                for _ in range(3)
+            )
+            yield HabitEntity(id=hid, name=name, periodicity=periodicity, category=category,
+                              created=from_epoch(created))
+        else:
+            raise ValueError(f"unknown record tag {tag!r}")
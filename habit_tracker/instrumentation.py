@@ -0,0 +1,339 @@
+"""
+Opt-in metrics for the hot paths: latency histograms for repository and
+analytics calls, SQL statement counts and durations, and rows hydrated.
+
+Nothing is measured until `enable()` is called. Repositories and analytics
+engines are only timed when wrapped in InstrumentedHabitRepository /
+InstrumentedAnalytics, and SQLiteHabitRepository only checks `METRICS.enabled`
+once per new connection and once per hydrated result set, so leaving
+instrumentation off costs next to nothing.
+
+SQL durations come from the sqlite3 trace callback, which only reports when a
+statement starts: a statement is charged from its start until the next
+statement on the same thread starts or the enclosing instrumented call returns,
+so the time spent hydrating its rows is included.
+"""
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .models import HabitEntity, HabitStats
+from .repository import HabitRepository
+
+# literals and IN (...) lists, so statements differing only in values share a key
+_LITERALS = re.compile(r"'(?:[^']|'')*'|-?\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"IN \(\?(?:\s*,\s*\?)+\)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    sql = _LITERALS.sub("?", " ".join(sql.split()))
+    return _LISTS.sub("IN (?, ...)", sql)
+
+
+class Histogram:
+    """Latencies in power-of-two microsecond buckets, plus count, total, min and max."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        # bucket b holds durations below 2**b microseconds
+        bucket = max(int(seconds * 1e6), 1).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound, in seconds, of the bucket holding the q-th quantile."""
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** bucket / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1e3,
+            "min_ms": self.min * 1e3 if self.count else 0.0,
+            "max_ms": self.max * 1e3,
+            "p50_ms": self.percentile(0.5) * 1e3,
+            "p95_ms": self.percentile(0.95) * 1e3,
+            "p99_ms": self.percentile(0.99) * 1e3,
+            "buckets_us": {str(2 ** b): n for b, n in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        hist = cls()
+        hist.count = data["count"]
+        hist.total = data["total_ms"] / 1e3
+        hist.min = data["min_ms"] / 1e3 if hist.count else float("inf")
+        hist.max = data["max_ms"] / 1e3
+        hist.buckets = {int(bound).bit_length() - 1: n for bound, n in data["buckets_us"].items()}
+        return hist
+
+    def merge(self, other: "Histogram") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for bucket, n in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + n
+
+
+class Metrics:
+    """Process-wide metrics registry; see the module docstring."""
+    def __init__(self):
+        self.enabled = False
+        self.operations: Dict[str, Histogram] = {}
+        self.statements: Dict[str, Histogram] = {}
+        self.rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pending = threading.local()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations.clear()
+            self.statements.clear()
+            self.rows.clear()
+
+    def record(self, name: str, seconds: float) -> None:
+        self.finish_statement()
+        with self._lock:
+            self.operations.setdefault(name, Histogram()).record(seconds)
+
+    def count_rows(self, kind: str, n: int) -> None:
+        with self._lock:
+            self.rows[kind] = self.rows.get(kind, 0) + n
+
+    def start_statement(self, sql: str) -> None:
+        now = time.perf_counter()
+        self.finish_statement(now)
+        self._pending.statement = (normalize_sql(sql), now)
+
+    def finish_statement(self, now: Optional[float] = None) -> None:
+        """Close the statement this thread has running, if any."""
+        pending = getattr(self._pending, "statement", None)
+        if pending is None:
+            return
+        self._pending.statement = None
+        sql, started = pending
+        elapsed = (time.perf_counter() if now is None else now) - started
+        with self._lock:
+            self.statements.setdefault(sql, Histogram()).record(elapsed)
+
+    def snapshot(self) -> dict:
+        """The metrics so far as a JSON-serializable dict."""
+        self.finish_statement()
+        with self._lock:
+            return {
+                "operations": {name: h.to_dict() for name, h in sorted(self.operations.items())},
+                "statements": {sql: h.to_dict() for sql, h in sorted(self.statements.items())},
+                "rows": dict(sorted(self.rows.items())),
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        """Add a snapshot (e.g. one saved by an earlier process) into these metrics."""
+        with self._lock:
+            for table, key in ((self.operations, "operations"), (self.statements, "statements")):
+                for name, data in snapshot.get(key, {}).items():
+                    table.setdefault(name, Histogram()).merge(Histogram.from_dict(data))
+            for kind, n in snapshot.get("rows", {}).items():
+                self.rows[kind] = self.rows.get(kind, 0) + n
+
+
+METRICS = Metrics()
+
+
+def enable() -> None:
+    METRICS.enabled = True
+
+
+def disable() -> None:
+    METRICS.enabled = False
+
+
+def trace(conn) -> None:
+    """Count and time the statements run on a sqlite3 connection (if enabled)."""
+    if METRICS.enabled:
+        conn.set_trace_callback(METRICS.start_statement)
+
+
+def count_rows(kind: str, n: int) -> None:
+    """Count `n` rows of `kind` read from the database (if enabled)."""
+    if METRICS.enabled:
+        METRICS.count_rows(kind, n)
+
+
+def hydrated(habits: Iterable[HabitEntity]) -> None:
+    """Count loaded habit and completion rows (if enabled)."""
+    if METRICS.enabled:
+        habits = list(habits)
+        METRICS.count_rows("habits", len(habits))
+        METRICS.count_rows("completions", sum(len(h.completions) for h in habits))
+
+
+class _Timer:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        METRICS.record(self.name, time.perf_counter() - self.started)
+
+
+def timed(name: str) -> _Timer:
+    """Context manager recording its block's duration under `name`."""
+    return _Timer(name)
+
+
+class InstrumentedHabitRepository(HabitRepository):
+    """
+    Times every HabitRepository call on `repo` under "<RepoClass>.<method>".
+    Other attributes (`close`, `connection`, ...) pass through untimed.
+    """
+    def __init__(self, repo: HabitRepository):
+        self.repo = repo
+        self._prefix = type(repo).__name__
+
+    def __getattr__(self, name):
+        return getattr(self.repo, name)
+
+    def add(self, habit: HabitEntity) -> HabitEntity:
+        with timed(f"{self._prefix}.add"):
+            return self.repo.add(habit)
+
+    def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                ids: Optional[Iterable[int]] = None,
+                include_completions: bool = True) -> List[HabitEntity]:
+        with timed(f"{self._prefix}.get_all"):
+            return self.repo.get_all(periodicity, category, ids, include_completions)
+
+    def get_by_id(self, id: int) -> Optional[HabitEntity]:
+        with timed(f"{self._prefix}.get_by_id"):
+            return self.repo.get_by_id(id)
+
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    batch_size: int = 500, include_completions: bool = True) -> Iterator[HabitEntity]:
+        # a plain method, so bad arguments raise here as they do unwrapped, not on the first next()
+        started = time.perf_counter()
+        habits = self.repo.iter_habits(periodicity, category, sort, after_id, limit,
+                                       batch_size, include_completions)
+        return self._timed_stream(f"{self._prefix}.iter_habits", habits, started)
+
+    @staticmethod
+    def _timed_stream(name: str, stream: Iterator, started: float) -> Iterator:
+        """Yield from `stream`, recording the time from `started` until it is exhausted or closed."""
+        try:
+            yield from stream
+        finally:
+            METRICS.record(name, time.perf_counter() - started)
+
+    def find_by_name(self, name: str, include_completions: bool = True) -> List[HabitEntity]:
+        with timed(f"{self._prefix}.find_by_name"):
+            return self.repo.find_by_name(name, include_completions)
+
+    def find_by_category(self, category: str, include_completions: bool = True) -> List[HabitEntity]:
+        with timed(f"{self._prefix}.find_by_category"):
+            return self.repo.find_by_category(category, include_completions)
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None,
+                       include_completions: bool = True) -> List[HabitEntity]:
+        with timed(f"{self._prefix}.find_by_prefix"):
+            return self.repo.find_by_prefix(prefix, limit, include_completions)
+
+    def search(self, text: str, limit: Optional[int] = None,
+               include_completions: bool = True) -> List[HabitEntity]:
+        with timed(f"{self._prefix}.search"):
+            return self.repo.search(text, limit, include_completions)
+
+    def iter_completions(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                         since=None, until=None, batch_size: int = 10_000) -> Iterator[Tuple[int, object]]:
+        # timed until the stream is exhausted or closed
+        with timed(f"{self._prefix}.iter_completions"):
+            yield from self.repo.iter_completions(ids, category, since, until, batch_size)
+
+    def iter_epochs(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                    since=None, until=None, batch_size: int = 10_000) -> Iterator[Tuple[int, int]]:
+        with timed(f"{self._prefix}.iter_epochs"):
+            yield from self.repo.iter_epochs(ids, category, since, until, batch_size)
+
+    def completions_in_window(self, ids, since=None, until=None):
+        with timed(f"{self._prefix}.completions_in_window"):
+            return self.repo.completions_in_window(ids, since, until)
+
+    def completed_in_period(self, period: str, key: int,
+                            ids: Optional[Iterable[int]] = None) -> Set[int]:
+        with timed(f"{self._prefix}.completed_in_period"):
+            return self.repo.completed_in_period(period, key, ids)
+
+    def period_counts(self, ids: Iterable[int], period: str) -> Dict[int, Dict[int, int]]:
+        with timed(f"{self._prefix}.period_counts"):
+            return self.repo.period_counts(ids, period)
+
+    def update(self, habit: HabitEntity) -> None:
+        with timed(f"{self._prefix}.update"):
+            self.repo.update(habit)
+
+    def append_completion(self, habit_id: int, timestamp=None) -> bool:
+        with timed(f"{self._prefix}.append_completion"):
+            return self.repo.append_completion(habit_id, timestamp)
+
+    def add_completions(self, events, batch_size: int = 10_000) -> int:
+        with timed(f"{self._prefix}.add_completions"):
+            return self.repo.add_completions(events, batch_size)
+
+    def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        with timed(f"{self._prefix}.get_stats"):
+            return self.repo.get_stats(ids)
+
+    def delete(self, id: int) -> None:
+        with timed(f"{self._prefix}.delete"):
+            self.repo.delete(id)
+
+
+class InstrumentedAnalytics:
+    """Times the analytics calls of an engine under "<EngineClass>.<method>"."""
+    TIMED = ("prefetch", "longest_streak", "current_streak", "completion_rate", "report")
+
+    def __init__(self, analytics):
+        self.analytics = analytics
+        self._prefix = type(analytics).__name__
+
+    def __getattr__(self, name):
+        attr = getattr(self.analytics, name)
+        if name not in self.TIMED:
+            return attr
+
+        def call(*args, **kwargs):
+            with timed(f"{self._prefix}.{name}"):
+                return attr(*args, **kwargs)
+        return call
+
+
+def format_table(snapshot: dict) -> str:
+    """Plain-text rendering of a snapshot."""
+    lines = [f"{'operation':44} {'count':>7} {'total ms':>10} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+    for title, key in (("", "operations"), ("SQL", "statements")):
+        if title:
+            lines.append(f"\n{title}")
+        for name, h in snapshot[key].items():
+            label = name if len(name) <= 44 else name[:41] + "..."
+            lines.append(f"{label:44} {h['count']:7d} {h['total_ms']:10.2f} "
+                         f"{h['p50_ms']:9.3f} {h['p95_ms']:9.3f} {h['max_ms']:9.3f}")
+    if snapshot["rows"]:
+        lines.append("\nrows hydrated: " + ", ".join(f"{k} {n}" for k, n in snapshot["rows"].items()))
+    return "\n".join(lines)
@@ -1,20 +1,119 @@
+import sys
+from array import array
+from collections.abc import MutableSequence
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterable, Iterator, Optional
+from .timestamps import from_epoch_micros, to_epoch_micros
 
-@dataclass
+# slotted dataclasses drop the per-instance __dict__ (Python 3.10+)
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class CompletionRecord:
     timestamp: datetime = field(default_factory=datetime.utcnow)
-    
-@dataclass
+
+class CompletionList(MutableSequence):
+    """
+    List of CompletionRecord stored as a packed array of epoch microseconds
+    (8 bytes per completion). Records are built on access, so changing a
+    record's timestamp in place does not write back; assign the item instead.
+    """
+    __slots__ = ("_micros",)
+
+    def __init__(self, records: Iterable[CompletionRecord] = ()):
+        self._micros = array("q", (to_epoch_micros(r.timestamp) for r in records))
+
+    @classmethod
+    def from_epoch_seconds(cls, seconds: Iterable[int]) -> "CompletionList":
+        completions = cls()
+        completions._micros = array("q", (s * 1_000_000 for s in seconds))
+        return completions
+
+    def append_epoch(self, seconds: int) -> None:
+        """Append a completion given as epoch seconds, without building a datetime."""
+        self._micros.append(seconds * 1_000_000)
+
+    def epoch_micros(self) -> array:
+        """The underlying array of epoch microseconds, in list order."""
+        return self._micros
+
+    def __len__(self) -> int:
+        return len(self._micros)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sliced = CompletionList()
+            sliced._micros = self._micros[index]
+            return sliced
+        return CompletionRecord(timestamp=from_epoch_micros(self._micros[index]))
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            self._micros[index] = array("q", (to_epoch_micros(r.timestamp) for r in value))
+        else:
+            self._micros[index] = to_epoch_micros(value.timestamp)
+
+    def __delitem__(self, index) -> None:
+        del self._micros[index]
+
+    def insert(self, index: int, value: CompletionRecord) -> None:
+        self._micros.insert(index, to_epoch_micros(value.timestamp))
+
+    def __iter__(self) -> Iterator[CompletionRecord]:
+        for micros in self._micros:
+            yield CompletionRecord(timestamp=from_epoch_micros(micros))
+
+    def sort(self, *, key=None, reverse: bool = False) -> None:
+        if key is None:
+            self._micros = array("q", sorted(self._micros, reverse=reverse))
+        else:
+            self[:] = sorted(self, key=key, reverse=reverse)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CompletionList):
+            return self._micros == other._micros
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CompletionList({list(self)!r})"
+
+@dataclass(**_SLOTS)
 class HabitEntity:
     name: str
     periodicity: str
     category: str
     id: Optional[int] = None
     created: datetime = field(default_factory=datetime.utcnow)
-    completions: List[CompletionRecord] = field(default_factory=list)
+    completions: MutableSequence = field(default_factory=CompletionList)
+    # the stored version this entity was loaded at, checked by HabitRepository.update
+    version: int = 0
+    # stats over the completions compacted out of `completions` into the archive, if any
+    archive: Optional["HabitStats"] = None
+    # False when loaded with include_completions=False: `completions` is then empty
+    # whatever is stored, and HabitRepository.update leaves the stored ones alone
+    completions_loaded: bool = True
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.completions, CompletionList):
+            self.completions = CompletionList(self.completions)
     
     def add_completion(self) -> None:
         """Record a new completion at the current time."""
         self.completions.append(CompletionRecord())
+
+
+@dataclass(**_SLOTS)
+class HabitStats:
+    """Streak and count state for one habit, maintained as completions are recorded."""
+    habit_id: int
+    completion_count: int = 0
+    longest_streak: int = 0
+    # streak (as counted by longest_streak) ending at the last completion
+    run_length: int = 0
+    run_start: Optional[datetime] = None
+    # trailing completions no more than one period apart (as counted by current_streak)
+    chain_length: int = 0
+    last_completion: Optional[datetime] = None
@@ -0,0 +1,119 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from .models import CompletionList, HabitEntity
+from .services import AnalyticsService
+from .timestamps import from_epoch_micros, to_epoch_micros
+
+# A chunk crosses the process boundary as a few flat buffers rather than pickled
+# entities: periodicity flags, created timestamps, completion offsets, and all
+# completion timestamps (epoch microseconds) back to back.
+Chunk = Tuple[bytes, bytes, bytes, bytes]
+# results per habit: longest, current, weekly report, monthly report
+_COLUMNS = 4
+
+def _pack(habits: List[HabitEntity]) -> Chunk:
+    daily = array("b", (h.periodicity == "daily" for h in habits))
+    created = array("q", (to_epoch_micros(h.created) for h in habits))
+    offsets, micros = array("q", [0]), array("q")
+    for h in habits:
+        if isinstance(h.completions, CompletionList):
+            micros.extend(h.completions.epoch_micros())
+        else:
+            micros.extend(to_epoch_micros(c.timestamp) for c in h.completions)
+        offsets.append(len(micros))
+    return daily.tobytes(), created.tobytes(), offsets.tobytes(), micros.tobytes()
+
+def _analyze_chunk(chunk: Chunk) -> bytes:
+    """
+    Worker: rebuild the chunk's habits and run AnalyticsService on them. Returns,
+    per habit, longest streak, current streak and weekly and monthly report flags
+    as a flat array('q').
+    """
+    daily, created, offsets, micros = (array(code, raw) for code, raw in zip("bqqq", chunk))
+    habits = []
+    for i, is_daily in enumerate(daily):
+        completions = CompletionList()
+        completions.epoch_micros().extend(micros[offsets[i]:offsets[i + 1]])
+        habits.append(HabitEntity(name=str(i), periodicity="daily" if is_daily else "weekly",
+                                  category="", created=from_epoch_micros(created[i]),
+                                  completions=completions))
+    analytics = AnalyticsService()
+    weekly = analytics.report(habits, "weekly")
+    monthly = analytics.report(habits, "monthly")
+    out = array("q")
+    for h in habits:
+        out.extend((analytics.longest_streak(h), analytics.current_streak(h),
+                    weekly[h.name], monthly[h.name]))
+    return out.tobytes()
+
+class ParallelAnalyticsService:
+    """
+    AnalyticsService run across a process pool: `prefetch` shards habits into
+    chunks of `chunk_size`, analyzes them on `workers` processes, and merges the
+    results in input order. With one worker everything runs in-process.
+    """
+    needs_completions = True
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 1000):
+        if chunk_size < 1:
+            raise ValueError("`chunk_size` must be positive")
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._serial = AnalyticsService()
+        self._results: Dict[int, Tuple[int, ...]] = {}
+
+    @staticmethod
+    def _key(habit: HabitEntity) -> int:
+        return habit.id if habit.id is not None else id(habit)
+
+    def _chunks(self, habits: List[HabitEntity]) -> Iterator[Chunk]:
+        for i in range(0, len(habits), self.chunk_size):
+            yield _pack(habits[i:i + self.chunk_size])
+
+    def prefetch(self, habits: List[HabitEntity]) -> None:
+        """Analyze `habits` on the pool."""
+        # compacted habits are left to the in-process fallback in _result, since
+        # chunks do not carry archive summaries
+        habits = [h for h in habits if self._key(h) not in self._results and h.archive is None]
+        if not habits:
+            return
+        if self.workers == 1:
+            packed = map(_analyze_chunk, self._chunks(habits))
+            self._merge(habits, packed)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                # map yields in submission order, so merging is deterministic
+                self._merge(habits, pool.map(_analyze_chunk, self._chunks(habits)))
+
+    def _merge(self, habits: List[HabitEntity], packed) -> None:
+        values = array("q")
+        for raw in packed:
+            values.frombytes(raw)
+        for i, h in enumerate(habits):
+            self._results[self._key(h)] = tuple(values[i * _COLUMNS:(i + 1) * _COLUMNS])
+
+    def _result(self, habit: HabitEntity) -> Tuple[int, ...]:
+        if self._key(habit) not in self._results:
+            self._results[self._key(habit)] = (
+                self._serial.longest_streak(habit), self._serial.current_streak(habit),
+                *(self._serial.report([habit], p)[habit.name] for p in ("weekly", "monthly")),
+            )
+        return self._results[self._key(habit)]
+
+    def longest_streak(self, habit: HabitEntity) -> int:
+        return self._result(habit)[0]
+
+    def current_streak(self, habit: HabitEntity) -> int:
+        return self._result(habit)[1]
+
+    def completion_rate(self, habit: HabitEntity) -> float:
+        # only needs the completion count, cheaper than shipping it back
+        return self._serial.completion_rate(habit)
+
+    def report(self, habits: List[HabitEntity], period: str) -> Dict[str,bool]:
+        if period not in ("weekly", "monthly"):
+            raise ValueError("`period` must be 'weekly' or 'monthly'")
+        self.prefetch(habits)
+        column = 2 if period == "weekly" else 3
+        return {h.name: bool(self._result(h)[column]) for h in habits}
@@ -1,6 +1,22 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from .models import HabitEntity
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from . import streaks
+from .models import HabitEntity, HabitStats
+from .timestamps import to_epoch
+
+# orderings accepted by iter_habits; ties are broken by id so every key is unique
+SORT_KEYS: Dict[str, Callable[[HabitEntity], tuple]] = {
+    "id": lambda habit: (habit.id,),
+    "name": lambda habit: (habit.name, habit.id),
+    "created": lambda habit: (habit.created, habit.id),
+}
+
+class ConcurrentUpdateError(ValueError):
+    """
+    update() was given a habit whose stored copy changed after it was loaded
+    (its `version` is stale). Reload the habit, reapply the change and retry.
+    """
 
 class HabitRepository(ABC):
     """Abstract interface for habit persistance."""
@@ -10,17 +26,217 @@ class HabitRepository(ABC):
         ...
         
     @abstractmethod
-    def get_all(self) -> List[HabitEntity]:
+    def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                ids: Optional[Iterable[int]] = None,
+                include_completions: bool = True) -> List[HabitEntity]:
+        """
+        Return all habits ordered by id, optionally restricted by periodicity,
+        category or ids. With include_completions=False only the habit rows are loaded
+        and the habits come back with `completions_loaded` False.
+        """
         ...
         
     @abstractmethod
     def get_by_id(self, id: int) -> Optional[HabitEntity]:
         ...
-        
+
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    batch_size: int = 500, include_completions: bool = True) -> Iterator[HabitEntity]:
+        """
+        Yield habits ordered by `sort` (see SORT_KEYS), starting after habit
+        `after_id` in that order and stopping after `limit` habits.
+
+        Repositories backed by a database override this to fetch `batch_size`
+        habits per keyset query, so memory stays bounded however many habits
+        there are; this default loads the matching habits all at once.
+        """
+        start = self._resume_key(sort, after_id, limit, batch_size)
+        key = SORT_KEYS[sort]
+        habits = sorted(self.get_all(periodicity, category, include_completions=include_completions),
+                        key=key)
+        if start is not None:
+            habits = [habit for habit in habits if key(habit) > start]
+        return iter(habits[:limit])
+
+    def _resume_key(self, sort: str, after_id: Optional[int], limit: Optional[int] = None,
+                    batch_size: int = 1) -> Optional[tuple]:
+        """
+        Validate iter_habits arguments and return the `sort` key of habit
+        `after_id`, where iteration resumes (None to start at the beginning).
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}, not {sort!r}")
+        if limit is not None and limit < 0:
+            raise ValueError("`limit` must not be negative")
+        if batch_size < 1:
+            raise ValueError("`batch_size` must be positive")
+        if after_id is None:
+            return None
+        if sort == "id":
+            # a pure keyset: the habit itself may since have been deleted
+            return (after_id,)
+        anchor = self.get_all(ids=[after_id], include_completions=False)
+        if not anchor:
+            raise ValueError(f"Habit with id={after_id} not found")
+        return SORT_KEYS[sort](anchor[0])
+
+    def find_by_name(self, name: str, include_completions: bool = True) -> List[HabitEntity]:
+        """Habits named exactly `name` (names need not be unique), ordered by id."""
+        return [h for h in self.get_all(include_completions=include_completions) if h.name == name]
+
+    def find_by_category(self, category: str, include_completions: bool = True) -> List[HabitEntity]:
+        """Habits in `category`, ordered by id."""
+        return self.get_all(category=category, include_completions=include_completions)
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None,
+                       include_completions: bool = True) -> List[HabitEntity]:
+        """Habits whose name starts with `prefix` (case-sensitive), ordered by name and id."""
+        habits = sorted((h for h in self.get_all(include_completions=include_completions)
+                         if h.name.startswith(prefix)), key=SORT_KEYS["name"])
+        return habits[:limit]
+
+    def search(self, text: str, limit: Optional[int] = None,
+               include_completions: bool = True) -> List[HabitEntity]:
+        """
+        Habits whose name contains every word of `text`, case-insensitively,
+        best matches first where the backend ranks them (else by name and id).
+        """
+        words = text.lower().split()
+        habits = sorted((h for h in self.get_all(include_completions=include_completions)
+                         if all(w in h.name.lower() for w in words)), key=SORT_KEYS["name"])
+        return habits[:limit]
+
+    @abstractmethod
+    def iter_completions(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         batch_size: int = 10_000) -> Iterator[Tuple[int, datetime]]:
+        """
+        Stream (habit_id, timestamp) pairs ordered by habit and time, fetching
+        `batch_size` rows at a time. `since` is inclusive and `until` exclusive.
+        """
+        ...
+
+    def iter_epochs(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    batch_size: int = 10_000) -> Iterator[Tuple[int, int]]:
+        """
+        Like iter_completions, with timestamps as integer epoch seconds, so
+        callers that only do arithmetic on them never build datetimes.
+        """
+        for hid, ts in self.iter_completions(ids, category, since, until, batch_size):
+            yield hid, to_epoch(ts)
+
+    def completions_in_window(self, ids: Iterable[int], since: Optional[datetime] = None,
+                              until: Optional[datetime] = None) -> Dict[int, List[datetime]]:
+        """
+        Completion timestamps of each habit in `ids` within [since, until), oldest first.
+        Every requested habit gets an entry, empty if it has no completions there.
+        """
+        ids = list(ids)
+        window: Dict[int, List[datetime]] = {id: [] for id in ids}
+        for hid, ts in self.iter_completions(ids=ids, since=since, until=until):
+            window[hid].append(ts)
+        return window
+
+    def completed_in_period(self, period: str, key: int,
+                            ids: Optional[Iterable[int]] = None) -> Set[int]:
+        """
+        Ids of the habits (among `ids`, default all) with at least one completion
+        in the "weekly" or "monthly" period `key` (see streaks.period_key).
+        """
+        since, until = (datetime.combine(d, datetime.min.time())
+                        for d in streaks.period_bounds(period, key))
+        return {hid for hid, _ in self.iter_completions(ids=ids, since=since, until=until)}
+
+    def period_counts(self, ids: Iterable[int], period: str) -> Dict[int, Dict[int, int]]:
+        """
+        Completion counts of each habit in `ids` per "weekly" or "monthly" period
+        key, in key order. Every requested habit gets an entry.
+        """
+        ids = list(ids)
+        counts: Dict[int, Dict[int, int]] = {id: {} for id in ids}
+        for hid, ts in self.iter_completions(ids=ids):
+            key = streaks.period_key(period, ts.date())
+            counts[hid][key] = counts[hid].get(key, 0) + 1
+        return counts
+
     @abstractmethod
     def update(self, habit: HabitEntity) -> None:
+        """
+        Store `habit`'s fields and completions. Repositories that track versions
+        raise ConcurrentUpdateError if the habit changed since it was loaded.
+        A habit loaded without its completions only has its fields stored; giving
+        it completions raises ValueError (use append_completion instead).
+        """
         ...
-        
+
+    @abstractmethod
+    def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        """
+        Record one completion for `habit_id` (now by default) without loading the habit.
+        Returns False if no such habit exists.
+        """
+        ...
+
+    @abstractmethod
+    def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                        batch_size: int = 10_000) -> int:
+        """
+        Record (habit_id, timestamp) completion events in batches of `batch_size`.
+        Events for unknown habits are skipped; returns how many were recorded.
+        """
+        ...
+
+    @abstractmethod
+    def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        """Maintained streak/count stats keyed by habit id, for all habits or just `ids`."""
+        ...
+
     @abstractmethod
     def delete(self, id: int) -> None:
         ...
+
+
+class AsyncHabitRepository(ABC):
+    """Abstract asyncio interface for habit persistence, mirroring HabitRepository."""
+
+    @abstractmethod
+    async def add(self, habit: HabitEntity) -> HabitEntity:
+        ...
+
+    @abstractmethod
+    async def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                      ids: Optional[Iterable[int]] = None,
+                      include_completions: bool = True) -> List[HabitEntity]:
+        ...
+
+    @abstractmethod
+    async def get_by_id(self, id: int) -> Optional[HabitEntity]:
+        ...
+
+    @abstractmethod
+    async def update(self, habit: HabitEntity) -> None:
+        ...
+
+    @abstractmethod
+    async def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        ...
+
+    @abstractmethod
+    async def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                              batch_size: int = 10_000) -> int:
+        ...
+
+    @abstractmethod
+    async def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        ...
+
+    @abstractmethod
+    async def delete(self, id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Finish pending writes and release resources."""
+        ...
@@ -1,7 +1,8 @@
-from typing import List, Dict
-from datetime import datetime, timedelta
-from .models import HabitEntity
-from .repository import HabitRepository
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, time, timedelta
+from . import streaks
+from .models import HabitEntity, HabitStats
+from .repository import SORT_KEYS, AsyncHabitRepository, HabitRepository
 
 class HabitService:
     """High-level operations on habits, delegates persistence to a repository."""
@@ -13,69 +14,258 @@ class HabitService:
         return self.repo.add(habit)
 
     def record_completion(self, habit_id: int) -> None:
-        habit = self.repo.get_by_id(habit_id)
-        if not habit:
+        if not self.repo.append_completion(habit_id):
             raise ValueError(f"Habit with id={habit_id} not found")
-        habit.add_completion()
-        self.repo.update(habit)
 
-    def list_habits(self) -> List[HabitEntity]:
-        return self.repo.get_all()
+    def record_completions_bulk(self, events: Iterable[Tuple[int, datetime]],
+                                batch_size: int = 10_000) -> Tuple[int, int]:
+        """
+        Record a stream of (habit_id, timestamp) events, `batch_size` per transaction.
+        Returns (recorded, skipped), where skipped events referenced unknown habits.
+        """
+        seen = 0
+
+        def counted():
+            nonlocal seen
+            for event in events:
+                seen += 1
+                yield event
+
+        recorded = self.repo.add_completions(counted(), batch_size=batch_size)
+        return recorded, seen - recorded
+
+    def list_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    ids: Optional[Iterable[int]] = None,
+                    include_completions: bool = True) -> List[HabitEntity]:
+        return self.repo.get_all(periodicity=periodicity, category=category, ids=ids,
+                                 include_completions=include_completions)
+
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    include_completions: bool = True) -> Iterator[HabitEntity]:
+        """Stream habits page by page instead of loading them all; see HabitRepository.iter_habits."""
+        return self.repo.iter_habits(periodicity=periodicity, category=category, sort=sort,
+                                     after_id=after_id, limit=limit,
+                                     include_completions=include_completions)
+
+    def find_habits(self, name: Optional[str] = None, prefix: Optional[str] = None,
+                    text: Optional[str] = None, category: Optional[str] = None,
+                    periodicity: Optional[str] = None, sort: str = "id",
+                    after_id: Optional[int] = None, limit: Optional[int] = None,
+                    include_completions: bool = True) -> List[HabitEntity]:
+        """
+        Habits matching every given selector: exact `name`, name `prefix`, search
+        `text` (see HabitRepository.search), `category` and `periodicity`. The
+        most selective one is looked up through the repository's indexes and the
+        rest are checked here; results are ordered and paged as in iter_habits.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort {sort!r}; expected one of {', '.join(SORT_KEYS)}")
+        if name is not None:
+            habits = self.repo.find_by_name(name, include_completions=include_completions)
+        elif prefix is not None:
+            habits = self.repo.find_by_prefix(prefix, include_completions=include_completions)
+        elif text is not None:
+            habits = self.repo.search(text, include_completions=include_completions)
+        elif category is not None:
+            habits = self.repo.find_by_category(category, include_completions=include_completions)
+        else:
+            habits = self.repo.get_all(include_completions=include_completions)
+        # text only needs checking here when the lookup used another selector
+        words = text.lower().split() if text is not None and (name, prefix) != (None, None) else []
+        key = SORT_KEYS[sort]
+        habits = sorted((
+            h for h in habits
+            if (prefix is None or h.name.startswith(prefix))
+            and all(w in h.name.lower() for w in words)
+            and (category is None or h.category == category)
+            and (periodicity is None or h.periodicity == periodicity)
+        ), key=key)
+        if after_id is not None:
+            anchor = self.repo.get_by_id(after_id)
+            if anchor is None:
+                raise ValueError(f"Habit with id={after_id} not found")
+            habits = [h for h in habits if key(h) > key(anchor)]
+        return habits[:limit]
+
+class AsyncHabitService:
+    """asyncio counterpart of HabitService over an AsyncHabitRepository."""
+    def __init__(self, repo: AsyncHabitRepository):
+        self.repo = repo
+
+    async def create_habit(self, name: str, periodicity: str, category: str) -> HabitEntity:
+        habit = HabitEntity(name=name, periodicity=periodicity, category=category)
+        return await self.repo.add(habit)
+
+    async def record_completion(self, habit_id: int) -> None:
+        if not await self.repo.append_completion(habit_id):
+            raise ValueError(f"Habit with id={habit_id} not found")
+
+    async def record_completions_bulk(self, events: Iterable[Tuple[int, datetime]],
+                                      batch_size: int = 10_000) -> Tuple[int, int]:
+        events = list(events)
+        recorded = await self.repo.add_completions(events, batch_size=batch_size)
+        return recorded, len(events) - recorded
+
+    async def list_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                          ids: Optional[Iterable[int]] = None,
+                          include_completions: bool = True) -> List[HabitEntity]:
+        return await self.repo.get_all(periodicity=periodicity, category=category, ids=ids,
+                                       include_completions=include_completions)
 
 class AnalyticsService:
-    """Pure‐function analytics over HabitEntity objects."""
+    """
+    Pure‐function analytics over HabitEntity objects, computed on day numbers
+    read from the packed completion timestamps. Compacted habits resume from
+    their archive summary.
+    """
+    # whether habits passed in must have their completions loaded
+    needs_completions = True
+
+    def prefetch(self, habits: List[HabitEntity]) -> None:
+        """Hook for backends that load their data for many habits at once."""
+
+    @staticmethod
+    def _resumed(habit: HabitEntity) -> HabitStats:
+        return streaks.resume(habit.archive, habit.periodicity, (c.timestamp for c in habit.completions))
+
     def longest_streak(self, habit: HabitEntity) -> int:
+        if habit.archive is not None:
+            return self._resumed(habit).longest_streak
         if not habit.completions:
             return 0
-        dates = sorted(c.timestamp.date() for c in habit.completions)
+        days = sorted(streaks.day_ordinals(habit.completions))
+        # consecutive periods have consecutive keys: day ordinals, or week numbers
+        keys = days if habit.periodicity == "daily" else [streaks.ordinal_week(d) for d in days]
         max_streak = streak = 1
-        for i in range(1, len(dates)):
-            delta = (dates[i] - dates[i - 1]).days if habit.periodicity == "daily" \
-                    else (dates[i].isocalendar()[1] - dates[i - 1].isocalendar()[1])
-            streak = streak + 1 if delta == 1 else 1
+        for i in range(1, len(keys)):
+            streak = streak + 1 if keys[i] - keys[i - 1] == 1 else 1
             max_streak = max(max_streak, streak)
         return max_streak
 
     def current_streak(self, habit: HabitEntity) -> int:
+        if habit.archive is not None:
+            return streaks.current_streak(self._resumed(habit), habit.periodicity, datetime.utcnow().date())
         if not habit.completions:
             return 0
-        today = datetime.utcnow().date()
-        comp_dates = sorted(c.timestamp.date() for c in habit.completions)[::-1]
-        delta = timedelta(days=1) if habit.periodicity == "daily" else timedelta(weeks=1)
+        today = datetime.utcnow().date().toordinal()
+        days = sorted(streaks.day_ordinals(habit.completions), reverse=True)
+        delta = streaks.period_length(habit.periodicity).days
         streak = 0
-        prev_date = today
-        for d in comp_dates:
-            if (prev_date - d) <= delta:
+        prev_day = today
+        for d in days:
+            if (prev_day - d) <= delta:
                 streak += 1
-                prev_date = d
+                prev_day = d
             else:
                 break
         return streak
 
     def completion_rate(self, habit: HabitEntity) -> float:
-        if not habit.completions:
+        count = len(habit.completions) + (habit.archive.completion_count if habit.archive else 0)
+        if not count:
             return 0.0
-        created = habit.created.date()
         today = datetime.utcnow().date()
-        if habit.periodicity == "daily":
-            total = (today - created).days + 1
-        else:
-            total = (today.isocalendar()[1] - created.isocalendar()[1]) + 1
-        return len(habit.completions) / total if total > 0 else 0.0
+        total = streaks.elapsed_periods(habit.periodicity, habit.created.date(), today)
+        return count / total if total > 0 else 0.0
+
+    def report(self, habits: List[HabitEntity], period: str) -> Dict[str,bool]:
+        current = streaks.period_key(period, datetime.utcnow().date())
+        start, end = (d.toordinal() for d in streaks.period_bounds(period, current))
+        return {
+            h.name: any(start <= d < end for d in streaks.day_ordinals(h.completions))
+            for h in habits
+        }
+
+class StatsAnalyticsService:
+    """
+    Analytics read from the per-habit stats and period rollups the repository
+    maintains on write, so habits need no completions loaded.
+    """
+    needs_completions = False
+
+    def __init__(self, repo: HabitRepository):
+        self.repo = repo
+        self._stats: Dict[int, HabitStats] = {}
+
+    def prefetch(self, habits: List[HabitEntity]) -> None:
+        """Load stats for `habits` in one query instead of one per habit."""
+        self._stats.update(self.repo.get_stats(ids=[h.id for h in habits]))
+
+    def _stats_for(self, habit: HabitEntity) -> HabitStats:
+        if habit.id not in self._stats:
+            self._stats.update(self.repo.get_stats(ids=[habit.id]))
+        return self._stats.get(habit.id) or HabitStats(habit_id=habit.id)
+
+    def longest_streak(self, habit: HabitEntity) -> int:
+        return self._stats_for(habit).longest_streak
+
+    def current_streak(self, habit: HabitEntity) -> int:
+        today = datetime.utcnow().date()
+        return streaks.current_streak(self._stats_for(habit), habit.periodicity, today)
+
+    def completion_rate(self, habit: HabitEntity) -> float:
+        count = self._stats_for(habit).completion_count
+        if not count:
+            return 0.0
+        today = datetime.utcnow().date()
+        total = streaks.elapsed_periods(habit.periodicity, habit.created.date(), today)
+        return count / total if total > 0 else 0.0
 
     def report(self, habits: List[HabitEntity], period: str) -> Dict[str,bool]:
+        key = streaks.period_key(period, datetime.utcnow().date())
+        done = self.repo.completed_in_period(period, key, [h.id for h in habits])
+        return {h.name: h.id in done for h in habits}
+
+
+class WindowedAnalyticsService:
+    """
+    Analytics that only load the completions they need. Reports read the
+    period rollups, current_streak pages backwards through `page_periods` periods at a time until it finds a gap
+    (or the habit's archive summary takes over), and longest_streak/completion_rate
+    come from the maintained stats. Cost depends on the window looked at, not on
+    how long a habit's history is.
+    """
+    needs_completions = False
+
+    def __init__(self, repo: HabitRepository, page_periods: int = 32):
+        if page_periods < 2:
+            raise ValueError("`page_periods` must be at least 2")
+        self.repo = repo
+        self.page_periods = page_periods
+        self._stats = StatsAnalyticsService(repo)
+
+    def prefetch(self, habits: List[HabitEntity]) -> None:
+        self._stats.prefetch(habits)
+
+    def longest_streak(self, habit: HabitEntity) -> int:
+        return self._stats.longest_streak(habit)
+
+    def completion_rate(self, habit: HabitEntity) -> float:
+        return self._stats.completion_rate(habit)
+
+    def current_streak(self, habit: HabitEntity) -> int:
         today = datetime.utcnow().date()
-        result: Dict[str,bool] = {}
-        if period == "weekly":
-            current_week = today.isocalendar()[1]
-            for h in habits:
-                result[h.name] = any(c.timestamp.isocalendar()[1] == current_week
-                                     for c in h.completions)
-        elif period == "monthly":
-            current_month = today.month
-            for h in habits:
-                result[h.name] = any(c.timestamp.month == current_month
-                                     for c in h.completions)
-        else:
-            raise ValueError("`period` must be 'weekly' or 'monthly'")
-        return result
\ No newline at end of file
+        delta = streaks.period_length(habit.periodicity)
+        page = delta * self.page_periods
+        # the first page is open-ended so completions dated after today count too
+        until, since = None, datetime.combine(today, time.min) + timedelta(days=1) - page
+        streak, prev_date = 0, today
+        while True:
+            window = self.repo.completions_in_window([habit.id], since, until)[habit.id]
+            if not window:
+                # a page longer than one period without completions is a gap,
+                # unless the streak runs on into the compacted completions
+                last = habit.archive.last_completion if habit.archive is not None else None
+                if last is not None and prev_date - last.date() <= delta:
+                    streak += habit.archive.chain_length
+                return streak
+            for ts in reversed(window):
+                if prev_date - ts.date() > delta:
+                    return streak
+                streak += 1
+                prev_date = ts.date()
+            until, since = since, since - page
+
+    def report(self, habits: List[HabitEntity], period: str) -> Dict[str,bool]:
+        return self._stats.report(habits, period)
@@ -0,0 +1,323 @@
+import heapq
+import os
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar
+from .models import HabitEntity, HabitStats
+from .repository import SORT_KEYS, HabitRepository
+from .sqlite_repository import MAX_IN_PARAMS, SQLiteHabitRepository, _recompute_stats
+
+T = TypeVar("T")
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS habit_shards (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  shard INTEGER NOT NULL
+)
+"""
+
+class ShardedHabitRepository(HabitRepository):
+    """
+    HabitRepository spread over several SQLite files, each a full
+    SQLiteHabitRepository with its own writer lock and page cache.
+
+    A small catalog database allocates globally unique habit ids and records
+    which shard holds each habit. New habits are placed by a stable hash of
+    `tenant_key(habit)` (so one tenant's habits share a shard), or of the id
+    when no `tenant_key` is given. Reads that span shards (`get_all`,
+    `get_stats`, `add_completions`) run on every shard in parallel and are merged.
+    `options` are passed to each shard's SQLiteHabitRepository.
+    """
+    def __init__(self, shard_paths: Sequence[str], catalog_path: str,
+                 tenant_key: Optional[Callable[[HabitEntity], str]] = None, **options):
+        if not shard_paths:
+            raise ValueError("at least one shard is required")
+        self.shards = [SQLiteHabitRepository(path, **options) for path in shard_paths]
+        self.catalog_path = catalog_path
+        self.tenant_key = tenant_key
+        self._local = threading.local()
+        self._catalogs: List[sqlite3.Connection] = []
+        self._catalogs_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="habit-shard")
+
+    @classmethod
+    def in_directory(cls, directory: str, shards: int, **kwargs) -> "ShardedHabitRepository":
+        """`shards` shard files plus the catalog, all inside `directory`."""
+        return cls([os.path.join(directory, f"shard-{n:02d}.db") for n in range(shards)],
+                   os.path.join(directory, "catalog.db"), **kwargs)
+
+    def _catalog(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.catalog_path):
+                os.makedirs(os.path.dirname(self.catalog_path), exist_ok=True)
+            conn = sqlite3.connect(self.catalog_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(_CATALOG_SCHEMA)
+            self._local.conn = conn
+            with self._catalogs_lock:
+                self._catalogs.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close the catalog and every shard."""
+        self._pool.shutdown()
+        with self._catalogs_lock:
+            for conn in self._catalogs:
+                conn.close()
+            self._catalogs.clear()
+        self._local = threading.local()
+        for shard in self.shards:
+            shard.close()
+
+    def map_shards(self, fn: Callable[[SQLiteHabitRepository], T],
+                   shards: Optional[Iterable[int]] = None) -> List[T]:
+        """Run `fn` on every shard (or the given shard numbers) in parallel, in shard order."""
+        shards = range(len(self.shards)) if shards is None else shards
+        return list(self._pool.map(lambda n: fn(self.shards[n]), shards))
+
+    def _map(self, fn: Callable[[int], T], shards: Iterable[int]) -> List[T]:
+        return list(self._pool.map(fn, shards))
+
+    def _route(self, habit: HabitEntity, shards: Sequence[int]) -> int:
+        key = str(habit.id) if self.tenant_key is None else self.tenant_key(habit)
+        return shards[zlib.crc32(key.encode()) % len(shards)]
+
+    def shard_of(self, id: int) -> Optional[int]:
+        """The shard holding habit `id`, or None if there is no such habit."""
+        row = self._catalog().execute("SELECT shard FROM habit_shards WHERE id = ?", (id,)).fetchone()
+        return None if row is None else row[0]
+
+    def _locate(self, ids: Iterable[int]) -> Dict[int, List[int]]:
+        """Group the known habits among `ids` by shard."""
+        ids = sorted(set(ids))
+        located: Dict[int, List[int]] = defaultdict(list)
+        conn = self._catalog()
+        for i in range(0, len(ids), MAX_IN_PARAMS):
+            chunk = ids[i:i + MAX_IN_PARAMS]
+            for id, shard in conn.execute(
+                f"SELECT id, shard FROM habit_shards WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ):
+                located[shard].append(id)
+        return located
+
+    def _fan_out(self, fn: Callable[[SQLiteHabitRepository, Optional[List[int]]], T],
+                 ids: Optional[Iterable[int]]) -> List[T]:
+        """`fn(shard, shard_ids)` on each shard that can hold a match; shard_ids is None for all."""
+        if ids is None:
+            return self.map_shards(lambda shard: fn(shard, None))
+        located = self._locate(ids)
+        return self._map(lambda n: fn(self.shards[n], located[n]), sorted(located))
+
+    def add(self, habit: HabitEntity) -> HabitEntity:
+        conn = self._catalog()
+        with conn:
+            if self.tenant_key is None:
+                cur = conn.execute("INSERT INTO habit_shards (shard) VALUES (-1)")
+                habit.id = cur.lastrowid
+                shard = self._route(habit, range(len(self.shards)))
+                conn.execute("UPDATE habit_shards SET shard = ? WHERE id = ?", (shard, habit.id))
+            else:
+                shard = self._route(habit, range(len(self.shards)))
+                habit.id = conn.execute(
+                    "INSERT INTO habit_shards (shard) VALUES (?)", (shard,)
+                ).lastrowid
+        try:
+            return self.shards[shard].add(habit)
+        except Exception:
+            with conn:
+                conn.execute("DELETE FROM habit_shards WHERE id = ?", (habit.id,))
+            raise
+
+    def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                ids: Optional[Iterable[int]] = None,
+                include_completions: bool = True) -> List[HabitEntity]:
+        parts = self._fan_out(
+            lambda shard, shard_ids: shard.get_all(periodicity, category, shard_ids, include_completions),
+            ids
+        )
+        return list(heapq.merge(*parts, key=lambda habit: habit.id))
+
+    def get_by_id(self, id: int) -> Optional[HabitEntity]:
+        shard = self.shard_of(id)
+        return None if shard is None else self.shards[shard].get_by_id(id)
+
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    batch_size: int = 500, include_completions: bool = True) -> Iterator[HabitEntity]:
+        start = self._resume_key(sort, after_id, limit, batch_size)
+        # every shard pages through its own habits from the same key; the pages are merged
+        return islice(heapq.merge(*(
+            shard._iter_sorted(periodicity, category, sort, start, limit, batch_size, include_completions)
+            for shard in self.shards
+        ), key=SORT_KEYS[sort]), limit)
+
+    def find_by_name(self, name: str, include_completions: bool = True) -> List[HabitEntity]:
+        parts = self.map_shards(lambda shard: shard.find_by_name(name, include_completions))
+        return list(heapq.merge(*parts, key=lambda habit: habit.id))
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None,
+                       include_completions: bool = True) -> List[HabitEntity]:
+        parts = self.map_shards(lambda shard: shard.find_by_prefix(prefix, limit, include_completions))
+        return list(islice(heapq.merge(*parts, key=SORT_KEYS["name"]), limit))
+
+    def search(self, text: str, limit: Optional[int] = None,
+               include_completions: bool = True) -> List[HabitEntity]:
+        # FTS ranks are not comparable across shards, so the merged matches are ordered by name
+        parts = self.map_shards(lambda shard: shard.search(text, None, include_completions))
+        return sorted((habit for part in parts for habit in part), key=SORT_KEYS["name"])[:limit]
+
+    def _merged(self, method: str, ids: Optional[Iterable[int]], *args) -> Iterator:
+        """Merge the (habit_id, timestamp) streams `method` yields on each shard, in order."""
+        if ids is None:
+            located = {n: None for n in range(len(self.shards))}
+        else:
+            located = self._locate(ids)
+        return heapq.merge(*(
+            getattr(self.shards[n], method)(shard_ids, *args) for n, shard_ids in sorted(located.items())
+        ))
+
+    def iter_completions(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         batch_size: int = 10_000) -> Iterator[Tuple[int, datetime]]:
+        return self._merged("iter_completions", ids, category, since, until, batch_size)
+
+    def iter_epochs(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    batch_size: int = 10_000) -> Iterator[Tuple[int, int]]:
+        return self._merged("iter_epochs", ids, category, since, until, batch_size)
+
+    def update(self, habit: HabitEntity) -> None:
+        shard = self.shard_of(habit.id)
+        if shard is not None:
+            self.shards[shard].update(habit)
+
+    def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        shard = self.shard_of(habit_id)
+        return shard is not None and self.shards[shard].append_completion(habit_id, timestamp)
+
+    def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                        batch_size: int = 10_000) -> int:
+        if batch_size < 1:
+            raise ValueError("`batch_size` must be positive")
+        events = iter(events)
+        recorded = 0
+        while True:
+            batch = list(islice(events, batch_size))
+            if not batch:
+                return recorded
+            shard_by_id = {
+                id: shard for shard, ids in self._locate(hid for hid, _ in batch).items() for id in ids
+            }
+            groups: Dict[int, List[Tuple[int, datetime]]] = defaultdict(list)
+            for event in batch:
+                if event[0] in shard_by_id:
+                    groups[shard_by_id[event[0]]].append(event)
+            recorded += sum(self._map(
+                lambda n: self.shards[n].add_completions(groups[n], batch_size), sorted(groups)
+            ))
+
+    def completed_in_period(self, period: str, key: int,
+                            ids: Optional[Iterable[int]] = None) -> Set[int]:
+        ids = None if ids is None else set(ids)
+        done: Set[int] = set()
+        for part in self.map_shards(lambda shard: shard.completed_in_period(period, key, ids)):
+            done.update(part)
+        return done
+
+    def period_counts(self, ids: Iterable[int], period: str) -> Dict[int, Dict[int, int]]:
+        ids = list(ids)
+        counts: Dict[int, Dict[int, int]] = {id: {} for id in ids}
+        for part in self._fan_out(lambda shard, shard_ids: shard.period_counts(shard_ids, period), ids):
+            counts.update(part)
+        return counts
+
+    def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        stats: Dict[int, HabitStats] = {}
+        for part in self._fan_out(lambda shard, shard_ids: shard.get_stats(shard_ids), ids):
+            stats.update(part)
+        return stats
+
+    def delete(self, id: int) -> None:
+        shard = self.shard_of(id)
+        if shard is None:
+            return
+        self.shards[shard].delete(id)
+        with self._catalog() as conn:
+            conn.execute("DELETE FROM habit_shards WHERE id = ?", (id,))
+
+    def compact(self, horizon: datetime, batch_size: int = 500) -> int:
+        """Compact every shard into its own archive (see SQLiteHabitRepository.compact)."""
+        return sum(self.map_shards(lambda shard: shard.compact(horizon, batch_size)))
+
+    def vacuum(self) -> int:
+        return sum(self.map_shards(lambda shard: shard.vacuum()))
+
+    @staticmethod
+    def _move_archive(source: SQLiteHabitRepository, target: SQLiteHabitRepository, id: int) -> None:
+        """
+        Copy habit `id`'s archive summary, archived completions and rollups from
+        `source` to `target`, which already holds the habit's live completions.
+        """
+        conn = source.connection()
+        summary = conn.execute("SELECT * FROM habit_archive WHERE habit_id = ?", (id,)).fetchone()
+        rollups = {table: conn.execute(f"SELECT * FROM {table} WHERE habit_id = ?", (id,)).fetchall()
+                   for table in ("weekly_rollup", "monthly_rollup")}
+        archive, target_archive = source._archive(), target._archive()
+        try:
+            with target_archive:
+                target_archive.executemany(
+                    "INSERT OR IGNORE INTO completions (id, habit_id, timestamp) VALUES (?, ?, ?)",
+                    archive.execute("SELECT id, habit_id, timestamp FROM completions WHERE habit_id = ?", (id,))
+                )
+        finally:
+            archive.close()
+            target_archive.close()
+        with target._transaction() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO habit_archive VALUES ({', '.join('?' * len(summary))})",
+                         summary)
+            # the rollups still count the archived completions
+            for table, rows in rollups.items():
+                conn.execute(f"DELETE FROM {table} WHERE habit_id = ?", (id,))
+                conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?)", rows)
+            _recompute_stats(conn, [id], target._archived_epochs)
+
+    def rebalance(self, shard: int, targets: Optional[Sequence[int]] = None,
+                  batch_size: int = 500) -> int:
+        """
+        Move the habits stored on `shard` to wherever routing over `targets`
+        (default: every shard) now places them, e.g. after adding shards, or to
+        drain `shard` by leaving it out of `targets`. Returns how many moved.
+
+        Run it offline: nothing else may write to these databases meanwhile.
+        Each habit is copied, re-pointed in the catalog and only then removed
+        from `shard`, so an interrupted rebalance can simply be run again.
+        """
+        targets = list(range(len(self.shards)) if targets is None else targets)
+        if not targets or not all(0 <= n < len(self.shards) for n in targets + [shard]):
+            raise ValueError("shard numbers must be between 0 and "
+                             f"{len(self.shards) - 1} and `targets` must not be empty")
+        source = self.shards[shard]
+        ids = [habit.id for habit in source.get_all(include_completions=False)]
+        moved = 0
+        for i in range(0, len(ids), batch_size):
+            for habit in source.get_all(ids=ids[i:i + batch_size]):
+                target = self._route(habit, targets)
+                if target == shard:
+                    continue
+                # a copy left behind by an interrupted run
+                self.shards[target].delete(habit.id)
+                self.shards[target].add(habit)
+                if habit.archive is not None:
+                    self._move_archive(source, self.shards[target], habit.id)
+                with self._catalog() as conn:
+                    conn.execute("UPDATE habit_shards SET shard = ? WHERE id = ?", (target, habit.id))
+                source.delete(habit.id)
+                moved += 1
+        return moved
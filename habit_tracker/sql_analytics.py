@@ -0,0 +1,132 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from . import streaks
+from .models import HabitEntity
+from .sqlite_repository import COMPLETED, MAX_IN_PARAMS, SQLiteHabitRepository
+from .timestamps import EPOCH, from_epoch
+
+# Epoch day of a completion (floored, so pre-1970 timestamps work too)
+_SECONDS = COMPLETED.epoch_sql("c.timestamp")
+_DAY = f"({_SECONDS} / 86400 - ({_SECONDS} % 86400 < 0))"
+
+def _week_index(day: str) -> str:
+    """SQL for streaks.week_index of an epoch-day expression (epoch day 0 was a Thursday)."""
+    return f"(({day} + 3) / 7 - (({day} + 3) % 7 < 0))"
+
+# One row per habit: longest streak, trailing chain length, completion count and last
+# completion day. Runs are gaps-and-islands: a running SUM over "does this row break the
+# run" flags numbers each island, and islands are then measured with GROUP BY.
+_SUMMARY_SQL = f"""
+WITH keyed AS (
+  SELECT c.habit_id, c.timestamp, {_DAY} AS day,
+         CASE WHEN h.periodicity = 'daily' THEN {_DAY} ELSE {_week_index(_DAY)} END AS k,
+         CASE WHEN h.periodicity = 'daily' THEN 1 ELSE 7 END AS lim
+  FROM completions c JOIN habits h ON h.id = c.habit_id
+  {{where}}
+),
+flagged AS (
+  SELECT habit_id, timestamp, day, lim,
+         CASE WHEN k - LAG(k) OVER w = 1 THEN 0 ELSE 1 END AS run_break,
+         CASE WHEN day - LAG(day) OVER w <= lim THEN 0 ELSE 1 END AS chain_break
+  FROM keyed
+  WINDOW w AS (PARTITION BY habit_id ORDER BY timestamp)
+),
+numbered AS (
+  SELECT habit_id, day, lim,
+         SUM(run_break) OVER w AS run_id,
+         SUM(chain_break) OVER w AS chain_id
+  FROM flagged
+  WINDOW w AS (PARTITION BY habit_id ORDER BY timestamp ROWS UNBOUNDED PRECEDING)
+),
+runs AS (
+  SELECT habit_id, COUNT(*) AS length FROM numbered GROUP BY habit_id, run_id
+),
+chains AS (
+  SELECT habit_id, COUNT(*) AS length, MAX(day) AS last_day, MAX(lim) AS lim,
+         ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY chain_id DESC) AS newest
+  FROM numbered GROUP BY habit_id, chain_id
+)
+SELECT r.habit_id, r.longest, ch.length, ch.last_day, ch.lim, r.total
+FROM (SELECT habit_id, MAX(length) AS longest, SUM(length) AS total FROM runs GROUP BY habit_id) r
+JOIN chains ch ON ch.habit_id = r.habit_id AND ch.newest = 1
+"""
+
+class SQLAnalyticsService:
+    """
+    Analytics computed inside SQLite with window functions and aggregates
+    (SQLite 3.25+), so only per-habit numbers are returned to Python.
+    Matches AnalyticsService; reports read the repository's weekly/monthly rollups.
+    On a ShardedHabitRepository the queries run on every shard in parallel.
+    """
+    needs_completions = False
+
+    def __init__(self, repo: SQLiteHabitRepository):
+        self.repo = repo
+        self._summary: Dict[int, Tuple[int, int, int]] = {}
+
+    @staticmethod
+    def _chunks(ids: Optional[Sequence[int]]):
+        if ids is None:
+            yield "", []
+            return
+        ids = sorted(set(ids))
+        for i in range(0, len(ids), MAX_IN_PARAMS):
+            chunk = ids[i:i + MAX_IN_PARAMS]
+            yield f"WHERE c.habit_id IN ({', '.join('?' * len(chunk))})", chunk
+
+    def _query(self, sql: str, params: list) -> List[tuple]:
+        """Rows of `sql` from the repository, or from every shard of a sharded one."""
+        if hasattr(self.repo, "map_shards"):
+            parts = self.repo.map_shards(lambda shard: shard.connection().execute(sql, params).fetchall())
+            return [row for part in parts for row in part]
+        return self.repo.connection().execute(sql, params).fetchall()
+
+    def prefetch(self, habits: List[HabitEntity]) -> None:
+        """Compute streaks and counts for `habits` in one query per id chunk."""
+        today = datetime.utcnow().date().toordinal() - EPOCH.toordinal()
+        ids = [h.id for h in habits if h.id not in self._summary]
+        for where, params in self._chunks(ids):
+            for hid, longest, chain, last_day, lim, total in self._query(
+                _SUMMARY_SQL.format(where=where), params
+            ):
+                current = chain if today - last_day <= lim else 0
+                self._summary[hid] = (longest, current, total)
+        for hid in ids:
+            self._summary.setdefault(hid, (0, 0, 0))
+
+        # compacted habits resume from their archive summary instead
+        archived = {h.id: h for h in habits if h.archive is not None and h.id in ids}
+        if archived:
+            stamps: Dict[int, list] = {hid: [] for hid in archived}
+            for hid, ts in self.repo.iter_epochs(ids=list(archived)):
+                stamps[hid].append(from_epoch(ts))
+            day = datetime.utcnow().date()
+            for hid, h in archived.items():
+                stats = streaks.resume(h.archive, h.periodicity, stamps[hid])
+                self._summary[hid] = (stats.longest_streak,
+                                      streaks.current_streak(stats, h.periodicity, day),
+                                      stats.completion_count)
+
+    def _result(self, habit: HabitEntity) -> Tuple[int, int, int]:
+        if habit.id not in self._summary:
+            self.prefetch([habit])
+        return self._summary[habit.id]
+
+    def longest_streak(self, habit: HabitEntity) -> int:
+        return self._result(habit)[0]
+
+    def current_streak(self, habit: HabitEntity) -> int:
+        return self._result(habit)[1]
+
+    def completion_rate(self, habit: HabitEntity) -> float:
+        count = self._result(habit)[2]
+        if not count:
+            return 0.0
+        today = datetime.utcnow().date()
+        total = streaks.elapsed_periods(habit.periodicity, habit.created.date(), today)
+        return count / total if total > 0 else 0.0
+
+    def report(self, habits: List[HabitEntity], period: str) -> Dict[str,bool]:
+        key = streaks.period_key(period, datetime.utcnow().date())
+        done = self.repo.completed_in_period(period, key, [h.id for h in habits])
+        return {h.name: h.id in done for h in habits}
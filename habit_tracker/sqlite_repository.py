@@ -1,9 +1,17 @@
 import os
+import random
 import sqlite3
-from typing import List, Optional
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 from datetime import datetime, timedelta
-from .models import HabitEntity, CompletionRecord
-from .repository import HabitRepository
+from . import instrumentation, streaks
+from .models import HabitEntity, CompletionRecord, HabitStats
+from .repository import ConcurrentUpdateError, HabitRepository
+from .timestamps import EPOCH_MICROS, EPOCH_SECONDS, from_epoch, to_epoch
 
 DEFAULT_HABITS = [
     # name, periodicity, category
@@ -14,104 +22,1004 @@ DEFAULT_HABITS = [
     ("Grocery Shopping", "weekly", "errands"),
 ]
 
+# Codecs of habits.created and completions.timestamp. Completions are read into
+# CompletionLists, rollups and stats as the epoch seconds COMPLETED stores.
+CREATED = EPOCH_MICROS
+COMPLETED = EPOCH_SECONDS
+
+# SQLite builds before 3.32 cap bound parameters at 999 per statement
+MAX_IN_PARAMS = 900
+
+# Schema migrations, applied in order. The database's `PRAGMA user_version`
+# records how many of them have run, so each one executes exactly once.
+# Steps are SQL statements, or callables taking the connection for data fixes.
+MIGRATIONS: List[List[Union[str, Callable[[sqlite3.Connection], None]]]] = [
+    # 1: original schema
+    [
+        """
+        CREATE TABLE IF NOT EXISTS habits (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          name TEXT NOT NULL,
+          periodicity TEXT NOT NULL,
+          category TEXT NOT NULL,
+          created TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS completions (
+          id INTEGER NOT NULL,
+          timestamp TEXT NOT NULL,
+          FOREIGN KEY(id) REFERENCES habits(id)
+        )
+        """,
+    ],
+    # 2: integer epoch timestamps, cascading deletes and a covering index
+    [
+        """
+        CREATE TABLE completions_v2 (
+          id INTEGER PRIMARY KEY,
+          habit_id INTEGER NOT NULL REFERENCES habits(id) ON DELETE CASCADE,
+          timestamp INTEGER NOT NULL
+        )
+        """,
+        """
+        INSERT INTO completions_v2 (habit_id, timestamp)
+        SELECT c.id, CAST(strftime('%s', c.timestamp) AS INTEGER)
+        FROM completions c JOIN habits h ON h.id = c.id
+        ORDER BY c.rowid
+        """,
+        "DROP TABLE completions",
+        "ALTER TABLE completions_v2 RENAME TO completions",
+        "CREATE INDEX idx_completions_habit_ts ON completions(habit_id, timestamp)",
+    ],
+    # 3: per-habit streak/count stats maintained on write
+    [
+        """
+        CREATE TABLE habit_stats (
+          habit_id INTEGER PRIMARY KEY REFERENCES habits(id) ON DELETE CASCADE,
+          completion_count INTEGER NOT NULL,
+          longest_streak INTEGER NOT NULL,
+          run_length INTEGER NOT NULL,
+          run_start INTEGER,
+          chain_length INTEGER NOT NULL,
+          last_completion INTEGER
+        )
+        """,
+        lambda conn: _recompute_stats(conn, [id for (id,) in conn.execute("SELECT id FROM habits")]),
+    ],
+    # 4: completion counts per habit and ISO week / calendar month, maintained on write;
+    #    weekly streaks now count weeks across year boundaries, so their stats are rebuilt
+    [
+        """
+        CREATE TABLE weekly_rollup (
+          habit_id INTEGER NOT NULL REFERENCES habits(id) ON DELETE CASCADE,
+          week INTEGER NOT NULL,
+          count INTEGER NOT NULL,
+          PRIMARY KEY (habit_id, week)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE monthly_rollup (
+          habit_id INTEGER NOT NULL REFERENCES habits(id) ON DELETE CASCADE,
+          month INTEGER NOT NULL,
+          count INTEGER NOT NULL,
+          PRIMARY KEY (habit_id, month)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX idx_weekly_rollup_week ON weekly_rollup(week)",
+        "CREATE INDEX idx_monthly_rollup_month ON monthly_rollup(month)",
+        lambda conn: _write_rollups(conn, conn.execute("SELECT habit_id, timestamp FROM completions")),
+        lambda conn: _recompute_stats(conn, [
+            id for (id,) in conn.execute("SELECT id FROM habits WHERE periodicity = 'weekly'")
+        ]),
+    ],
+    # 5: creation times as integer epoch microseconds instead of ISO-8601 text
+    [
+        """
+        CREATE TABLE habits_v5 (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          name TEXT NOT NULL,
+          periodicity TEXT NOT NULL,
+          category TEXT NOT NULL,
+          created INTEGER NOT NULL
+        )
+        """,
+        lambda conn: conn.executemany(
+            "INSERT INTO habits_v5 (id, name, periodicity, category, created) VALUES (?, ?, ?, ?, ?)",
+            ((id, name, periodicity, category, CREATED.encode(datetime.fromisoformat(created)))
+             for id, name, periodicity, category, created in conn.execute(
+                 "SELECT id, name, periodicity, category, created FROM habits").fetchall())
+        ),
+        "DROP TABLE habits",
+        "ALTER TABLE habits_v5 RENAME TO habits",
+    ],
+    # 6: keyset pagination over habits by name and by creation time
+    [
+        "CREATE INDEX idx_habits_name ON habits(name, id)",
+        "CREATE INDEX idx_habits_created ON habits(created, id)",
+    ],
+    # 7: optimistic concurrency: bumped by every write to a habit or its completions
+    [
+        "ALTER TABLE habits ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+    ],
+    # 8: stats over the completions compact() moved to the archive database
+    [
+        """
+        CREATE TABLE habit_archive (
+          habit_id INTEGER PRIMARY KEY REFERENCES habits(id) ON DELETE CASCADE,
+          archived_until INTEGER NOT NULL,
+          completion_count INTEGER NOT NULL,
+          longest_streak INTEGER NOT NULL,
+          run_length INTEGER NOT NULL,
+          run_start INTEGER,
+          chain_length INTEGER NOT NULL,
+          last_completion INTEGER
+        )
+        """,
+    ],
+    # 9: lookups by category, and a full-text index over names where SQLite has FTS5
+    [
+        "CREATE INDEX idx_habits_category ON habits(category, id)",
+        lambda conn: _create_name_search(conn),
+    ],
+    # 10: completion ids are never reused, so the archive's (habit_id, timestamp, id)
+    #     key cannot mistake a new completion for one compact() already copied
+    [
+        """
+        CREATE TABLE completions_v10 (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          habit_id INTEGER NOT NULL REFERENCES habits(id) ON DELETE CASCADE,
+          timestamp INTEGER NOT NULL
+        )
+        """,
+        "INSERT INTO completions_v10 (id, habit_id, timestamp) SELECT id, habit_id, timestamp FROM completions",
+        "DROP TABLE completions",
+        "ALTER TABLE completions_v10 RENAME TO completions",
+        "CREATE INDEX idx_completions_habit_ts ON completions(habit_id, timestamp)",
+    ],
+]
+
+# Schema of the archive database compact() moves old completions into. Rows
+# keep their ids, so re-running an interrupted compaction copies nothing twice;
+# ids alone are not unique, since databases before migration 10 reused them.
+_ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS completions (
+      habit_id INTEGER NOT NULL,
+      timestamp INTEGER NOT NULL,
+      id INTEGER NOT NULL,
+      PRIMARY KEY (habit_id, timestamp, id)
+    ) WITHOUT ROWID
+    """,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# habits columns behind each of repository.SORT_KEYS, in key order
+_SORT_COLUMNS = {"id": ("id",), "name": ("name", "id"), "created": ("created", "id")}
+
+_STATS_COLUMNS = "completion_count, longest_streak, run_length, run_start, chain_length, last_completion"
+
+def _optional_epoch(ts: Optional[datetime]) -> Optional[int]:
+    return None if ts is None else to_epoch(ts)
+
+def _stats_from_row(habit_id: int, row: Sequence) -> HabitStats:
+    if row[0] is None:
+        return HabitStats(habit_id=habit_id)
+    return HabitStats(
+        habit_id=habit_id,
+        completion_count=row[0],
+        longest_streak=row[1],
+        run_length=row[2],
+        run_start=None if row[3] is None else from_epoch(row[3]),
+        chain_length=row[4],
+        last_completion=None if row[5] is None else from_epoch(row[5]),
+    )
+
+def _stats_values(s: HabitStats) -> tuple:
+    return (s.completion_count, s.longest_streak, s.run_length, _optional_epoch(s.run_start),
+            s.chain_length, _optional_epoch(s.last_completion))
+
+def _write_stats(conn: sqlite3.Connection, stats: Iterable[HabitStats]) -> None:
+    conn.executemany(
+        f"INSERT OR REPLACE INTO habit_stats (habit_id, {_STATS_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((s.habit_id,) + _stats_values(s) for s in stats)
+    )
+
+def _write_archive(conn: sqlite3.Connection, summaries: Iterable[Tuple[HabitStats, int]]) -> None:
+    """Store (summary, archived_until) archive summaries."""
+    conn.executemany(
+        f"INSERT OR REPLACE INTO habit_archive (habit_id, archived_until, {_STATS_COLUMNS}) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((s.habit_id, until) + _stats_values(s) for s, until in summaries)
+    )
+
+def _recompute_stats(conn: sqlite3.Connection, habit_ids: Iterable[int],
+                     archived: Optional[Callable[[int], Optional[List[int]]]] = None) -> None:
+    """
+    Rebuild the stats of `habit_ids` from their stored completions. Given
+    `archived`, a loader of a habit's archived epochs (None if unavailable),
+    compacted habits resume from their archive summary; migrations that
+    predate the archive pass none.
+    """
+    for habit_id in habit_ids:
+        row = conn.execute("SELECT periodicity FROM habits WHERE id = ?", (habit_id,)).fetchone()
+        if row is None:
+            continue
+        stamps = [ts for (ts,) in conn.execute(
+            "SELECT timestamp FROM completions WHERE habit_id = ? ORDER BY timestamp", (habit_id,)
+        )]
+        summary = None
+        if archived is not None:
+            summary = conn.execute(
+                f"SELECT {_STATS_COLUMNS} FROM habit_archive WHERE habit_id = ?", (habit_id,)
+            ).fetchone()
+        if summary is None:
+            stats = streaks.compute(habit_id, row[0], map(from_epoch, stamps))
+        elif not stamps or stamps[0] >= summary[5]:
+            stats = streaks.resume(_stats_from_row(habit_id, summary), row[0], map(from_epoch, stamps))
+        else:
+            # completions dated before the archived ones: rebuild from the raw archive
+            # if it is there; otherwise fold them in late (the next compact() fixes that)
+            raw = archived(habit_id)
+            if raw is None:
+                stats = streaks.resume(_stats_from_row(habit_id, summary), row[0], map(from_epoch, stamps))
+            else:
+                stats = streaks.compute(habit_id, row[0], map(from_epoch, raw + stamps))
+        _write_stats(conn, [stats])
+
+def _create_name_search(conn: sqlite3.Connection) -> None:
+    """
+    Build habit_names, an FTS5 index over habit names kept in sync by triggers.
+    Skipped where SQLite lacks FTS5; `search` then falls back to LIKE. (A database
+    that has the index needs FTS5 to write to `habits`.)
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE habit_names USING fts5(name, content='habits', content_rowid='id')")
+    except sqlite3.OperationalError:
+        return
+    for statement in (
+        """
+        CREATE TRIGGER habit_names_insert AFTER INSERT ON habits BEGIN
+          INSERT INTO habit_names (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        """
+        CREATE TRIGGER habit_names_delete AFTER DELETE ON habits BEGIN
+          INSERT INTO habit_names (habit_names, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+        """,
+        """
+        CREATE TRIGGER habit_names_update AFTER UPDATE OF name ON habits BEGIN
+          INSERT INTO habit_names (habit_names, rowid, name) VALUES ('delete', old.id, old.name);
+          INSERT INTO habit_names (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        "INSERT INTO habit_names (habit_names) VALUES ('rebuild')",
+    ):
+        conn.execute(statement)
+
+# rollup table and key column per report period
+_ROLLUPS = {"weekly": ("weekly_rollup", "week"), "monthly": ("monthly_rollup", "month")}
+
+def _write_rollups(conn: sqlite3.Connection, rows: Iterable[Tuple[int, int]], sign: int = 1) -> None:
+    """Add (sign=1) or remove (sign=-1) (habit_id, epoch) completions in the rollup tables."""
+    counts = {period: Counter() for period in _ROLLUPS}
+    for habit_id, ts in rows:
+        day = from_epoch(ts).date()
+        for period, counter in counts.items():
+            counter[habit_id, streaks.period_key(period, day)] += 1
+    for period, counter in counts.items():
+        table, column = _ROLLUPS[period]
+        if sign > 0:
+            conn.executemany(
+                f"INSERT INTO {table} (habit_id, {column}, count) VALUES (?, ?, ?) "
+                f"ON CONFLICT(habit_id, {column}) DO UPDATE SET count = count + excluded.count",
+                ((hid, key, n) for (hid, key), n in counter.items())
+            )
+        else:
+            conn.executemany(
+                f"UPDATE {table} SET count = count - ? WHERE habit_id = ? AND {column} = ?",
+                ((n, hid, key) for (hid, key), n in counter.items())
+            )
+            # only the keys just decremented can have dropped to zero
+            conn.executemany(
+                f"DELETE FROM {table} WHERE habit_id = ? AND {column} = ? AND count <= 0",
+                counter.keys()
+            )
+
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """
+    Run the migrations `conn`'s database is missing. Foreign keys must still be
+    off, since migrations rebuild tables. Up-to-date databases cost one PRAGMA read.
+    Each migration takes the write lock before re-reading the version, so
+    processes opening an old database at the same time apply it only once.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    if version == 0:
+        # only takes effect before the first table exists; see SQLiteHabitRepository.vacuum
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    while True:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            for statement in MIGRATIONS[version]:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+# databases whose schema is already current in this process
+_initialized_paths: Set[str] = set()
+_init_lock = threading.Lock()
+
 class SQLiteHabitRepository(HabitRepository):
-    """SQLite-backed implementation of HabitRepository."""
-    def __init__(self, db_path: str = "data/habits.db"):
+    """
+    SQLite-backed implementation of HabitRepository.
+
+    Each thread keeps one open connection for the lifetime of the repository,
+    and the schema is only checked on the first connection to a database in the process,
+    so constructing a repository does no I/O.
+    `synchronous`, `cache_size` (pages, or KiB if negative) and `mmap_size` (bytes)
+    are applied to every connection; the database runs in WAL mode.
+
+    Several processes may write at once. Writes run in BEGIN IMMEDIATE
+    transactions, so they take the write lock before reading anything they
+    act on; a writer waits up to `busy_timeout` seconds for the lock, and if
+    SQLite still reports it busy, retries up to `retries` times after a
+    jittered, exponentially growing pause. `update` is checked against
+    `HabitEntity.version` (see ConcurrentUpdateError).
+
+    `compact` moves old completions to the database at `archive_path`
+    (default: "<db_path stem>-archive.db" beside the database).
+    """
+    def __init__(self, db_path: str = "data/habits.db", synchronous: str = "NORMAL",
+                 cache_size: int = -16000, mmap_size: int = 256 * 1024 * 1024,
+                 busy_timeout: float = 5.0, retries: int = 5, archive_path: Optional[str] = None):
+        if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"`synchronous` must be one of {', '.join(SYNCHRONOUS_LEVELS)}")
+        if busy_timeout < 0 or retries < 0:
+            raise ValueError("`busy_timeout` and `retries` must not be negative")
         self.db_path = db_path
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._initialize_db()
+        self.synchronous = synchronous.upper()
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.archive_path = archive_path or os.path.splitext(db_path)[0] + "-archive.db"
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+    def _get_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # only ever used by this thread; close() may run from another one
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+            instrumentation.trace(conn)
+            self._ensure_schema(conn)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+            conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
 
-    def _get_conn(self):
-        return sqlite3.connect(self.db_path)
+    # first pause between busy retries, doubling up to the cap, in seconds
+    BACKOFF = 0.01
+    MAX_BACKOFF = 1.0
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        A write transaction on this thread's connection, begun with BEGIN
+        IMMEDIATE (retried while the database is busy), committed on success
+        and rolled back on error.
+        """
+        conn = self._get_conn()
+        for attempt in range(self.retries + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if attempt == self.retries or not _is_busy(e):
+                    raise
+                # full jitter, so writers that collided do not retry in lockstep
+                time.sleep(random.uniform(0, min(self.MAX_BACKOFF, self.BACKOFF * 2 ** attempt)))
+        with conn:
+            yield conn
+
+    @contextmanager
+    def _snapshot(self, conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+        """
+        One read transaction around the block, so all its statements see the
+        same snapshot of the database; inside another transaction, that one.
+        """
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.commit()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, for queries the repository interface does not cover."""
+        return self._get_conn()
+
+    def close(self) -> None:
+        """Close every connection opened by this repository."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        """Migrate the database behind `conn` if this is the first connection to it."""
+        path = os.path.abspath(self.db_path)
+        if path in _initialized_paths:
+            return
+        with _init_lock:
+            if path not in _initialized_paths:
+                _migrate(conn)
+                _initialized_paths.add(path)
 
     def _initialize_db(self) -> None:
-        with self._get_conn() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS habits (
-                  id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  periodicity TEXT NOT NULL,
-                  category TEXT NOT NULL,
-                  created TEXT NOT NULL
-                )
-            """)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS completions (
-                  id INTEGER NOT NULL,
-                  timestamp TEXT NOT NULL,
-                  FOREIGN KEY(id) REFERENCES habits(id)
-                )
-            """)
+        """Create the schema, or upgrade an existing database in place."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            _migrate(conn)
+        finally:
+            conn.close()
+        _initialized_paths.add(os.path.abspath(self.db_path))
 
     def add(self, habit: HabitEntity) -> HabitEntity:
-        with self._get_conn() as conn:
+        with self._transaction() as conn:
             cur = conn.cursor()
+            # a preset id is kept (the sharded repository allocates its own)
             cur.execute(
-                "INSERT INTO habits (name, periodicity, category, created) VALUES (?, ?, ?, ?)",
-                (habit.name, habit.periodicity, habit.category, habit.created.isoformat())
+                "INSERT INTO habits (id, name, periodicity, category, created, version) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (habit.id, habit.name, habit.periodicity, habit.category, CREATED.encode(habit.created),
+                 habit.version)
             )
             habit.id = cur.lastrowid
-            for comp in habit.completions:
-                conn.execute(
-                    "INSERT INTO completions (id, timestamp) VALUES (?, ?)",
-                    (habit.id, comp.timestamp.isoformat())
-                )
-            conn.commit()
+            stamps = [COMPLETED.encode(comp.timestamp) for comp in habit.completions]
+            conn.executemany(
+                "INSERT INTO completions (habit_id, timestamp) VALUES (?, ?)",
+                ((habit.id, ts) for ts in stamps)
+            )
+            _write_rollups(conn, ((habit.id, ts) for ts in stamps))
+            _write_stats(conn, [
+                streaks.compute(habit.id, habit.periodicity, map(from_epoch, stamps))
+            ])
         return habit
 
-    def get_all(self) -> List[HabitEntity]:
+    def _habit_filter(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                      ids: Optional[Sequence[int]] = None) -> Tuple[str, list]:
+        """Build a WHERE clause over the habits table for the given filters."""
+        clauses, params = [], []
+        if periodicity is not None:
+            clauses.append("periodicity = ?")
+            params.append(periodicity)
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if ids is not None:
+            clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def _load(self, conn, where: str, params: list,
+              include_completions: bool = True) -> List[HabitEntity]:
+        """
+        Hydrate the habits matching `where` with two set-based queries:
+        one for the habit rows and one for all of their completions, both
+        read from the same snapshot.
+        """
+        with self._snapshot(conn):
+            habits = self._load_rows(conn, where, params, include_completions)
+        instrumentation.hydrated(habits.values())
+        return list(habits.values())
+
+    def _load_rows(self, conn, where: str, params: list,
+                   include_completions: bool) -> Dict[int, HabitEntity]:
+        habits: Dict[int, HabitEntity] = {}
+        for row in conn.execute(
+            f"SELECT id, name, periodicity, category, created, version, {_STATS_COLUMNS} "
+            f"FROM habits LEFT JOIN habit_archive ON habit_id = id{where} ORDER BY id",
+            params
+        ):
+            habits[row[0]] = HabitEntity(
+                id=row[0],
+                name=row[1],
+                periodicity=row[2],
+                category=row[3],
+                created=CREATED.decode(row[4]),
+                version=row[5],
+                archive=None if row[6] is None else _stats_from_row(row[0], row[6:]),
+                completions_loaded=include_completions,
+            )
+        if habits and include_completions:
+            for hid, ts in conn.execute(
+                "SELECT habit_id, timestamp FROM completions "
+                f"WHERE habit_id IN (SELECT id FROM habits{where}) ORDER BY habit_id, timestamp",
+                params
+            ):
+                # only a habit read above can own the row, even if the snapshot were not shared
+                habit = habits.get(hid)
+                if habit is not None:
+                    habit.completions.append_epoch(ts)
+        return habits
+
+    def _habit_filters(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                       ids: Optional[Iterable[int]] = None) -> Iterator[Tuple[str, list]]:
+        """
+        Yield WHERE clauses covering the filters, splitting long id lists so each
+        IN (...) stays below SQLite's bound-parameter limit. Chunks follow id order.
+        """
+        if ids is None:
+            yield self._habit_filter(periodicity, category)
+            return
+        ids = sorted(set(ids))
+        for i in range(0, len(ids), MAX_IN_PARAMS):
+            yield self._habit_filter(periodicity, category, ids[i:i + MAX_IN_PARAMS])
+
+    def get_all(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                ids: Optional[Iterable[int]] = None,
+                include_completions: bool = True) -> List[HabitEntity]:
         habits: List[HabitEntity] = []
-        with self._get_conn() as conn:
-            cur = conn.cursor()
-            for row in cur.execute("SELECT id, name, periodicity, category, created FROM habits"):
-                h = HabitEntity(
-                    id=row[0],
-                    name=row[1],
-                    periodicity=row[2],
-                    category=row[3],
-                    created=datetime.fromisoformat(row[4]),
-                    completions=[]
-                )
-                for (ts,) in conn.execute("SELECT timestamp FROM completions WHERE id = ?", (h.id,)):
-                    h.completions.append(CompletionRecord(timestamp=datetime.fromisoformat(ts)))
-                habits.append(h)
+        with self._snapshot(self._get_conn()) as conn:
+            for where, params in self._habit_filters(periodicity, category, ids):
+                habits.extend(self._load(conn, where, params, include_completions))
         return habits
 
+    def iter_habits(self, periodicity: Optional[str] = None, category: Optional[str] = None,
+                    sort: str = "id", after_id: Optional[int] = None, limit: Optional[int] = None,
+                    batch_size: int = 500, include_completions: bool = True) -> Iterator[HabitEntity]:
+        start = self._resume_key(sort, after_id, limit, batch_size)
+        return self._iter_sorted(periodicity, category, sort, start, limit, batch_size,
+                                 include_completions)
+
+    def _iter_sorted(self, periodicity: Optional[str], category: Optional[str], sort: str,
+                     start: Optional[tuple], limit: Optional[int], batch_size: int,
+                     include_completions: bool) -> Iterator[HabitEntity]:
+        """
+        iter_habits from the SORT_KEYS key `start` on: each batch is one indexed
+        query for the next page of keys, continuing after the last key seen, so
+        no read transaction or cursor stays open between batches.
+        """
+        columns = ", ".join(_SORT_COLUMNS[sort])
+        if start is not None and sort == "created":
+            start = (CREATED.encode(start[0]),) + start[1:]
+        conn = self._get_conn()
+        while limit is None or limit > 0:
+            where, params = self._habit_filter(periodicity, category)
+            if start is not None:
+                where += f"{' AND' if where else ' WHERE'} ({columns}) > ({', '.join('?' * len(start))})"
+                params.extend(start)
+            size = min(batch_size, MAX_IN_PARAMS, limit if limit is not None else batch_size)
+            keys = conn.execute(
+                f"SELECT {columns} FROM habits{where} ORDER BY {columns} LIMIT ?", params + [size]
+            ).fetchall()
+            if not keys:
+                return
+            yield from self._load_ordered(conn, [key[-1] for key in keys], include_completions)
+            if len(keys) < size:
+                return
+            start = keys[-1]
+            if limit is not None:
+                limit -= len(keys)
+
+    def _load_ordered(self, conn, ids: Sequence[int], include_completions: bool) -> List[HabitEntity]:
+        """Hydrate the habits `ids` in that order; a habit deleted since its id was read is skipped."""
+        loaded: Dict[int, HabitEntity] = {}
+        with self._snapshot(conn):
+            for where, params in self._habit_filters(ids=ids):
+                loaded.update((h.id, h) for h in self._load(conn, where, params, include_completions))
+        return [loaded[id] for id in ids if id in loaded]
+
+    def find_by_name(self, name: str, include_completions: bool = True) -> List[HabitEntity]:
+        with self._get_conn() as conn:
+            return self._load(conn, " WHERE name = ?", [name], include_completions)
+
+    def find_by_prefix(self, prefix: str, limit: Optional[int] = None,
+                       include_completions: bool = True) -> List[HabitEntity]:
+        # a range scan of idx_habits_name: names from `prefix` up to the next possible prefix
+        where, params = " WHERE name >= ?", [prefix]
+        if prefix:
+            where += " AND name < ?"
+            params.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        conn = self._get_conn()
+        ids = [id for (id,) in conn.execute(
+            f"SELECT id FROM habits{where} ORDER BY name, id LIMIT ?",
+            params + [-1 if limit is None else limit]
+        )]
+        return self._load_ordered(conn, ids, include_completions)
+
+    def search(self, text: str, limit: Optional[int] = None,
+               include_completions: bool = True) -> List[HabitEntity]:
+        """
+        With the FTS5 name index (built when SQLite has FTS5), words match the
+        start of words in the name and results are ranked by relevance;
+        otherwise each word may appear anywhere in the name, ordered by name.
+        """
+        words = text.split()
+        conn = self._get_conn()
+        if words and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'habit_names'"
+        ).fetchone():
+            query = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            sql, params = ("SELECT rowid FROM habit_names WHERE habit_names MATCH ? ORDER BY rank LIMIT ?",
+                           [query])
+        else:
+            pattern = " AND ".join(["name LIKE ? ESCAPE '\\'"] * len(words)) or "1"
+            sql = f"SELECT id FROM habits WHERE {pattern} ORDER BY name, id LIMIT ?"
+            params = ["%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                      for word in words]
+        ids = [id for (id,) in conn.execute(sql, params + [-1 if limit is None else limit])]
+        return self._load_ordered(conn, ids, include_completions)
+
+    def iter_completions(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         batch_size: int = 10_000) -> Iterator[Tuple[int, datetime]]:
+        for hid, ts in self.iter_epochs(ids, category, since, until, batch_size):
+            yield hid, COMPLETED.decode(ts)
+
+    def iter_epochs(self, ids: Optional[Iterable[int]] = None, category: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    batch_size: int = 10_000) -> Iterator[Tuple[int, int]]:
+        conn = self._get_conn()
+        for where, params in self._habit_filters(category=category, ids=ids):
+            sql = ("SELECT habit_id, timestamp FROM completions "
+                   f"WHERE habit_id IN (SELECT id FROM habits{where})")
+            if since is not None:
+                sql += " AND timestamp >= ?"
+                params.append(COMPLETED.encode(since))
+            if until is not None:
+                sql += " AND timestamp < ?"
+                params.append(COMPLETED.encode(until))
+            cur = conn.execute(sql + " ORDER BY habit_id, timestamp", params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                instrumentation.count_rows("completions", len(rows))
+                yield from rows
+
     def get_by_id(self, id: int) -> Optional[HabitEntity]:
         with self._get_conn() as conn:
+            loaded = self._load(conn, " WHERE id = ?", [id])
+        return loaded[0] if loaded else None
+
+    def update(self, habit: HabitEntity) -> None:
+        if not habit.completions_loaded and habit.completions:
+            raise ValueError(f"Habit with id={habit.id} was loaded without its completions; "
+                             "record new ones with append_completion")
+        with self._transaction() as conn:
             row = conn.execute(
-                "SELECT id, name, periodicity, category, created FROM habits WHERE id = ?",
-                (id,)
+                f"SELECT h.periodicity, h.version, {_STATS_COLUMNS} FROM habits h "
+                "LEFT JOIN habit_stats s ON s.habit_id = h.id WHERE h.id = ?",
+                (habit.id,)
             ).fetchone()
-            if not row:
-                return None
-            h = HabitEntity(
-                id=row[0], name=row[1], periodicity=row[2],
-                category=row[3], created=datetime.fromisoformat(row[4]), completions=[]
+            if row is None:
+                return
+            if row[1] != habit.version:
+                raise ConcurrentUpdateError(
+                    f"Habit with id={habit.id} was changed since it was loaded "
+                    f"(version {habit.version}, now {row[1]})"
+                )
+            conn.execute(
+                "UPDATE habits SET name = ?, periodicity = ?, category = ?, created = ?, "
+                "version = version + 1 WHERE id = ?",
+                (habit.name, habit.periodicity, habit.category, CREATED.encode(habit.created), habit.id)
             )
-            for (ts,) in conn.execute("SELECT timestamp FROM completions WHERE id = ?", (id,)):
-                h.completions.append(CompletionRecord(timestamp=datetime.fromisoformat(ts)))
-            return h
+            if not habit.completions_loaded:
+                # the stored completions are unknown to this entity, so they stay as they are
+                if row[0] != habit.periodicity:
+                    _recompute_stats(conn, [habit.id], self._archived_epochs)
+            else:
+                # only write the completions that differ from what is stored
+                stored = Counter(ts for (ts,) in conn.execute(
+                    "SELECT timestamp FROM completions WHERE habit_id = ?", (habit.id,)
+                ))
+                wanted = Counter(COMPLETED.encode(comp.timestamp) for comp in habit.completions)
+                removed = stored - wanted
+                for ts, n in removed.items():
+                    conn.execute(
+                        "DELETE FROM completions WHERE id IN "
+                        "(SELECT id FROM completions WHERE habit_id = ? AND timestamp = ? LIMIT ?)",
+                        (habit.id, ts, n)
+                    )
+                _write_rollups(conn, ((habit.id, ts) for ts in removed.elements()), sign=-1)
+                added = sorted((wanted - stored).elements())
+                conn.executemany(
+                    "INSERT INTO completions (habit_id, timestamp) VALUES (?, ?)",
+                    ((habit.id, ts) for ts in added)
+                )
+                _write_rollups(conn, ((habit.id, ts) for ts in added))
+                stats = _stats_from_row(habit.id, row[2:])
+                last = _optional_epoch(stats.last_completion)
+                if (stored - wanted or row[0] != habit.periodicity
+                        or (added and last is not None and added[0] < last)):
+                    _recompute_stats(conn, [habit.id], self._archived_epochs)
+                elif added:
+                    for ts in added:
+                        streaks.advance(stats, habit.periodicity, from_epoch(ts))
+                    _write_stats(conn, [stats])
+        habit.version += 1
 
-    def update(self, habit: HabitEntity) -> None:
-        with self._get_conn() as conn:
+    def append_completion(self, habit_id: int, timestamp: Optional[datetime] = None) -> bool:
+        ts = COMPLETED.encode(timestamp or datetime.utcnow())
+        with self._transaction() as conn:
+            state = self._stats_for_update(conn, [habit_id])
+            if habit_id not in state:
+                return False
             conn.execute(
-                "UPDATE habits SET name = ?, periodicity = ?, category = ?, created = ? WHERE id = ?",
-                (habit.name, habit.periodicity, habit.category, habit.created.isoformat(), habit.id)
+                "INSERT INTO completions (habit_id, timestamp) VALUES (?, ?)", (habit_id, ts)
             )
-            conn.execute("DELETE FROM completions WHERE id = ?", (habit.id,))
-            for comp in habit.completions:
-                conn.execute(
-                    "INSERT INTO completions (id, timestamp) VALUES (?, ?)",
-                    (habit.id, comp.timestamp.isoformat())
-                )
-            conn.commit()
+            self._fold_completions(conn, state, [(habit_id, ts)])
+        return True
+
+    def _stats_for_update(self, conn, habit_ids: Iterable[int]) -> Dict[int, Tuple[str, HabitStats]]:
+        """Periodicity and current stats of each existing habit in `habit_ids`."""
+        state: Dict[int, Tuple[str, HabitStats]] = {}
+        for where, params in self._habit_filters(ids=habit_ids):
+            for row in conn.execute(
+                f"SELECT h.id, h.periodicity, {_STATS_COLUMNS} FROM habits h "
+                "LEFT JOIN habit_stats s ON s.habit_id = h.id "
+                f"WHERE h.id IN (SELECT id FROM habits{where})",
+                params
+            ):
+                state[row[0]] = (row[1], _stats_from_row(row[0], row[2:]))
+        return state
+
+    def _fold_completions(self, conn, state: Dict[int, Tuple[str, HabitStats]],
+                          rows: Iterable[Tuple[int, int]]) -> None:
+        """
+        Update stats and rollups for newly inserted (habit_id, epoch) rows: in-order
+        completions are folded in incrementally, habits that received older ones are recomputed.
+        """
+        rows = list(rows)
+        # habits loaded before these completions must not update() them away
+        conn.executemany("UPDATE habits SET version = version + 1 WHERE id = ?",
+                         ((hid,) for hid in {hid for hid, _ in rows}))
+        _write_rollups(conn, rows)
+        stale: Set[int] = set()
+        touched: Dict[int, HabitStats] = {}
+        for habit_id, ts in sorted(rows):
+            if habit_id in stale:
+                continue
+            periodicity, stats = state[habit_id]
+            completed = from_epoch(ts)
+            if stats.last_completion is not None and completed < stats.last_completion:
+                stale.add(habit_id)
+                touched.pop(habit_id, None)
+                continue
+            touched[habit_id] = streaks.advance(stats, periodicity, completed)
+        _write_stats(conn, touched.values())
+        _recompute_stats(conn, stale, self._archived_epochs)
+
+    def add_completions(self, events: Iterable[Tuple[int, datetime]],
+                        batch_size: int = 10_000) -> int:
+        if batch_size < 1:
+            raise ValueError("`batch_size` must be positive")
+        events = iter(events)
+        recorded = 0
+        while True:
+            batch = list(islice(events, batch_size))
+            if not batch:
+                return recorded
+            recorded += sum(self.record_batch(batch))
+
+    def record_batch(self, events: Sequence[Tuple[int, datetime]]) -> List[bool]:
+        """
+        Insert (habit_id, timestamp) events in a single transaction. Returns, per
+        event, whether its habit exists (events for unknown habits are dropped).
+        """
+        batch = [(hid, COMPLETED.encode(ts)) for hid, ts in events]
+        with self._transaction() as conn:
+            state = self._stats_for_update(conn, {hid for hid, _ in batch})
+            rows = [row for row in batch if row[0] in state]
+            conn.executemany("INSERT INTO completions (habit_id, timestamp) VALUES (?, ?)", rows)
+            self._fold_completions(conn, state, rows)
+        return [hid in state for hid, _ in batch]
+
+    def get_stats(self, ids: Optional[Iterable[int]] = None) -> Dict[int, HabitStats]:
+        stats: Dict[int, HabitStats] = {}
+        conn = self._get_conn()
+        for where, params in self._habit_filters(ids=ids):
+            for row in conn.execute(
+                f"SELECT habit_id, {_STATS_COLUMNS} FROM habit_stats "
+                f"WHERE habit_id IN (SELECT id FROM habits{where})",
+                params
+            ):
+                stats[row[0]] = _stats_from_row(row[0], row[1:])
+        return stats
+
+    def completed_in_period(self, period: str, key: int,
+                            ids: Optional[Iterable[int]] = None) -> Set[int]:
+        if period not in _ROLLUPS:
+            raise ValueError("`period` must be 'weekly' or 'monthly'")
+        table, column = _ROLLUPS[period]
+        # one range scan of the period index, however many habits are asked about
+        done = {hid for (hid,) in self._get_conn().execute(
+            f"SELECT habit_id FROM {table} WHERE {column} = ?", (key,)
+        )}
+        return done if ids is None else done.intersection(ids)
+
+    def period_counts(self, ids: Iterable[int], period: str) -> Dict[int, Dict[int, int]]:
+        if period not in _ROLLUPS:
+            raise ValueError("`period` must be 'weekly' or 'monthly'")
+        table, column = _ROLLUPS[period]
+        ids = list(ids)
+        counts: Dict[int, Dict[int, int]] = {id: {} for id in ids}
+        conn = self._get_conn()
+        for where, params in self._habit_filters(ids=ids):
+            for hid, key, n in conn.execute(
+                f"SELECT habit_id, {column}, count FROM {table} "
+                f"WHERE habit_id IN (SELECT id FROM habits{where}) ORDER BY habit_id, {column}",
+                params
+            ):
+                counts[hid][key] = n
+        return counts
 
     def delete(self, id: int) -> None:
-        with self._get_conn() as conn:
-            conn.execute("DELETE FROM completions WHERE id = ?", (id,))
+        with self._transaction() as conn:
+            archived = conn.execute("SELECT 1 FROM habit_archive WHERE habit_id = ?", (id,)).fetchone()
+            # completions follow through ON DELETE CASCADE
             conn.execute("DELETE FROM habits WHERE id = ?", (id,))
-            conn.commit()
+        if archived and os.path.exists(self.archive_path):
+            archive = self._archive()
+            try:
+                with archive:
+                    archive.execute("DELETE FROM completions WHERE habit_id = ?", (id,))
+            finally:
+                archive.close()
+
+    def _archive(self) -> sqlite3.Connection:
+        """A new connection to the archive database, created on first use."""
+        conn = sqlite3.connect(self.archive_path, timeout=self.busy_timeout)
+        with conn:
+            for statement in _ARCHIVE_SCHEMA:
+                conn.execute(statement)
+        return conn
+
+    def _archived_epochs(self, habit_id: int) -> Optional[List[int]]:
+        """Archived completion epochs of `habit_id`, oldest first; None without an archive."""
+        if not os.path.exists(self.archive_path):
+            return None
+        archive = self._archive()
+        try:
+            return [ts for (ts,) in archive.execute(
+                "SELECT timestamp FROM completions WHERE habit_id = ? ORDER BY timestamp", (habit_id,)
+            )]
+        finally:
+            archive.close()
+
+    def compact(self, horizon: datetime, batch_size: int = 500) -> int:
+        """
+        Move completions older than `horizon` to the archive database, keeping
+        per habit a summary of their streak state (habit_archive) so stats and
+        analytics stay exact; the period rollups keep counting them. Returns how
+        many completions moved. Runs `batch_size` habits per write transaction,
+        which reads the rows, copies them to the archive and deletes them here,
+        so concurrent writers cannot change them in between; the archive copy is
+        committed first, so compaction can be interrupted and re-run.
+
+        Completions recorded later but dated before a habit's horizon stay here
+        until the next compact(); the maintained stats account for them at once.
+        """
+        if batch_size < 1:
+            raise ValueError("`batch_size` must be positive")
+        until = COMPLETED.encode(horizon)
+        conn = self._get_conn()
+        ids = [hid for (hid,) in conn.execute(
+            "SELECT DISTINCT habit_id FROM completions WHERE timestamp < ? ORDER BY habit_id", (until,)
+        )]
+        if not ids:
+            return 0
+        moved = 0
+        archive = self._archive()
+        try:
+            (top,) = archive.execute("SELECT MAX(id) FROM completions").fetchone()
+            for i in range(0, len(ids), min(batch_size, MAX_IN_PARAMS)):
+                chunk = ids[i:i + min(batch_size, MAX_IN_PARAMS)]
+                marks = ", ".join("?" * len(chunk))
+                with self._transaction() as conn:
+                    if top is not None:
+                        # ids archived before migration 10 may lie above the sequence; skip past them
+                        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'completions' AND seq < ?",
+                                     (top, top))
+                    rows = conn.execute(
+                        f"SELECT id, habit_id, timestamp FROM completions WHERE habit_id IN ({marks}) "
+                        "AND timestamp < ? ORDER BY habit_id, timestamp", chunk + [until]
+                    ).fetchall()
+                    with archive:
+                        archive.executemany(
+                            "INSERT OR IGNORE INTO completions (id, habit_id, timestamp) VALUES (?, ?, ?)",
+                            rows
+                        )
+                    moved += self._archive_rows(conn, archive, chunk, rows, until)
+        finally:
+            archive.close()
+        return moved
+
+    def _archive_rows(self, conn, archive, habit_ids: List[int], rows: List[tuple], until: int) -> int:
+        """
+        Fold archived `rows` into the summaries of `habit_ids` and delete them
+        here, in the write transaction `rows` were read in.
+        """
+        marks = ", ".join("?" * len(habit_ids))
+        periodicity = dict(conn.execute(
+            f"SELECT id, periodicity FROM habits WHERE id IN ({marks})", habit_ids
+        ))
+        previous = {row[0]: row for row in conn.execute(
+            f"SELECT habit_id, archived_until, {_STATS_COLUMNS} FROM habit_archive "
+            f"WHERE habit_id IN ({marks})", habit_ids
+        )}
+        stamps: Dict[int, List[int]] = {}
+        for _, hid, ts in rows:
+            stamps.setdefault(hid, []).append(ts)
+        summaries = []
+        for hid, archived in stamps.items():
+            prev = previous.get(hid)
+            if prev is None:
+                summary = streaks.compute(hid, periodicity[hid], map(from_epoch, archived))
+            elif archived[0] >= prev[7]:
+                summary = streaks.resume(_stats_from_row(hid, prev[2:]), periodicity[hid],
+                                         map(from_epoch, archived))
+            else:
+                # late completions dated before the last archived one: rebuild from the archive
+                summary = streaks.compute(hid, periodicity[hid], (from_epoch(ts) for (ts,) in archive.execute(
+                    "SELECT timestamp FROM completions WHERE habit_id = ? ORDER BY timestamp", (hid,)
+                )))
+            summaries.append((summary, max(until, prev[1] if prev else until)))
+        _write_archive(conn, summaries)
+        conn.executemany("DELETE FROM completions WHERE id = ? AND habit_id = ? AND timestamp < ?",
+                         ((id, hid, until) for id, hid, _ in rows))
+        # entities loaded before now still hold the archived completions
+        conn.executemany("UPDATE habits SET version = version + 1 WHERE id = ?",
+                         ((summary.habit_id,) for summary, _ in summaries))
+        return len(rows)
+
+    def vacuum(self) -> int:
+        """
+        Return free pages to the file system and truncate the WAL; returns the
+        bytes reclaimed. New databases are created with incremental auto-vacuum
+        and just release their free pages; older ones are converted by one full VACUUM.
+        """
+        conn = self._get_conn()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            # the pragma frees one page per step, so run it to completion
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        after = conn.execute("PRAGMA page_count").fetchone()[0]
+        return (before - after) * page_size
 
     def add_defaults(self) -> None:
         """
@@ -0,0 +1,115 @@
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, Tuple
+from .models import CompletionList, HabitStats
+from .timestamps import EPOCH
+
+_EPOCH_ORDINAL = EPOCH.toordinal()
+_MICROS_PER_DAY = 86_400 * 1_000_000
+
+def week_index(d: date) -> int:
+    """Running number of the (Monday-based) ISO week containing `d`, continuous across years."""
+    return ordinal_week(d.toordinal())
+
+def ordinal_week(ordinal: int) -> int:
+    """week_index of the day with proleptic ordinal `ordinal` (day 1 was a Monday)."""
+    return (ordinal - (ordinal - 1) % 7) // 7
+
+def day_ordinals(completions: Iterable) -> Iterator[int]:
+    """
+    Proleptic day ordinal of each completion, in list order. A CompletionList is
+    read straight from its packed integers, without building datetimes.
+    """
+    if isinstance(completions, CompletionList):
+        return (us // _MICROS_PER_DAY + _EPOCH_ORDINAL for us in completions.epoch_micros())
+    return (c.timestamp.toordinal() for c in completions)
+
+def period_key(period: str, d: date) -> int:
+    """
+    Rollup key of the period containing `d`: ISO year * 100 + ISO week for
+    "weekly", year * 100 + month for "monthly" (e.g. 202601 for both in early 2026).
+    """
+    if period == "weekly":
+        year, week, _ = d.isocalendar()
+        return year * 100 + week
+    if period == "monthly":
+        return d.year * 100 + d.month
+    raise ValueError("`period` must be 'weekly' or 'monthly'")
+
+def period_bounds(period: str, key: int) -> Tuple[date, date]:
+    """First day of the period `key` (see period_key) and first day of the next one."""
+    year, number = divmod(key, 100)
+    if period == "weekly":
+        # ISO week 1 is the one holding January 4th
+        jan4 = date(year, 1, 4)
+        start = jan4 - timedelta(days=jan4.weekday()) + timedelta(weeks=number - 1)
+        return start, start + timedelta(weeks=1)
+    if period == "monthly":
+        start = date(year, number, 1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    raise ValueError("`period` must be 'weekly' or 'monthly'")
+
+def period_delta(periodicity: str, prev: date, cur: date) -> int:
+    """Number of periods from `prev` to `cur`; a streak continues when this is 1."""
+    if periodicity == "daily":
+        return (cur - prev).days
+    return week_index(cur) - week_index(prev)
+
+def period_length(periodicity: str) -> timedelta:
+    """Largest gap between completions that keeps the current streak alive."""
+    return timedelta(days=1) if periodicity == "daily" else timedelta(weeks=1)
+
+def elapsed_periods(periodicity: str, created: date, today: date) -> int:
+    """Periods from `created` through `today`, inclusive."""
+    if periodicity == "daily":
+        return (today - created).days + 1
+    return week_index(today) - week_index(created) + 1
+
+def advance(stats: HabitStats, periodicity: str, ts: datetime) -> HabitStats:
+    """
+    Fold one completion into `stats` in place. `ts` must not be earlier than
+    `stats.last_completion`; out-of-order completions need a full `compute`.
+    """
+    if stats.last_completion is None:
+        stats.run_length = stats.chain_length = 1
+        stats.run_start = ts
+    else:
+        last = stats.last_completion.date()
+        if period_delta(periodicity, last, ts.date()) == 1:
+            stats.run_length += 1
+        else:
+            stats.run_length = 1
+            stats.run_start = ts
+        if ts.date() - last <= period_length(periodicity):
+            stats.chain_length += 1
+        else:
+            stats.chain_length = 1
+    stats.completion_count += 1
+    stats.longest_streak = max(stats.longest_streak, stats.run_length)
+    stats.last_completion = ts
+    return stats
+
+def compute(habit_id: int, periodicity: str, timestamps: Iterable[datetime]) -> HabitStats:
+    """Build stats from scratch out of a habit's completion timestamps."""
+    stats = HabitStats(habit_id=habit_id)
+    for ts in sorted(timestamps):
+        advance(stats, periodicity, ts)
+    return stats
+
+def resume(summary: HabitStats, periodicity: str, timestamps: Iterable[datetime]) -> HabitStats:
+    """
+    Stats of a habit whose older completions were archived into `summary`,
+    with the remaining ones (none earlier than summary.last_completion) folded in.
+    """
+    stats = replace(summary)
+    for ts in sorted(timestamps):
+        advance(stats, periodicity, ts)
+    return stats
+
+def current_streak(stats: HabitStats, periodicity: str, today: date) -> int:
+    """Current streak as of `today`, derived from the maintained chain."""
+    if stats.last_completion is None:
+        return 0
+    if today - stats.last_completion.date() > period_length(periodicity):
+        return 0
+    return stats.chain_length
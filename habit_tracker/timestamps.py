@@ -0,0 +1,116 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+def to_epoch(ts: datetime) -> int:
+    """Encode a (naive, UTC) datetime as integer seconds since the Unix epoch."""
+    return (ts - EPOCH) // _SECOND
+
+def from_epoch(seconds: int) -> datetime:
+    """Decode integer epoch seconds back into a naive UTC datetime."""
+    return EPOCH + timedelta(seconds=seconds)
+
+def parse_timestamp(value) -> datetime:
+    """
+    Parse an ISO-8601 string or integer epoch seconds into a naive UTC datetime.
+    Offset-aware timestamps are converted to UTC.
+    """
+    if isinstance(value, int) or (isinstance(value, str) and value.strip().lstrip("-").isdigit()):
+        return from_epoch(int(value))
+    if not isinstance(value, str):
+        raise ValueError(f"invalid timestamp {value!r}")
+    ts = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+_MICROSECOND = timedelta(microseconds=1)
+
+def to_epoch_micros(ts: datetime) -> int:
+    """Encode a (naive, UTC) datetime losslessly as integer microseconds since the epoch."""
+    return (ts - EPOCH) // _MICROSECOND
+
+def from_epoch_micros(micros: int) -> datetime:
+    """Decode integer epoch microseconds back into a naive UTC datetime."""
+    return EPOCH + timedelta(microseconds=micros)
+
+class TimestampCodec(ABC):
+    """
+    One way of storing naive UTC datetimes in SQLite. `encode`/`decode` convert
+    single values, `epoch_sql` turns an encoded SQL expression into integer epoch
+    seconds, and `register` installs matching sqlite3 adapters and converters.
+    """
+    name = ""
+
+    @abstractmethod
+    def encode(self, ts: datetime):
+        ...
+
+    @abstractmethod
+    def decode(self, value) -> datetime:
+        ...
+
+    @abstractmethod
+    def epoch_sql(self, expr: str) -> str:
+        ...
+
+    def register(self) -> None:
+        """
+        Make sqlite3 encode datetime parameters with this codec, and decode
+        columns selected as `col AS "alias [<name>]"` on connections opened with
+        detect_types=sqlite3.PARSE_COLNAMES.
+        """
+        import sqlite3
+        sqlite3.register_adapter(datetime, self.encode)
+        sqlite3.register_converter(self.name, lambda raw: self.decode(self._parse(raw)))
+
+    @staticmethod
+    def _parse(raw: bytes):
+        return int(raw)
+
+class EpochCodec(TimestampCodec):
+    """Integer count of `unit`s since the Unix epoch (seconds drop sub-second parts)."""
+    def __init__(self, name: str, unit: timedelta):
+        self.name = name
+        self.unit = unit
+        self._per_second = _SECOND // unit
+
+    def encode(self, ts: datetime) -> int:
+        return (ts - EPOCH) // self.unit
+
+    def decode(self, value: int) -> datetime:
+        return EPOCH + value * self.unit
+
+    def epoch_sql(self, expr: str) -> str:
+        if self._per_second == 1:
+            return expr
+        return f"(({expr}) / {self._per_second} - (({expr}) % {self._per_second} < 0))"
+
+class JulianDayCodec(TimestampCodec):
+    """Fractional Julian day number, as SQLite's own julianday() returns."""
+    name = "julianday"
+    # Julian day of the Unix epoch
+    EPOCH_DAY = 2440587.5
+
+    def encode(self, ts: datetime) -> float:
+        return self.EPOCH_DAY + (ts - EPOCH) / timedelta(days=1)
+
+    def decode(self, value: float) -> datetime:
+        # a double holds today's Julian days to roughly 20 microseconds
+        return EPOCH + timedelta(microseconds=round((value - self.EPOCH_DAY) * 86_400_000_000))
+
+    def epoch_sql(self, expr: str) -> str:
+        # round to microseconds like decode(), then floor to whole seconds
+        return EPOCH_MICROS.epoch_sql(f"CAST(round((({expr}) - {self.EPOCH_DAY}) * 86400000000) AS INTEGER)")
+
+    @staticmethod
+    def _parse(raw: bytes) -> float:
+        return float(raw)
+
+EPOCH_SECONDS = EpochCodec("epoch", _SECOND)
+EPOCH_MICROS = EpochCodec("epoch_us", _MICROSECOND)
+JULIAN_DAY = JulianDayCodec()
+
+CODECS = {codec.name: codec for codec in (EPOCH_SECONDS, EPOCH_MICROS, JULIAN_DAY)}
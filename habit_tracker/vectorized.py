@@ -0,0 +1,203 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from . import streaks
+from .models import CompletionList, HabitEntity
+from .timestamps import EPOCH
+from .repository import HabitRepository
+
+try:
+    import numpy as np
+except ImportError:  # optional: without NumPy the packed-array backend is used
+    np = None
+
+_EPOCH_ORDINAL = EPOCH.toordinal()
+_MICROS_PER_DAY = 86_400 * 1_000_000
+
+def _day_numbers(completions):
+    """Day numbers of `completions`, read straight from a CompletionList's packed integers."""
+    if isinstance(completions, CompletionList):
+        return np.frombuffer(completions.epoch_micros(), dtype=np.int64) // _MICROS_PER_DAY + _EPOCH_ORDINAL
+    return np.fromiter(streaks.day_ordinals(completions), dtype=np.int64)
+
+def _streaks_numpy(days, lengths: Sequence[int], is_daily: Sequence[bool], today: int) -> Tuple[list, list]:
+    """
+    Longest and current streak of each habit, given the sorted day numbers of
+    all habits laid out habit after habit (`lengths` per habit).
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    longest = np.zeros(len(lengths), dtype=np.int64)
+    current = np.zeros(len(lengths), dtype=np.int64)
+    if not len(days):
+        return longest.tolist(), current.tolist()
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    nonempty = lengths > 0
+    daily = np.repeat(np.asarray(is_daily), lengths)
+    # streak key per completion: day number for daily habits, week number for weekly ones
+    key = np.where(daily, days, (days - (days - 1) % 7) // 7)
+    # gap that keeps the current streak alive, per completion
+    limit = np.where(daily, 1, 7)
+    first = np.zeros(len(days), dtype=bool)
+    first[starts[nonempty]] = True
+
+    # a new longest-streak run starts wherever the key does not step by exactly one
+    run_break = first.copy()
+    run_break[1:] |= np.diff(key) != 1
+    run_starts = np.flatnonzero(run_break)
+    run_lengths = np.diff(np.append(run_starts, len(days)))
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    np.maximum.at(longest, owner[run_starts], run_lengths)
+
+    # a new current-streak chain starts wherever the day gap exceeds one period
+    chain_break = first.copy()
+    chain_break[1:] |= np.diff(days) > limit[1:]
+    chain_starts = np.flatnonzero(chain_break)
+    last = ends[nonempty] - 1
+    chain_start = chain_starts[np.searchsorted(chain_starts, last, side="right") - 1]
+    alive = today - days[last] <= limit[last]
+    current[nonempty] = np.where(alive, last + 1 - chain_start, 0)
+    return longest.tolist(), current.tolist()
+
+def _streaks_array(days: array, lengths: Sequence[int], is_daily: Sequence[bool],
+                   today: int) -> Tuple[list, list]:
+    """_streaks_numpy over a packed array.array, in a few passes of plain Python."""
+    offsets = [0]
+    for n in lengths:
+        offsets.append(offsets[-1] + n)
+    daily = array("b")
+    for n, d in zip(lengths, is_daily):
+        daily.extend([d] * n)
+    key = array("i", (d if is_d else (d - (d - 1) % 7) // 7 for d, is_d in zip(days, daily)))
+    limit = array("i", (1 if is_d else 7 for is_d in daily))
+
+    habit_starts = set(offsets[:-1])
+    run_breaks = sorted(habit_starts.union(
+        j for j, step in enumerate(map(int.__sub__, key[1:], key[:-1]), 1) if step != 1
+    ))
+    chain_breaks = sorted(habit_starts.union(
+        j for j, gap, lim in zip(range(1, len(days)), map(int.__sub__, days[1:], days[:-1]), limit[1:])
+        if gap > lim
+    ))
+
+    longest, current = [], []
+    for start, end in zip(offsets, offsets[1:]):
+        if start == end:
+            longest.append(0)
+            current.append(0)
+            continue
+        bounds = run_breaks[bisect_left(run_breaks, start):bisect_left(run_breaks, end)] + [end]
+        longest.append(max(map(int.__sub__, bounds[1:], bounds[:-1])))
+        chain_start = chain_breaks[bisect_right(chain_breaks, end - 1) - 1]
+        current.append(end - chain_start if today - days[end - 1] <= limit[end - 1] else 0)
+    return longest, current
+
+class VectorAnalyticsService:
+    """
+    AnalyticsService counterpart that analyzes many habits at once. `prefetch`
+    lays the completions of all habits out as one flat array of day numbers
+    (proleptic ordinals), habit after habit, and computes every habit's streaks
+    in a few passes over it: first differences mark where runs break, and run
+    lengths are the gaps between breaks.
+
+    `backend` is "numpy" when NumPy is installed (the passes are whole-array
+    operations) and "array" otherwise (the passes run over packed
+    array.array integers in Python, and are slower than the memory engine
+    for long histories).
+
+    With a repository, completions are streamed from it as epoch integers and
+    habits need not have them loaded; without one, each habit's own packed
+    `completions` are used. No datetimes are built either way.
+    """
+    def __init__(self, repo: Optional[HabitRepository] = None):
+        self.repo = repo
+        self.needs_completions = repo is None
+        self.backend = "array" if np is None else "numpy"
+        self._results: Dict[int, tuple] = {}
+        # each habit's sorted day numbers, for report
+        self._days: Dict[int, Sequence[int]] = {}
+
+    @staticmethod
+    def _key(habit: HabitEntity) -> int:
+        return habit.id if habit.id is not None else id(habit)
+
+    def _load_days(self, habits: List[HabitEntity]) -> list:
+        """Each habit's sorted day numbers: int64 arrays with NumPy, else lists."""
+        if self.backend == "array":
+            if self.repo is None:
+                return [sorted(streaks.day_ordinals(h.completions)) for h in habits]
+            per_habit: Dict[int, List[int]] = {h.id: [] for h in habits}
+            for hid, ts in self.repo.iter_epochs(ids=list(per_habit)):
+                per_habit[hid].append(ts // 86_400 + _EPOCH_ORDINAL)
+            # iter_epochs yields each habit's completions in time order
+            return [per_habit[h.id] for h in habits]
+        if self.repo is None:
+            return [np.sort(_day_numbers(h.completions)) for h in habits]
+        rows = np.array(list(self.repo.iter_epochs(ids=[h.id for h in habits])),
+                        dtype=np.int64).reshape(-1, 2)
+        # iter_epochs yields by habit id, then time
+        hids, days = rows[:, 0], rows[:, 1] // 86_400 + _EPOCH_ORDINAL
+        ids = np.array([h.id for h in habits], dtype=np.int64)
+        starts = np.searchsorted(hids, ids, side="left").tolist()
+        ends = np.searchsorted(hids, ids, side="right").tolist()
+        return [days[s:e] for s, e in zip(starts, ends)]
+
+    def prefetch(self, habits: List[HabitEntity]) -> None:
+        """Load and analyze `habits` together."""
+        habits = [h for h in habits if self._key(h) not in self._results]
+        if not habits:
+            return
+        today = datetime.utcnow().date()
+        per_habit = self._load_days(habits)
+        lengths = [len(d) for d in per_habit]
+        is_daily = [h.periodicity == "daily" for h in habits]
+        if self.backend == "numpy":
+            days = np.concatenate(per_habit)
+            longest, current = _streaks_numpy(days, lengths, is_daily, today.toordinal())
+        else:
+            days = array("i")
+            for d in per_habit:
+                days.extend(d)
+            longest, current = _streaks_array(days, lengths, is_daily, today.toordinal())
+
+        for i, h in enumerate(habits):
+            if h.archive is not None:
+                # compacted habits resume from their archive summary instead
+                stats = streaks.resume(h.archive, h.periodicity,
+                                       map(datetime.fromordinal, [int(d) for d in per_habit[i]]))
+                result = (stats.longest_streak, streaks.current_streak(stats, h.periodicity, today),
+                          stats.completion_count)
+            else:
+                result = (longest[i], current[i], lengths[i])
+            self._results[self._key(h)] = result
+            self._days[self._key(h)] = per_habit[i]
+
+    def _result(self, habit: HabitEntity) -> tuple:
+        self.prefetch([habit])
+        return self._results[self._key(habit)]
+
+    def longest_streak(self, habit: HabitEntity) -> int:
+        return self._result(habit)[0]
+
+    def current_streak(self, habit: HabitEntity) -> int:
+        return self._result(habit)[1]
+
+    def completion_rate(self, habit: HabitEntity) -> float:
+        count = self._result(habit)[2]
+        if not count:
+            return 0.0
+        today = datetime.utcnow().date()
+        total = streaks.elapsed_periods(habit.periodicity, habit.created.date(), today)
+        return count / total if total > 0 else 0.0
+
+    def report(self, habits: List[HabitEntity], period: str) -> Dict[str,bool]:
+        current = streaks.period_key(period, datetime.utcnow().date())
+        start, end = (d.toordinal() for d in streaks.period_bounds(period, current))
+        self.prefetch(habits)
+        result: Dict[str,bool] = {}
+        for h in habits:
+            days = self._days[self._key(h)]
+            i = bisect_left(days, start)
+            result[h.name] = bool(i < len(days) and days[i] < end)
+        return result
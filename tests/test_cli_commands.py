@@ -64,3 +64,250 @@ def test_cli_workflow_default_and_filters(tmp_path):
         result = runner.invoke(cli, ['delete', new_id])
         assert result.exit_code == 0
         assert f'Deleted habit ID {new_id}' in result.output
+
+
+def test_cli_import(tmp_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=str(tmp_path)):
+        runner.invoke(cli, ['reset'])
+        events = "habit_id,timestamp\n1,2025-04-01T09:00:00\n1,2025-04-02T09:00:00\n42,2025-04-02T09:00:00\n"
+
+        result = runner.invoke(cli, ['import', '--batch-size', '1'], input=events)
+        assert result.exit_code == 0
+        assert 'Imported 2 completions' in result.output
+        assert 'Skipped 1 completions' in result.output
+
+        result = runner.invoke(cli, ['import', '--format', 'jsonl'], input='{"habit_id": 1}\n')
+        assert 'Error: line 1' in result.output
+
+
+def test_cli_export(tmp_path):
+    import io
+    import json
+    from habit_tracker.formats import read_binary_export
+
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=str(tmp_path)):
+        runner.invoke(cli, ['reset'])
+
+        result = runner.invoke(cli, ['export', '--id', '1'])
+        assert result.exit_code == 0
+        lines = result.output.strip().splitlines()
+        assert lines[0] == 'habit_id,name,periodicity,category,created,timestamp'
+        assert len(lines) == 1 + 28
+        assert all(line.startswith('1,Drink Water,daily,health,') for line in lines[1:])
+
+        result = runner.invoke(cli, ['export', '--format', 'jsonl', '--category', 'errands'])
+        records = [json.loads(line) for line in result.output.splitlines()]
+        assert [r['type'] for r in records] == ['habit'] + ['completion'] * 4
+
+        # the JSON Lines export can be imported back
+        result = runner.invoke(cli, ['import', '--format', 'jsonl'], input=result.output)
+        assert 'Imported 4 completions' in result.output
+
+        result = runner.invoke(cli, ['export', '--format', 'binary', '--since', '2000-01-01',
+                                     '--until', '2000-01-02'])
+        records = list(read_binary_export(io.BytesIO(result.stdout_bytes)))
+        assert len(records) == 5 and all(r.name for r in records)
+
+        result = runner.invoke(cli, ['export', '--since', 'yesterday'])
+        assert result.exit_code != 0
+
+
+def test_cli_analyze_engines_agree(tmp_path):
+    from habit_tracker import vectorized
+    # stdout only: without NumPy the vector engine warns on stderr
+    runner = CliRunner(mix_stderr=False)
+    with runner.isolated_filesystem(temp_dir=str(tmp_path)):
+        runner.invoke(cli, ['reset'])
+        runner.invoke(cli, ['complete', '1'])
+        args = ['analyze', '--longest', '--current', '--rate']
+        memory = runner.invoke(cli, args + ['--engine', 'memory'])
+        assert memory.exit_code == 0
+        for engine in ('stats', 'vector', 'sql', 'parallel', 'windowed'):
+            assert runner.invoke(cli, args + ['--engine', engine]).output == memory.output
+        warned = 'NumPy is not installed' in runner.invoke(cli, args + ['--engine', 'vector']).stderr
+        assert warned == (vectorized.np is None)
+
+        args = ['analyze', '--weekly-report', '--monthly-report']
+        memory = runner.invoke(cli, args + ['--engine', 'memory'])
+        for engine in ('vector', 'sql'):
+            assert runner.invoke(cli, args + ['--engine', engine]).output == memory.output
+
+        result = runner.invoke(cli, ['analyze', '--id', '1', '--longest', '--engine', 'stats'])
+        assert 'Longest streak: 28' in result.output
+
+
+def test_commands_import_lazily():
+    import subprocess
+    import sys
+
+    # tabulate and the analytics engines load with the commands that use them
+    code = ("import sys, habit_tracker.cli.commands; "
+            "print(sorted(m for m in ('tabulate', 'sqlite3', 'habit_tracker.parallel') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_daemon_forwards_commands(tmp_path, capsys):
+    import os
+    import socket
+    import threading
+    from habit_tracker.cli.daemon import forward, serve
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    repo = SQLiteHabitRepository()
+    repo.add_defaults()
+    path = str(tmp_path / "habits.sock")
+    stop, ready = threading.Event(), threading.Event()
+    server = threading.Thread(target=serve, args=(repo, path, stop, ready))
+    server.start()
+    try:
+        ready.wait(5)
+        assert forward(["complete", "1"], path) == 0
+        assert forward(["details", "1"], path) == 0
+        assert forward(["analyze", "--bogus"], path) == 2
+        # a malformed request gets an error reply and the daemon keeps serving
+        for raw in (b"garbage", b'{"argv": "list"}', b"[]"):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            client.sendall(raw)
+            client.shutdown(socket.SHUT_WR)
+            assert b'"code": 2' in client.recv(65536)
+            client.close()
+        # reset runs in the daemon, which then writes to the new database
+        assert forward(["reset"], path) == 0
+        assert forward(["complete", "1"], path) == 0
+        fresh = SQLiteHabitRepository()
+        assert len(fresh.get_by_id(1).completions) == 29
+        fresh.close()
+        # commands the daemon does not run, and a missing daemon, fall back to running locally
+        assert forward(["export"], path) is None
+        assert forward(["list"], str(tmp_path / "missing.sock")) is None
+    finally:
+        stop.set()
+        server.join()
+        repo.close()
+        os.chdir(cwd)
+
+    out, err = capsys.readouterr()
+    assert "Recorded completion for habit ID 1" in out
+    assert "Completions:" in out
+    assert "No such option" in err
+    assert not os.path.exists(path)
+
+
+def test_profile_and_stats(tmp_path):
+    import json
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=str(tmp_path)):
+        runner.invoke(cli, ['reset'])
+        result = runner.invoke(cli, ['--profile', 'analyze', '--longest'])
+        assert result.exit_code == 0
+        assert 'SQLiteHabitRepository.get_all' in result.output
+
+        result = runner.invoke(cli, ['stats', '--json'])
+        metrics = json.loads(result.output)
+        assert metrics['operations']['AnalyticsService.longest_streak']['count'] == 5
+        assert metrics['rows']['habits'] == 5
+
+        runner.invoke(cli, ['--profile', 'complete', '1'])
+        runner.invoke(cli, ['stats', '-o', 'metrics.json'])
+        with open('metrics.json') as f:
+            assert 'SQLiteHabitRepository.append_completion' in json.load(f)['operations']
+
+        runner.invoke(cli, ['stats', '--reset'])
+        assert 'No metrics yet' in runner.invoke(cli, ['stats']).output
+
+
+def test_list_pagination():
+    from datetime import datetime
+    from habit_tracker.cli import commands
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli, ['reset']).exit_code == 0
+
+        def listed(*args):
+            result = runner.invoke(cli, ['list', *args])
+            assert result.exit_code == 0, result.output
+            return [int(line.split()[0]) for line in result.output.strip().splitlines()[1:]]
+
+        assert listed('--limit', '2') == [1, 2]
+        assert listed('--after-id', '2', '--limit', '2') == [3, 4]
+        assert listed('--sort', 'name') == [1, 5, 2, 3, 4]
+        assert listed('--sort', 'name', '--after-id', '2') == [3, 4]
+        assert listed('--sort', 'created', '-p', 'weekly', '--limit', '1') == [4]
+        assert listed('--after-id', '5') == []
+        assert 'No habit with ID 42' in runner.invoke(cli, ['list', '--sort', 'name', '--after-id', '42']).output
+        profiled = runner.invoke(cli, ['--profile', 'list', '--sort', 'name', '--after-id', '42'])
+        assert profiled.exit_code == 0 and 'No habit with ID 42' in profiled.output
+
+        # rows arrive in pages but stay aligned with the header
+        for i in range(5):
+            assert runner.invoke(cli, ['create', '-n', f'Habit with a longer name {i}', '-p', 'daily']).exit_code == 0
+        page_size = commands.LIST_PAGE
+        commands.LIST_PAGE = 2
+        try:
+            lines = runner.invoke(cli, ['list']).output.splitlines()
+        finally:
+            commands.LIST_PAGE = page_size
+        assert len(lines) == 11
+        assert len({line.index('daily') for line in lines[1:4]}) == 1
+        # tabulate "plain" layout: numeric headers right-aligned, columns at least header + 2
+        assert lines[0] == "  ID  Name             Periodicity    Category    Created       Completions"
+        # a later page with longer names widens the columns for its rows
+        today = datetime.utcnow().date().isoformat()
+        assert lines[10] == f"  10  Habit with a longer name 4  daily          general       {today}              0"
+
+
+def test_compact_command():
+    from datetime import datetime, timedelta
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli, ['reset']).exit_code == 0
+        repo = SQLiteHabitRepository()
+        old = datetime.utcnow() - timedelta(days=100)
+        repo.add_completions([(1, old), (1, old + timedelta(days=1))])
+        repo.close()
+
+        result = runner.invoke(cli, ['compact', '--keep-days', '60'])
+        assert result.exit_code == 0, result.output
+        assert 'Archived 2 completions' in result.output and 'Reclaimed' in result.output
+        details = runner.invoke(cli, ['details', '1']).output
+        assert 'Archived:   2 completions' in details and details.count('•') == 28
+        assert runner.invoke(cli, ['compact', '--keep-days', '5']).exit_code == 2
+
+
+def test_name_selectors():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli, ['reset']).exit_code == 0
+        for name in ('Read book', 'Read book', 'Meditate'):
+            assert runner.invoke(cli, ['create', '-n', name, '-p', 'daily', '-c', 'mind']).exit_code == 0
+        last = runner.invoke(cli, ['list']).output.strip().splitlines()[-1].split()[0]
+
+        def listed(*args):
+            result = runner.invoke(cli, ['list', *args])
+            assert result.exit_code == 0, result.output
+            return [line.split()[0] for line in result.output.strip().splitlines()[1:]]
+
+        assert listed('-c', 'mind') == [str(int(last) - 2), str(int(last) - 1), last]
+        assert listed('--name', 'Read book', '--limit', '1') == [str(int(last) - 2)]
+        assert listed('--prefix', 'Med') == [last]
+        assert listed('--search', 'book', '--sort', 'name', '--after-id', str(int(last) - 2)) == [str(int(last) - 1)]
+
+        assert 'Recorded completion for habit ID ' + last in runner.invoke(cli, ['complete', '-n', 'Meditate']).output
+        assert 'give the ID instead' in runner.invoke(cli, ['complete', '-n', 'Read book']).output
+        assert 'No habit named' in runner.invoke(cli, ['complete', '-n', 'Nap']).output
+        assert runner.invoke(cli, ['complete']).exit_code == 2
+        assert runner.invoke(cli, ['complete', last, '-n', 'Meditate']).exit_code == 2
+        assert runner.invoke(cli, ['details', '-n', 'Read book']).output.count('Name:       Read book') == 2
+
+        result = runner.invoke(cli, ['analyze', '--current', '-n', 'Meditate'])
+        assert result.output.strip().splitlines() == ['Current streaks:', '- Meditate: 1']
+        assert runner.invoke(cli, ['analyze', '--id', last, '-c', 'mind']).exit_code == 2
@@ -126,3 +126,1007 @@ def test_analytics_report(default_habits):
     # Invalid period should raise
     with pytest.raises(ValueError):
         svc.report(default_habits, "yearly")
+
+
+def test_get_all_filters(default_habits, tmp_path):
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "filters.db"))
+    for habit in default_habits:
+        repo.add(habit)
+
+    daily = repo.get_all(periodicity="daily")
+    assert {h.name for h in daily} == {"Drink Water", "Morning Stretch", "Read a Book"}
+    assert all(len(h.completions) == 28 for h in daily)
+
+    assert [h.name for h in repo.get_all(category="errands")] == ["Grocery Shopping"]
+
+    ids = [default_habits[0].id, default_habits[3].id]
+    assert sorted(h.id for h in repo.get_all(ids=ids)) == sorted(ids)
+    assert repo.get_all(periodicity="weekly", ids=[default_habits[0].id]) == []
+
+
+def test_append_completion_and_update_diff(tmp_path):
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.services import HabitService
+    from habit_tracker.models import HabitEntity
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "append.db"))
+    habit = repo.add(HabitEntity(name="Append", periodicity="daily", category="cat"))
+
+    svc = HabitService(repo)
+    svc.record_completion(habit.id)
+    assert repo.append_completion(habit.id)
+    assert not repo.append_completion(habit.id + 1)
+    with pytest.raises(ValueError):
+        svc.record_completion(habit.id + 1)
+
+    loaded = repo.get_by_id(habit.id)
+    assert len(loaded.completions) == 2
+
+    # drop one completion, add another: update only writes the difference
+    kept = loaded.completions[1]
+    loaded.completions = [kept]
+    loaded.add_completion()
+    repo.update(loaded)
+    reloaded = repo.get_by_id(habit.id)
+    assert len(reloaded.completions) == 2
+    assert kept.timestamp in [c.timestamp for c in reloaded.completions]
+
+
+def test_upgrade_legacy_database(tmp_path):
+    import sqlite3
+    from datetime import datetime
+    from habit_tracker.sqlite_repository import MIGRATIONS, SCHEMA_VERSION, SQLiteHabitRepository
+
+    # a database written by the original, unversioned schema
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    for statement in MIGRATIONS[0]:
+        conn.execute(statement)
+    conn.execute("INSERT INTO habits (name, periodicity, category, created) "
+                 "VALUES ('Old', 'daily', 'c', '2025-04-01T08:00:00')")
+    conn.executemany("INSERT INTO completions (id, timestamp) VALUES (?, ?)",
+                     [(1, "2025-04-02T09:00:00"), (1, "2025-04-01T09:00:00.500000")])
+    conn.commit()
+    conn.close()
+
+    repo = SQLiteHabitRepository(db_path=path)
+    habit = repo.get_by_id(1)
+    assert [c.timestamp for c in habit.completions] == [
+        datetime(2025, 4, 1, 9), datetime(2025, 4, 2, 9)
+    ]
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute("SELECT typeof(timestamp) FROM completions").fetchone()[0] == "integer"
+    conn.close()
+
+    # deleting the habit cascades to its completions
+    repo.delete(1)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 0
+    conn.close()
+
+
+def test_connection_reuse_and_pragmas(tmp_path):
+    import threading
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "conn.db"), synchronous="off")
+    conn = repo._get_conn()
+    assert repo._get_conn() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 0
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(repo._get_conn()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+
+    repo.close()
+    assert repo._get_conn() is not conn
+
+    with pytest.raises(ValueError):
+        SQLiteHabitRepository(db_path=str(tmp_path / "conn.db"), synchronous="sometimes")
+
+
+def test_record_completions_bulk(tmp_path):
+    import io
+    from datetime import datetime
+    from habit_tracker.formats import read_events
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.services import HabitService
+    from habit_tracker.models import HabitEntity
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "bulk.db"))
+    habit = repo.add(HabitEntity(name="Bulk", periodicity="daily", category="cat"))
+    svc = HabitService(repo)
+
+    src = io.StringIO(
+        "timestamp,habit_id\n"
+        f"2025-04-01T09:00:00,{habit.id}\n"
+        f"2025-04-02T09:00:00+02:00,{habit.id}\n"
+        f"1743670800,{habit.id}\n"
+        "2025-04-04T09:00:00,999\n"
+    )
+    assert svc.record_completions_bulk(read_events(src, "csv"), batch_size=2) == (3, 1)
+    assert [c.timestamp for c in repo.get_by_id(habit.id).completions] == [
+        datetime(2025, 4, 1, 9), datetime(2025, 4, 2, 7), datetime(2025, 4, 3, 9)
+    ]
+
+    src = io.StringIO(f'{{"habit_id": {habit.id}, "timestamp": "2025-04-05T09:00:00"}}\n\n')
+    assert svc.record_completions_bulk(read_events(src, "jsonl")) == (1, 0)
+
+    bad = io.StringIO('{"habit_id": 1, "timestamp": 0}\n{"habit_id": "a", "timestamp": 0}\n')
+    with pytest.raises(ValueError, match="line 2"):
+        list(read_events(bad, "jsonl"))
+
+
+def test_stats_follow_writes(default_habits, tmp_path):
+    from datetime import datetime, timedelta
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.services import AnalyticsService, StatsAnalyticsService
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "stats.db"))
+    for habit in default_habits:
+        repo.add(habit)
+    drink, weekly = default_habits[0], default_habits[3]
+    last = drink.completions[-1].timestamp
+
+    # in-order appends, an out-of-order append, a bulk load and a deletion
+    repo.append_completion(drink.id, last + timedelta(days=2))
+    repo.append_completion(drink.id, last + timedelta(days=3))
+    repo.append_completion(drink.id, last + timedelta(days=1))
+    repo.add_completions([(weekly.id, datetime.utcnow()), (weekly.id, datetime.utcnow() - timedelta(weeks=1))])
+    stretch = repo.get_by_id(default_habits[1].id)
+    del stretch.completions[10]
+    repo.update(stretch)
+
+    memory, stats = AnalyticsService(), StatsAnalyticsService(repo)
+    habits = repo.get_all()
+    stats.prefetch(habits)
+    for h in habits:
+        assert stats.longest_streak(h) == memory.longest_streak(h)
+        assert stats.current_streak(h) == memory.current_streak(h)
+        assert stats.completion_rate(h) == memory.completion_rate(h)
+    assert stats.longest_streak(repo.get_by_id(drink.id)) == 31
+    assert stats.report(habits, "weekly")["Weekly Planning"]
+
+
+@pytest.mark.parametrize("backend", ["numpy", "array"])
+def test_vector_analytics_matches_memory(default_habits, tmp_path, monkeypatch, backend):
+    import random
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.services import AnalyticsService
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker import vectorized
+    from habit_tracker.vectorized import VectorAnalyticsService
+
+    # fixtures plus irregular histories: gaps, same-day repeats, recent runs, none at all
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    habits = list(default_habits)
+    for i in range(20):
+        periodicity = "daily" if i % 2 else "weekly"
+        h = HabitEntity(name=f"H{i}", periodicity=periodicity, category="c",
+                        created=now - timedelta(days=120))
+        h.completions = [CompletionRecord(timestamp=now - timedelta(days=rng.choice([0, 1, 2, 3, 5, 8]) * k,
+                                                                    hours=rng.randint(0, 5)))
+                         for k in range(rng.randint(0, 30))]
+        habits.append(h)
+
+    memory = AnalyticsService()
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "vector.db"))
+    for h in habits[:5]:
+        repo.add(h)
+    bare = repo.get_all(include_completions=False)
+
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(vectorized, "np", None)
+    vector = VectorAnalyticsService()
+    assert vector.backend == backend
+    vector.prefetch(habits)
+    for h in habits:
+        assert vector.longest_streak(h) == memory.longest_streak(h)
+        assert vector.current_streak(h) == memory.current_streak(h)
+        assert vector.completion_rate(h) == memory.completion_rate(h)
+    for period in ("weekly", "monthly"):
+        assert vector.report(habits, period) == memory.report(habits, period)
+
+    # repository-backed: completions are streamed rather than taken from the entities
+    from_repo = VectorAnalyticsService(repo)
+    assert [from_repo.longest_streak(h) for h in bare] == [memory.longest_streak(h) for h in habits[:5]]
+    assert from_repo.report(bare, "weekly") == memory.report(habits[:5], "weekly")
+
+
+def test_completion_list_behaves_like_list():
+    import pickle
+    from datetime import datetime
+    from habit_tracker.models import CompletionList, CompletionRecord, HabitEntity
+
+    stamps = [datetime(2025, 4, d, 9, 0, 0, 250) for d in (3, 1, 2)]
+    records = [CompletionRecord(timestamp=ts) for ts in stamps]
+    packed = CompletionList(records)
+
+    assert packed == records and len(packed) == 3
+    assert packed[1] == records[1] and packed[-1] == records[-1]
+    assert packed[1:] == records[1:] and isinstance(packed[1:], CompletionList)
+    assert records[0] in packed
+
+    packed.append(CompletionRecord(timestamp=datetime(2025, 4, 4)))
+    del packed[0]
+    packed.sort()
+    assert [c.timestamp.day for c in packed] == [1, 2, 4]
+    packed[0] = CompletionRecord(timestamp=datetime(2025, 3, 31))
+    assert packed[0].timestamp == datetime(2025, 3, 31)
+    assert pickle.loads(pickle.dumps(packed)) == packed
+
+    habit = HabitEntity(name="P", periodicity="daily", category="c", completions=records)
+    assert isinstance(habit.completions, CompletionList)
+    assert habit.completions == records
+
+
+def test_sql_analytics_matches_memory(default_habits, tmp_path):
+    import random
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.services import AnalyticsService
+    from habit_tracker.sql_analytics import SQLAnalyticsService
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "sql.db"))
+    for h in default_habits:
+        repo.add(h)
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    for i in range(20):
+        h = HabitEntity(name=f"H{i}", periodicity="daily" if i % 2 else "weekly", category="c",
+                        created=now - timedelta(days=400))
+        h.completions = [CompletionRecord(timestamp=now - timedelta(days=rng.choice([0, 1, 2, 6, 7, 9]) * k,
+                                                                    hours=rng.randint(0, 5)))
+                         for k in range(rng.randint(0, 60))]
+        repo.add(h)
+
+    habits = repo.get_all()
+    memory, sql = AnalyticsService(), SQLAnalyticsService(repo)
+    sql.prefetch(habits)
+    for h in habits:
+        assert sql.longest_streak(h) == memory.longest_streak(h), h.name
+        assert sql.current_streak(h) == memory.current_streak(h), h.name
+        assert sql.completion_rate(h) == memory.completion_rate(h)
+    for period in ("weekly", "monthly"):
+        assert sql.report(habits, period) == memory.report(habits, period)
+
+
+def test_parallel_analytics_matches_memory(default_habits):
+    from habit_tracker.parallel import ParallelAnalyticsService
+    from habit_tracker.services import AnalyticsService
+
+    memory = AnalyticsService()
+    for workers in (1, 2):
+        parallel = ParallelAnalyticsService(workers=workers, chunk_size=2)
+        parallel.prefetch(default_habits)
+        for h in default_habits:
+            assert parallel.longest_streak(h) == memory.longest_streak(h)
+            assert parallel.current_streak(h) == memory.current_streak(h)
+            assert parallel.completion_rate(h) == memory.completion_rate(h)
+        for period in ("weekly", "monthly"):
+            assert parallel.report(default_habits, period) == memory.report(default_habits, period)
+
+
+def test_async_repository_group_commit(tmp_path):
+    import asyncio
+    from habit_tracker.async_sqlite_repository import AsyncSQLiteHabitRepository
+    from habit_tracker.services import AsyncHabitService
+
+    async def scenario():
+        async with AsyncSQLiteHabitRepository(db_path=str(tmp_path / "async.db")) as repo:
+            svc = AsyncHabitService(repo)
+            habit = await svc.create_habit("Async", "daily", "cat")
+            await asyncio.gather(*(svc.record_completion(habit.id) for _ in range(200)))
+            with pytest.raises(ValueError):
+                await svc.record_completion(habit.id + 1)
+            loaded = await repo.get_by_id(habit.id)
+            stats = await repo.get_stats(ids=[habit.id])
+            return len(loaded.completions), stats[habit.id].completion_count
+
+    assert asyncio.run(scenario()) == (200, 200)
+
+
+def test_buffered_repository(tmp_path):
+    import os
+    import sqlite3
+    import time
+    from habit_tracker.buffered_repository import BufferedHabitRepository
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.models import HabitEntity
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "buffer.db"))
+    habit = repo.add(HabitEntity(name="Buffered", periodicity="daily", category="cat"))
+    journal = str(tmp_path / "buffer.journal")
+
+    buffered = BufferedHabitRepository(repo, max_size=3, max_age=60, journal_path=journal)
+    assert buffered.append_completion(habit.id)
+    assert buffered.append_completion(habit.id)
+    assert not buffered.append_completion(habit.id + 1)
+    assert buffered.pending == 2
+    assert len(repo.get_by_id(habit.id).completions) == 0
+    # reads through the buffer see queued completions
+    assert len(buffered.get_by_id(habit.id).completions) == 2
+    assert buffered.pending == 0
+
+    # size threshold
+    for _ in range(3):
+        buffered.append_completion(habit.id)
+    assert buffered.pending == 0 and len(repo.get_by_id(habit.id).completions) == 5
+
+    # a crash leaves the journal behind; the next buffer replays it
+    buffered.append_completion(habit.id)
+    buffered._closed.set()
+    BufferedHabitRepository(repo, journal_path=journal).close()
+    assert len(repo.get_by_id(habit.id).completions) == 6
+
+    # age threshold
+    with BufferedHabitRepository(repo, max_size=100, max_age=0.05) as aged:
+        aged.append_completion(habit.id)
+        time.sleep(0.3)
+        assert aged.pending == 0
+    assert len(repo.get_by_id(habit.id).completions) == 7
+
+    # a failed flush keeps its completions queued and journaled, and the timer keeps running
+    add_completions = repo.add_completions
+    failures = []
+
+    def locked_once(events, batch_size=10_000):
+        if not failures:
+            failures.append(len(events))
+            raise sqlite3.OperationalError("database is locked")
+        return add_completions(events, batch_size)
+
+    repo.add_completions = locked_once
+    with BufferedHabitRepository(repo, max_size=2, max_age=0.05, journal_path=journal) as flaky:
+        assert flaky.append_completion(habit.id) and flaky.append_completion(habit.id)
+        assert failures == [2] and flaky.pending == 2
+        with open(journal) as f:
+            assert len(f.readlines()) == 2
+        time.sleep(0.3)
+        assert flaky.pending == 0
+        flaky.append_completion(habit.id)
+    assert len(repo.get_by_id(habit.id).completions) == 10 and os.path.getsize(journal) == 0
+
+
+def test_caching_repository(tmp_path):
+    import time
+    from habit_tracker.caching_repository import CachingHabitRepository
+    from habit_tracker.repository import ConcurrentUpdateError
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.models import HabitEntity
+
+    repo = CachingHabitRepository(SQLiteHabitRepository(db_path=str(tmp_path / "cache.db")),
+                                  max_entries=2)
+    a = repo.add(HabitEntity(name="A", periodicity="daily", category="c"))
+    b = repo.add(HabitEntity(name="B", periodicity="daily", category="c"))
+
+    assert repo.get_by_id(a.id).name == "A"
+    first = repo.get_by_id(a.id)
+    assert (repo.hits, repo.misses) == (1, 1)
+
+    # handed-out entities are copies; writes invalidate
+    first.add_completion()
+    assert len(repo.get_by_id(a.id).completions) == 0
+    repo.append_completion(a.id)
+    assert len(repo.get_by_id(a.id).completions) == 1
+    assert len(repo.get_all()) == 2
+    repo.delete(b.id)
+    assert [h.name for h in repo.get_all()] == ["A"]
+
+    # size-based eviction
+    repo.get_by_id(a.id)
+    repo.get_by_id(b.id)
+    repo.get_all()
+    assert repo.cache_info()["size"] == 2 and repo.evictions >= 1
+
+    # TTL-based expiry
+    repo.ttl = 0.01
+    repo.get_by_id(a.id)
+    time.sleep(0.02)
+    misses = repo.misses
+    repo.get_by_id(a.id)
+    assert repo.misses == misses + 1
+
+    # a conflicting update drops the stale copy, so a retry re-reads and succeeds
+    repo.ttl = None
+    stale = repo.get_by_id(a.id)
+    other = repo.repo.get_by_id(a.id)
+    other.name = "A2"
+    repo.repo.update(other)
+    stale.name = "A3"
+    with pytest.raises(ConcurrentUpdateError):
+        repo.update(stale)
+    fresh = repo.get_by_id(a.id)
+    assert (fresh.name, fresh.version) == ("A2", other.version)
+    fresh.name = "A3"
+    repo.update(fresh)
+    assert repo.get_by_id(a.id).name == "A3"
+
+
+def test_windowed_analytics(tmp_path):
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.services import AnalyticsService, WindowedAnalyticsService
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "window.db"))
+    now = datetime.utcnow()
+    # a long unbroken daily run (spans several pages), a broken one, a weekly run, an old one
+    histories = [
+        ("daily", [now - timedelta(days=d) for d in range(100)] + [now - timedelta(hours=1)]),
+        ("daily", [now - timedelta(days=d) for d in (0, 1, 2, 4, 5)]),
+        ("weekly", [now - timedelta(weeks=w) for w in range(10)]),
+        ("daily", [now - timedelta(days=400)]),
+        ("daily", []),
+    ]
+    for i, (periodicity, stamps) in enumerate(histories):
+        repo.add(HabitEntity(name=f"W{i}", periodicity=periodicity, category="c",
+                             created=now - timedelta(days=500),
+                             completions=[CompletionRecord(timestamp=ts) for ts in stamps]))
+
+    habits = repo.get_all()
+    memory, windowed = AnalyticsService(), WindowedAnalyticsService(repo, page_periods=8)
+    for h in habits:
+        assert windowed.current_streak(h) == memory.current_streak(h), h.name
+        assert windowed.longest_streak(h) == memory.longest_streak(h)
+    assert windowed.report(habits, "weekly") == {"W0": True, "W1": True, "W2": True,
+                                                  "W3": False, "W4": False}
+
+    window = repo.completions_in_window([habits[1].id, habits[4].id], since=now - timedelta(days=3))
+    assert len(window[habits[1].id]) == 3 and window[habits[4].id] == []
+
+
+def test_sharded_repository(tmp_path):
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.services import AnalyticsService, StatsAnalyticsService
+    from habit_tracker.sharded_repository import ShardedHabitRepository
+    from habit_tracker.sql_analytics import SQLAnalyticsService
+
+    repo = ShardedHabitRepository.in_directory(str(tmp_path), 3)
+    start = datetime(2025, 3, 1, 8)
+    for i in range(12):
+        repo.add(HabitEntity(name=f"S{i}", periodicity="daily", category=f"t{i % 2}",
+                             completions=[CompletionRecord(timestamp=start + timedelta(days=d))
+                                          for d in range(i)]))
+
+    # ids are unique across shards and reads merge in id order
+    habits = repo.get_all()
+    assert [h.id for h in habits] == list(range(1, 13))
+    assert len({repo.shard_of(h.id) for h in habits}) > 1
+    assert [h.name for h in repo.get_all(category="t1", ids=[2, 4, 5, 99])] == ["S1", "S3"]
+    assert repo.get_by_id(7).name == "S6" and repo.get_by_id(99) is None
+
+    assert repo.append_completion(7, start + timedelta(days=6)) and not repo.append_completion(99)
+    assert repo.add_completions([(1, start), (2, start + timedelta(days=1)), (99, start)]) == 2
+    assert [hid for hid, _ in repo.iter_completions(ids=[3, 1])] == [1, 3, 3]
+
+    habits = repo.get_all()
+    memory, stats, sql = AnalyticsService(), StatsAnalyticsService(repo), SQLAnalyticsService(repo)
+    sql.prefetch(habits)
+    for h in habits:
+        assert stats.longest_streak(h) == sql.longest_streak(h) == memory.longest_streak(h)
+
+    # drain shard 0 into the others, then spread back out again
+    on_zero = [h.id for h in repo.shards[0].get_all(include_completions=False)]
+    assert repo.rebalance(0, targets=[1, 2]) == len(on_zero)
+    assert repo.shards[0].get_all() == [] and repo.get_all() == habits
+    repo.rebalance(1)
+    repo.rebalance(2)
+    assert repo.shards[0].get_all() and repo.get_all() == habits
+
+    repo.delete(7)
+    assert repo.get_by_id(7) is None and repo.shard_of(7) is None
+    repo.close()
+
+    # a tenant's habits share a shard
+    tenants = ShardedHabitRepository.in_directory(str(tmp_path / "tenants"), 4,
+                                                  tenant_key=lambda habit: habit.category)
+    placed = [tenants.add(HabitEntity(name=f"T{i}", periodicity="daily", category="acme"))
+              for i in range(5)]
+    assert len({tenants.shard_of(h.id) for h in placed}) == 1
+    tenants.close()
+
+
+def test_instrumentation(tmp_path):
+    from habit_tracker import instrumentation
+    from habit_tracker.instrumentation import InstrumentedAnalytics, InstrumentedHabitRepository
+    from habit_tracker.models import HabitEntity
+    from habit_tracker.services import AnalyticsService
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    # disabled: connections are not traced and nothing is counted
+    plain = SQLiteHabitRepository(db_path=str(tmp_path / "plain.db"))
+    plain.get_all()
+    assert instrumentation.METRICS.snapshot() == {"operations": {}, "statements": {}, "rows": {}}
+    plain.close()
+
+    instrumentation.enable()
+    try:
+        repo = InstrumentedHabitRepository(SQLiteHabitRepository(db_path=str(tmp_path / "inst.db")))
+        habit = repo.add(HabitEntity(name="I", periodicity="daily", category="c"))
+        for _ in range(3):
+            repo.append_completion(habit.id)
+        analytics = InstrumentedAnalytics(AnalyticsService())
+        analytics.longest_streak(repo.get_by_id(habit.id))
+        snapshot = instrumentation.METRICS.snapshot()
+    finally:
+        instrumentation.disable()
+        instrumentation.METRICS.reset()
+        repo.close()
+
+    ops = snapshot["operations"]
+    assert ops["SQLiteHabitRepository.append_completion"]["count"] == 3
+    assert ops["AnalyticsService.longest_streak"]["count"] == 1
+    assert sum(ops["SQLiteHabitRepository.add"]["buckets_us"].values()) == 1
+    # statements differing only in their values share one entry
+    insert = "INSERT INTO completions (habit_id, timestamp) VALUES (?, ?)"
+    assert snapshot["statements"][insert]["count"] == 3
+    assert snapshot["rows"] == {"habits": 1, "completions": 3}
+
+    merged = instrumentation.Metrics()
+    merged.merge(snapshot)
+    merged.merge(snapshot)
+    assert merged.snapshot()["operations"]["SQLiteHabitRepository.add"]["count"] == 2
+
+
+def test_period_rollups_and_year_boundaries(tmp_path):
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.services import AnalyticsService, StatsAnalyticsService, WindowedAnalyticsService
+    from habit_tracker.sql_analytics import SQLAnalyticsService
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.vectorized import VectorAnalyticsService
+
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "rollup.db"))
+    # ISO weeks 2025-W52, 2026-W01 (starts 2025-12-29) and 2026-W02: one unbroken weekly streak
+    span = repo.add(HabitEntity(name="Span", periodicity="weekly", category="c",
+                                created=datetime(2025, 12, 1),
+                                completions=[CompletionRecord(timestamp=datetime(2025, 12, 24, 9)),
+                                             CompletionRecord(timestamp=datetime(2026, 1, 1, 9)),
+                                             CompletionRecord(timestamp=datetime(2026, 1, 6, 9))]))
+    # this week and month of last year must not count for this year's reports
+    now = datetime.utcnow()
+    old = repo.add(HabitEntity(name="Old", periodicity="weekly", category="c",
+                               created=now - timedelta(weeks=60),
+                               completions=[CompletionRecord(timestamp=now - timedelta(weeks=52))]))
+    fresh = repo.add(HabitEntity(name="Fresh", periodicity="daily", category="c"))
+    repo.append_completion(fresh.id)
+
+    assert repo.period_counts([span.id], "weekly") == {span.id: {202552: 1, 202601: 1, 202602: 1}}
+    assert repo.period_counts([span.id], "monthly") == {span.id: {202512: 1, 202601: 2}}
+    key = int(now.strftime("%Y%m"))
+    assert repo.completed_in_period("monthly", key) == {fresh.id}
+    # last year's completion is counted under last year's keys only
+    year, week, _ = (now - timedelta(weeks=52)).isocalendar()
+    assert repo.period_counts([old.id], "weekly") == {old.id: {year * 100 + week: 1}}
+    assert key not in repo.period_counts([old.id], "monthly")[old.id]
+    this_year, this_week, _ = now.isocalendar()
+    assert old.id not in repo.completed_in_period("weekly", this_year * 100 + this_week)
+
+    habits = repo.get_all()
+    engines = [AnalyticsService(), StatsAnalyticsService(repo), VectorAnalyticsService(repo),
+               SQLAnalyticsService(repo), WindowedAnalyticsService(repo)]
+    for analytics in engines:
+        analytics.prefetch(habits)
+        assert analytics.longest_streak(habits[0]) == 3, type(analytics).__name__
+        for period in ("weekly", "monthly"):
+            assert analytics.report(habits, period) == {"Span": False, "Old": False, "Fresh": True}
+
+    # rollups follow removed completions and deleted habits
+    span = repo.get_by_id(span.id)
+    del span.completions[1]
+    repo.update(span)
+    assert repo.period_counts([span.id], "monthly") == {span.id: {202512: 1, 202601: 1}}
+    repo.delete(span.id)
+    conn = repo.connection()
+    assert conn.execute("SELECT COUNT(*) FROM weekly_rollup WHERE habit_id = ?", (span.id,)).fetchone() == (0,)
+
+
+def test_timestamp_codecs(tmp_path):
+    import sqlite3
+    from datetime import datetime
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.sqlite_repository import COMPLETED, SQLiteHabitRepository
+    from habit_tracker.timestamps import CODECS, EPOCH_MICROS, EPOCH_SECONDS, JULIAN_DAY, TimestampCodec
+
+    ts = datetime(2026, 3, 4, 5, 6, 7, 891011)
+    assert EPOCH_MICROS.decode(EPOCH_MICROS.encode(ts)) == ts
+    assert EPOCH_SECONDS.decode(EPOCH_SECONDS.encode(ts)) == ts.replace(microsecond=0)
+    assert EPOCH_SECONDS.encode(datetime(1969, 12, 31, 23, 59, 59, 500000)) == -1
+    assert abs((JULIAN_DAY.decode(JULIAN_DAY.encode(ts)) - ts).total_seconds()) < 1e-4
+    with pytest.raises(TypeError):
+        TimestampCodec()
+
+    # the SQL side agrees with SQLite's own julianday() and with the Python side
+    conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_COLNAMES)
+    (day,) = conn.execute("SELECT julianday('2026-03-04 05:06:07')").fetchone()
+    assert abs(day - JULIAN_DAY.encode(ts.replace(microsecond=0))) < 1e-9
+    for codec in CODECS.values():
+        (epoch,) = conn.execute(f"SELECT {codec.epoch_sql(':v')}", {"v": codec.encode(ts)}).fetchone()
+        assert epoch == EPOCH_SECONDS.encode(ts), codec.name
+    key = (datetime, sqlite3.PrepareProtocol)
+    default = sqlite3.adapters.get(key)
+    try:
+        EPOCH_MICROS.register()
+        (decoded,) = conn.execute('SELECT ? AS "ts [epoch_us]"', (ts,)).fetchone()
+        assert decoded == ts
+    finally:
+        if default is None:
+            sqlite3.adapters.pop(key, None)
+        else:
+            sqlite3.adapters[key] = default
+        conn.close()
+
+    # the repository stores through its codecs
+    repo = SQLiteHabitRepository(db_path=str(tmp_path / "codec.db"))
+    habit = repo.add(HabitEntity(name="C", periodicity="daily", category="c", created=ts,
+                                 completions=[CompletionRecord(timestamp=ts)]))
+    assert repo.get_by_id(habit.id).created == ts
+    assert repo.connection().execute("SELECT typeof(created) FROM habits").fetchone() == ("integer",)
+    assert list(repo.iter_epochs()) == [(habit.id, COMPLETED.encode(ts))]
+    assert list(repo.iter_completions()) == [(habit.id, ts.replace(microsecond=0))]
+
+
+def test_iter_habits_keyset_pagination(tmp_path):
+    import pytest
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.repository import HabitRepository
+    from habit_tracker.sharded_repository import ShardedHabitRepository
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    start = datetime(2025, 5, 1, 9)
+    names = ["delta", "alpha", "echo", "bravo", "alpha", "charlie", "foxtrot"]
+    sqlite_repo = SQLiteHabitRepository(str(tmp_path / "habits.db"))
+    sharded = ShardedHabitRepository.in_directory(str(tmp_path / "shards"), 3)
+    for repo in (sqlite_repo, sharded):
+        for i, name in enumerate(names):
+            # creation order is the reverse of id order
+            repo.add(HabitEntity(name=name, periodicity="daily" if i % 2 else "weekly", category="c",
+                                 created=start - timedelta(days=i),
+                                 completions=[CompletionRecord(timestamp=start + timedelta(days=d))
+                                              for d in range(i)]))
+
+    def ids(habits):
+        return [h.id for h in habits]
+
+    by_name = [2, 5, 4, 6, 1, 3, 7]
+    for repo in (sqlite_repo, sharded):
+        # pages smaller than the result must not skip or repeat habits
+        assert ids(repo.iter_habits(batch_size=2)) == [1, 2, 3, 4, 5, 6, 7]
+        assert ids(repo.iter_habits(sort="name", batch_size=2)) == by_name
+        assert ids(repo.iter_habits(sort="created", batch_size=3)) == [7, 6, 5, 4, 3, 2, 1]
+        assert ids(repo.iter_habits(sort="name", after_id=5, limit=3, batch_size=2)) == [4, 6, 1]
+        assert ids(repo.iter_habits(after_id=5)) == [6, 7]
+        assert ids(repo.iter_habits(periodicity="daily", sort="name", batch_size=1)) == [2, 4, 6]
+        assert ids(repo.iter_habits(limit=0)) == []
+        habit = next(repo.iter_habits(after_id=3, limit=1))
+        assert habit.id == 4 and len(habit.completions) == 3
+        assert len(next(repo.iter_habits(after_id=3, include_completions=False)).completions) == 0
+        with pytest.raises(ValueError):
+            repo.iter_habits(sort="name", after_id=99)
+        with pytest.raises(ValueError):
+            repo.iter_habits(sort="size")
+
+    # the load-everything default agrees with the keyset implementation
+    assert ids(HabitRepository.iter_habits(sqlite_repo, sort="name", after_id=5, limit=3)) == [4, 6, 1]
+    assert ids(HabitRepository.iter_habits(sqlite_repo, sort="created", after_id=4)) == [3, 2, 1]
+
+    # the next page starts where the last one ended even if that habit is deleted meanwhile
+    page = ids(sqlite_repo.iter_habits(limit=3))
+    sqlite_repo.delete(page[-1])
+    assert ids(sqlite_repo.iter_habits(after_id=page[-1], limit=3)) == [4, 5, 6]
+    sharded.close()
+
+
+def test_optimistic_versions_and_concurrent_writers(tmp_path):
+    import pytest
+    from habit_tracker.models import HabitEntity
+    from habit_tracker.repository import ConcurrentUpdateError
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from benchmarks.stress_writers import run
+
+    repo = SQLiteHabitRepository(str(tmp_path / "versions.db"))
+    habit = repo.add(HabitEntity(name="V", periodicity="daily", category="c"))
+    first, second = repo.get_by_id(habit.id), repo.get_by_id(habit.id)
+    first.add_completion()
+    repo.update(first)
+    assert first.version == repo.get_by_id(habit.id).version == 1
+
+    # a copy loaded before another write must not overwrite it
+    second.name = "stale"
+    with pytest.raises(ConcurrentUpdateError):
+        repo.update(second)
+    stale = repo.get_by_id(habit.id)
+    assert repo.append_completion(habit.id)
+    with pytest.raises(ConcurrentUpdateError):
+        repo.update(stale)
+    current = repo.get_by_id(habit.id)
+    assert current.name == "V" and len(current.completions) == 2
+    repo.update(current)
+    repo.close()
+
+    result = run(str(tmp_path / "stress.db"), processes=4, per_process=40, update_share=0.3)
+    assert result["writes"] == 160
+    assert result["lost"] == result["duplicated"] == 0
+    assert result["stats_ok"] and result["rollups_ok"]
+
+
+def test_compaction_keeps_analytics_exact(tmp_path):
+    import os
+    import sqlite3
+    import pytest
+    from datetime import datetime, timedelta
+    from habit_tracker import streaks
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.parallel import ParallelAnalyticsService
+    from habit_tracker.repository import ConcurrentUpdateError
+    from habit_tracker.services import AnalyticsService, StatsAnalyticsService, WindowedAnalyticsService
+    from habit_tracker.sharded_repository import ShardedHabitRepository
+    from habit_tracker.sql_analytics import SQLAnalyticsService
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+    from habit_tracker.vectorized import VectorAnalyticsService
+
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(hours=9)
+    days = {
+        # a streak running across the horizon into today
+        "daily": [today - timedelta(days=d) for d in range(200) if d != 150],
+        # the longest streak lies entirely before the horizon
+        "weekly": [today - timedelta(weeks=w) for w in list(range(30, 60)) + [2, 1, 0]],
+        "old": [today - timedelta(days=d) for d in range(300, 310)],
+    }
+
+    def build(repo):
+        for name, stamps in days.items():
+            repo.add(HabitEntity(name=name, periodicity="weekly" if name == "weekly" else "daily",
+                                 category="c", created=today - timedelta(days=400),
+                                 completions=[CompletionRecord(timestamp=ts) for ts in stamps]))
+
+    def results(repo):
+        engines = [AnalyticsService(), StatsAnalyticsService(repo), VectorAnalyticsService(repo),
+                   VectorAnalyticsService(), SQLAnalyticsService(repo), WindowedAnalyticsService(repo),
+                   ParallelAnalyticsService(workers=1)]
+        habits = repo.get_all()
+        out = []
+        for engine in engines:
+            engine.prefetch(habits)
+            out.append([(engine.longest_streak(h), engine.current_streak(h),
+                         round(engine.completion_rate(h), 9)) for h in habits]
+                       + [engine.report(habits, "weekly"), engine.report(habits, "monthly")])
+        return out
+
+    repo = SQLiteHabitRepository(str(tmp_path / "habits.db"))
+    build(repo)
+    before = results(repo)
+    assert all(r == before[0] for r in before)
+    stale = repo.get_by_id(1)
+
+    horizon = today - timedelta(days=60)
+    expected = sum(ts < horizon for stamps in days.values() for ts in stamps)
+    assert repo.compact(horizon) == expected
+    assert repo.compact(horizon) == 0
+    live = repo.connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+    assert live == sum(map(len, days.values())) - expected
+    archive = sqlite3.connect(repo.archive_path)
+    assert archive.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == expected
+    assert repo.vacuum() >= 0
+
+    # every engine still sees the whole history
+    assert results(repo) == before
+    assert repo.get_by_id(3).archive.completion_count == 10 and not repo.get_by_id(3).completions
+    with pytest.raises(ConcurrentUpdateError):
+        repo.update(stale)
+
+    # a completion dated before the horizon: the stats are exact at once, everything after compacting again
+    late = today - timedelta(days=150)
+    assert repo.append_completion(1, late)
+    full = streaks.compute(1, "daily", days["daily"] + [late])
+    assert repo.get_stats([1])[1].longest_streak == full.longest_streak == 200
+    repo.compact(horizon)
+    assert results(repo)[0][0][0] == 200
+    assert all(r == results(repo)[0] for r in results(repo))
+
+    repo.delete(3)
+    assert archive.execute("SELECT COUNT(*) FROM completions WHERE habit_id = 3").fetchone()[0] == 0
+    archive.close()
+    repo.close()
+
+    # shards compact into their own archives, and rebalancing carries the archive along
+    sharded = ShardedHabitRepository.in_directory(str(tmp_path / "shards"), 2)
+    build(sharded)
+    assert sharded.compact(horizon) == expected
+    assert results(sharded) == before
+    sharded.rebalance(0, targets=[1])
+    sharded.rebalance(1, targets=[0])
+    assert {sharded.shard_of(id) for id in (1, 2, 3)} == {0}
+    assert results(sharded) == before
+    assert os.path.exists(str(tmp_path / "shards" / "shard-00-archive.db"))
+    sharded.close()
+
+
+def test_compaction_never_reuses_completion_ids(tmp_path):
+    import sqlite3
+    from datetime import datetime, timedelta
+    from habit_tracker.models import HabitEntity
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    repo = SQLiteHabitRepository(str(tmp_path / "habits.db"))
+    habit = repo.add(HabitEntity(name="H", periodicity="daily", category="c"))
+    old = datetime(2020, 1, 1, 9)
+    horizon = datetime(2021, 1, 1)
+    conn = repo.connection()
+
+    def archived():
+        archive = sqlite3.connect(repo.archive_path)
+        try:
+            return archive.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        finally:
+            archive.close()
+
+    # the same completion recorded again after the first one was archived keeps a fresh id
+    repo.append_completion(habit.id, old)
+    assert repo.compact(horizon) == 1
+    repo.append_completion(habit.id, old)
+    assert conn.execute("SELECT id FROM completions").fetchall() == [(2,)]
+    assert repo.compact(horizon) == 1
+    assert archived() == 2
+
+    # a database migrated after its ids were reused: compaction skips past the archived ids
+    conn.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name = 'completions'")
+    conn.commit()
+    repo.append_completion(habit.id, old + timedelta(hours=1))
+    assert repo.compact(horizon) == 1
+    repo.append_completion(habit.id, old)
+    assert conn.execute("SELECT id FROM completions").fetchall() == [(3,)]
+    assert repo.compact(horizon) == 1
+    assert archived() == 4
+    assert repo.get_by_id(habit.id).archive.completion_count == 4
+    repo.close()
+
+
+def test_find_by_name_category_and_prefix(tmp_path):
+    from habit_tracker.models import HabitEntity
+    from habit_tracker.repository import HabitRepository
+    from habit_tracker.services import HabitService
+    from habit_tracker.sharded_repository import ShardedHabitRepository
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    habits = [("Read book", "learning"), ("Run 5k", "health"), ("Read news", "learning"),
+              ("Stretch", "health"), ("Run 5k", "fitness"), ("100%_done", "misc")]
+    sqlite_repo = SQLiteHabitRepository(str(tmp_path / "habits.db"))
+    sharded = ShardedHabitRepository.in_directory(str(tmp_path / "shards"), 3)
+    for repo in (sqlite_repo, sharded):
+        for name, category in habits:
+            repo.add(HabitEntity(name=name, periodicity="daily", category=category))
+
+    def ids(found):
+        return [h.id for h in found]
+
+    for repo in (sqlite_repo, sharded):
+        assert ids(repo.find_by_name("Run 5k")) == [2, 5]
+        assert ids(repo.find_by_name("run 5k")) == []
+        assert ids(repo.find_by_category("health")) == [2, 4]
+        assert ids(repo.find_by_prefix("Re")) == [1, 3]
+        assert ids(repo.find_by_prefix("R", limit=3)) == [1, 3, 2]
+        assert ids(repo.find_by_prefix("")) == [6, 1, 3, 2, 5, 4]
+        assert sorted(ids(repo.search("read"))) == [1, 3]
+        assert ids(repo.search("re bo")) == [1]
+        assert ids(repo.search("5k", limit=1)) == [2]
+        # the default implementations agree
+        assert ids(HabitRepository.find_by_prefix(repo, "R", limit=3)) == [1, 3, 2]
+        assert sorted(ids(HabitRepository.search(repo, "READ"))) == [1, 3]
+
+    # the prefix and category lookups are served by indexes
+    conn = sqlite_repo.connection()
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM habits WHERE name >= ? AND name < ? ORDER BY name, id", ["R", "S"]))
+    assert "idx_habits_name" in plan
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM habits WHERE category = ?", ["health"]))
+    assert "idx_habits_category" in plan
+
+    # the FTS index follows renames and deletes
+    renamed = sqlite_repo.get_by_id(4)
+    renamed.name = "Read poetry"
+    sqlite_repo.update(renamed)
+    sqlite_repo.delete(3)
+    assert sorted(ids(sqlite_repo.search("read"))) == [1, 4]
+
+    # without FTS5, search falls back to LIKE, with LIKE wildcards taken literally
+    conn.execute("DROP TABLE habit_names")
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER habit_names_{trigger}")
+    assert ids(sqlite_repo.search("read")) == [1, 4]
+    assert ids(sqlite_repo.search("%_")) == [6]
+    assert ids(sqlite_repo.search("ea bo")) == [1]
+
+    svc = HabitService(sharded)
+    assert ids(svc.find_habits(prefix="R", category="health")) == [2]
+    assert ids(svc.find_habits(text="run", sort="name", after_id=2)) == [5]
+    assert ids(svc.find_habits(name="Run 5k", text="5k", limit=1)) == [2]
+    sharded.close()
+
+
+def test_update_of_habit_loaded_without_completions(tmp_path):
+    import io
+    import pytest
+    from datetime import datetime
+    from habit_tracker.formats import write_export
+    from habit_tracker.models import CompletionRecord
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    repo = SQLiteHabitRepository(str(tmp_path / "partial.db"))
+    repo.add_defaults()
+    habit = repo.find_by_name("Drink Water", include_completions=False)[0]
+    assert not habit.completions_loaded and repo.get_by_id(habit.id).completions_loaded
+    habit.category = "hydration"
+    habit.periodicity = "weekly"
+    repo.update(habit)
+    stored = repo.get_by_id(habit.id)
+    assert (stored.category, stored.periodicity, len(stored.completions)) == ("hydration", "weekly", 28)
+    assert repo.get_stats([habit.id])[habit.id].completion_count == 28
+
+    # completions added to such an entity cannot be told apart from the stored ones
+    bare = repo.get_all(ids=[habit.id], include_completions=False)[0]
+    bare.completions.append(CompletionRecord(timestamp=datetime(2025, 1, 1)))
+    with pytest.raises(ValueError):
+        repo.update(bare)
+
+    # completions of habits missing from the exported habits are skipped
+    out = io.BytesIO()
+    assert write_export(out, "csv", [stored], [(habit.id, datetime(2025, 1, 1)), (999, datetime(2025, 1, 2))]) == 1
+
+
+def test_load_reads_one_snapshot(tmp_path):
+    from habit_tracker.models import HabitEntity, CompletionRecord
+    from habit_tracker.sqlite_repository import SQLiteHabitRepository
+
+    path = str(tmp_path / "snapshot.db")
+    reader, writer = SQLiteHabitRepository(path), SQLiteHabitRepository(path)
+    first = reader.add(HabitEntity(name="A", periodicity="daily", category="x",
+                                   completions=[CompletionRecord()]))
+    other = reader.add(HabitEntity(name="B", periodicity="daily", category="y",
+                                   completions=[CompletionRecord()]))
+
+    def recategorize():
+        habit = writer.get_by_id(other.id)
+        habit.category = "x"
+        writer.update(habit)
+
+    # another process commits between the habit query and the completions query
+    writes = [
+        lambda: writer.add(HabitEntity(name="C", periodicity="daily", category="x",
+                                       completions=[CompletionRecord()])),
+        recategorize,
+    ]
+
+    conn = reader.connection()
+    for write in writes:
+        pending = [write]
+
+        def interleave(sql):
+            if sql.startswith("SELECT habit_id, timestamp FROM completions") and pending:
+                pending.pop()()
+        conn.set_trace_callback(interleave)
+        loaded = reader.get_all(category="x")
+        conn.set_trace_callback(None)
+        assert not pending
+        assert all(len(h.completions) == 1 for h in loaded)
+        assert first.id in [h.id for h in loaded]
+    assert len(reader.get_all(category="x")) == 3
+    reader.close()
+    writer.close()